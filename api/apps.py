@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    def ready(self):
+        # Registra os receivers de invalidação de cache da API (ex: payload de /users/me/)
+        from . import signals  # noqa: F401
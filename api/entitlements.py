@@ -0,0 +1,71 @@
+# entitlements.py
+"""
+Direito de acesso premium ("usuário X tem premium até T") em cache no cache do Django.
+
+Derivado de Subscription.status/expires_at com uma query em cache miss; em hit a checagem não
+vai ao banco. Toda escrita em Subscription (webhooks da Appmax, SubscriptionViewSet.cancel, admin)
+passa pelos signals em api/signals.py, que apagam a entrada do usuário.
+"""
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.models import Subscription
+
+ENTITLEMENT_CACHE_TTL = getattr(settings, 'ENTITLEMENT_CACHE_TTL', 60 * 10)
+
+# 'past_due' mantém o acesso enquanto a Appmax tenta a cobrança de novo
+PREMIUM_STATUSES = ('active', 'past_due')
+
+# Valores guardados no cache: 'none' = sem premium, 0 = premium sem data de fim, timestamp = premium até T
+_NO_PREMIUM = 'none'
+_NO_END = 0
+
+
+def _key(user_id):
+    return f'premium:{user_id}'
+
+
+def premium_until(user_id):
+    """Retorna (tem_premium, fim ou None). Uma query em cache miss, nenhuma em hit."""
+    now = timezone.now()
+    cached = cache.get(_key(user_id))
+    if cached is None:
+        cached = _load(user_id, now)
+
+    if cached == _NO_PREMIUM:
+        return False, None
+    if cached == _NO_END:
+        return True, None
+    until = datetime.fromtimestamp(cached, tz=dt_timezone.utc)
+    return until > now, until
+
+
+def has_premium(user_id):
+    return premium_until(user_id)[0]
+
+
+def _load(user_id, now):
+    expires = list(
+        Subscription.objects.filter(user_id=user_id, status__in=PREMIUM_STATUSES)
+        .values_list('expires_at', flat=True)
+    )
+    ttl = ENTITLEMENT_CACHE_TTL
+    if not expires:
+        value = _NO_PREMIUM
+    elif any(e is None for e in expires):
+        value = _NO_END
+    else:
+        until = max(expires)
+        value = until.timestamp()
+        if until > now:
+            # Não guarda além do fim: a entrada expira junto com o direito
+            ttl = max(1, min(ttl, int((until - now).total_seconds()) + 1))
+    cache.set(_key(user_id), value, ttl)
+    return value
+
+
+def invalidate(user_id):
+    cache.delete(_key(user_id))
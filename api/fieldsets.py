@@ -0,0 +1,121 @@
+# fieldsets.py
+"""
+Sparse fieldsets: ?fields=id,title,due_date e ?exclude=professor_name em qualquer endpoint de leitura.
+
+SparseFieldsetMixin (serializers) remove os campos não pedidos da resposta.
+SparseQuerysetMixin (ViewSets) usa os campos que sobraram para planejar a query: junta só as
+relações realmente lidas (select_related) e, quando todos os campos mapeiam para colunas, restringe
+o SELECT com only(). Sem ?fields/?exclude nada muda.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions, serializers
+
+FIELDS_PARAM = 'fields'
+EXCLUDE_PARAM = 'exclude'
+
+
+def parse_fieldset(request):
+    """Retorna (campos_pedidos ou None, campos_excluídos) para requisições de leitura."""
+    if request is None or request.method not in permissions.SAFE_METHODS:
+        return None, set()
+    params = request.query_params
+
+    def _split(name):
+        return {f.strip() for f in params.get(name, '').split(',') if f.strip()}
+
+    return (_split(FIELDS_PARAM) or None), _split(EXCLUDE_PARAM)
+
+
+class SparseFieldsetMixin:
+    """Filtra os campos do serializer de topo (ou o child de many=True) conforme ?fields/?exclude."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self._is_top_level():
+            return fields
+
+        requested, excluded = parse_fieldset(self.context.get('request'))
+        if requested is not None:
+            # Nomes desconhecidos são ignorados; se nenhum for válido, devolve o payload completo
+            kept = {name: field for name, field in fields.items() if name in requested}
+            fields = kept or fields
+        for name in excluded:
+            fields.pop(name, None)
+        return fields
+
+    def _is_top_level(self):
+        parent = self.parent
+        if parent is None:
+            return True
+        return isinstance(parent, serializers.ListSerializer) and parent.parent is None
+
+
+class SparseQuerysetMixin:
+    """Ajusta select_related/only() do queryset aos campos que o serializer vai de fato ler."""
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.plan_queryset(queryset)
+
+    def plan_queryset(self, queryset):
+        requested, excluded = parse_fieldset(self.request)
+        if requested is None and not excluded:
+            return queryset
+
+        serializer = self.get_serializer()
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+
+        relations, columns, fully_known = set(), {queryset.model._meta.pk.name}, True
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            plan = _resolve_source(queryset.model, field)
+            if plan is None:
+                fully_known = False # SerializerMethodField, property etc.: não sabemos o que acessa
+                continue
+            relation, column = plan
+            if relation:
+                relations.add(relation)
+                # only() precisa manter as FKs de todo o caminho percorrido pelo select_related
+                parts = relation.split('__')
+                columns.update('__'.join(parts[:i]) for i in range(1, len(parts) + 1))
+            columns.add(column)
+
+        if not fully_known:
+            # Só é seguro acrescentar joins; remover poderia gerar N+1 dentro de algum método
+            return queryset.select_related(*relations) if relations else queryset
+
+        queryset = queryset.select_related(None)
+        if relations:
+            queryset = queryset.select_related(*relations)
+        return queryset.only(*columns)
+
+
+def _resolve_source(model, field):
+    """
+    Mapeia field.source para (caminho_da_relacao, coluna) no formato do ORM, ou None se não for
+    uma cadeia de FKs terminando numa coluna concreta. Ex: 'professor.full_name' ->
+    ('professor', 'professor__full_name'); 'professor' (PK) -> ('', 'professor').
+    """
+    if isinstance(field, serializers.SerializerMethodField) or field.source == '*':
+        return None
+
+    path = []
+    current = model
+    attrs = field.source.split('.')
+    for i, attr in enumerate(attrs):
+        try:
+            model_field = current._meta.get_field(attr)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete:
+            return None
+        path.append(attr)
+        if i == len(attrs) - 1:
+            break
+        if not (model_field.many_to_one or model_field.one_to_one):
+            return None
+        current = model_field.related_model
+
+    return '__'.join(path[:-1]), '__'.join(path)
@@ -0,0 +1,87 @@
+# gradebook.py
+"""
+Boletim da turma: matriz densa alunos ativos x atividades atribuídas com a nota da última submissão
+(Feedback.score mais recente dela), a mesma que ActivityScoreStats conta.
+
+Três queries planas via values_list, sem instanciar modelos: alunos (linhas), atividades (colunas)
+e as submissões da matriz, cada uma com a nota já resolvida numa subquery correlacionada (índice de
+Feedback.submission). Alunos e atividades ficam em queries próprias porque definem linhas e colunas
+inteiras, inclusive as sem nenhuma submissão: juntá-los à query das células exigiria um produto
+cartesiano alunos x atividades vindo do banco. O pivot é vetorizado: NumPy espalha as notas na
+matriz por índice, em vez de uma busca no ORM por célula.
+"""
+import numpy as np
+import pandas as pd
+from django.db.models import Case, FloatField, OuterRef, Subquery, When
+from django.db.models.functions import Cast
+
+from core.models import ActivityClass, ClassStudent, Feedback, Submission
+
+
+def _round_or_none(values):
+    """Array float -> lista com None no lugar de NaN (JSON não tem NaN)."""
+    rounded = np.round(values, 2)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+
+def build_gradebook(class_id):
+    students = list(
+        ClassStudent.objects.filter(class_instance_id=class_id, removed_at__isnull=True)
+        .order_by('student__full_name', 'student_id').values_list('student_id', 'student__full_name')
+    )
+    activities = list(
+        ActivityClass.objects.filter(class_instance_id=class_id)
+        .order_by('activity__due_date', 'activity_id')
+        .values_list('activity_id', 'activity__title', 'activity__due_date', 'activity__max_score')
+    )
+    student_ids = [s[0] for s in students]
+    activity_ids = [a[0] for a in activities]
+    shape = (len(student_ids), len(activity_ids))
+
+    scores = np.full(shape, np.nan)
+    submitted = np.zeros(shape, dtype=bool)
+    if student_ids and activity_ids:
+        row_index = pd.Index(student_ids)
+        col_index = pd.Index(activity_ids)
+        # Subqueries no lugar de listas de ids: sem limite de variáveis do SQLite em turmas grandes
+        active = ClassStudent.objects.filter(class_instance_id=class_id, removed_at__isnull=True).values('student_id')
+        assigned = ActivityClass.objects.filter(class_instance_id=class_id).values('activity_id')
+
+        # Nota da submissão: o Feedback com nota de maior id (id acompanha created_at); o Cast entrega
+        # float direto do banco em vez de um Decimal por linha. Só a última submissão do aluno tem nota.
+        latest_score = Subquery(
+            Feedback.objects.filter(submission_id=OuterRef('pk'), score__isnull=False)
+            .order_by('-id').annotate(value=Cast('score', FloatField())).values('value')[:1]
+        )
+        cells = pd.DataFrame(
+            list(Submission.objects.filter(student_id__in=active, activity_id__in=assigned)
+                 .annotate(score=Case(When(is_latest=True, then=latest_score), default=None, output_field=FloatField()))
+                 .values_list('student_id', 'activity_id', 'score')),
+            columns=['student', 'activity', 'score'],
+        )
+        if not cells.empty:
+            submitted[row_index.get_indexer(cells['student']), col_index.get_indexer(cells['activity'])] = True
+            graded_cells = cells.dropna(subset=['score'])
+            rows = row_index.get_indexer(graded_cells['student'])
+            cols = col_index.get_indexer(graded_cells['activity'])
+            scores[rows, cols] = graded_cells['score'].to_numpy(dtype=float)
+
+    graded = ~np.isnan(scores)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Médias só sobre as notas lançadas (NaN quando não há nenhuma)
+        totals = np.where(graded, scores, 0.0)
+        student_means = totals.sum(axis=1) / graded.sum(axis=1)
+        activity_means = totals.sum(axis=0) / graded.sum(axis=0)
+
+    return {
+        'class_id': class_id,
+        'students': [{'id': sid, 'name': name} for sid, name in students],
+        'activities': [
+            {'id': aid, 'title': title, 'due_date': due_date, 'max_score': max_score}
+            for aid, title, due_date, max_score in activities
+        ],
+        'scores': _round_or_none(scores),
+        'submitted': submitted.tolist(),
+        'student_means': _round_or_none(student_means),
+        'activity_means': _round_or_none(activity_means),
+    }
@@ -0,0 +1,76 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import UserReadSerializer
+from api.testing import ReferenceUserReadSerializer
+from core.models import User, Profile
+
+
+class Command(BaseCommand):
+    help = 'Compara o UserReadSerializer antigo (nested + N+1) com o caminho rápido (select_related + dict) em N usuários.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        n = options['users']
+        # Tudo numa transação desfeita no final: não deixa usuários de benchmark no banco
+        with transaction.atomic():
+            self._seed(n)
+            ids = User.objects.filter(email__startswith='bench-').values_list('id', flat=True)
+
+            legacy_json, legacy_time, legacy_queries = self._measure(
+                lambda: ReferenceUserReadSerializer(User.objects.filter(id__in=ids).order_by('id'), many=True).data
+            )
+            fast_json, fast_time, fast_queries = self._measure(
+                lambda: UserReadSerializer(User.objects.filter(id__in=ids).select_related('profile').order_by('id'), many=True).data
+            )
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{n} usuários')
+        self.stdout.write(f'  legado : {legacy_time * 1000:8.1f} ms, {legacy_queries} queries')
+        self.stdout.write(f'  rápido : {fast_time * 1000:8.1f} ms, {fast_queries} queries')
+        self.stdout.write(f'  speedup: {legacy_time / fast_time:.1f}x')
+        if legacy_json == fast_json:
+            self.stdout.write(self.style.SUCCESS('JSON idêntico byte a byte.'))
+        else:
+            self.stdout.write(self.style.ERROR('JSON divergente!'))
+
+    def _seed(self, n):
+        password = make_password(None) # Hash inutilizável: evita o custo do PBKDF2 por usuário
+        now = timezone.now()
+        users = User.objects.bulk_create(
+            [
+                User(full_name=f'Bench {i}', email=f'bench-{i}@exemplo.com', cpf=f'9{i:010d}', password=password,
+                     is_teacher=i % 7 == 0, verified_email=i % 2 == 0, created_at=now)
+                for i in range(n)
+            ],
+            batch_size=1000,
+        )
+        Profile.objects.bulk_create(
+            [
+                Profile(user=user, age=None if i % 5 == 0 else 15 + i % 30, school=f'Escola {i % 50}',
+                        disciplines='Matemática, Física' if i % 3 == 0 else None, experience_years=i % 11 or None)
+                for i, user in enumerate(users)
+                if i % 10 != 0 # Alguns usuários sem perfil
+            ],
+            batch_size=1000,
+        )
+
+    def _measure(self, build):
+        queries = []
+
+        def count_queries(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_queries):
+            start = time.perf_counter()
+            payload = JSONRenderer().render(build())
+            elapsed = time.perf_counter() - start
+        return payload, elapsed, len(queries)
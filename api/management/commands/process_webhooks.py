@@ -0,0 +1,23 @@
+import contextlib
+
+from api.webhooks import AppmaxEventProcessor
+from core.workers import DrainCommand
+
+
+class Command(DrainCommand):
+    help = 'Drena em lotes a caixa de entrada de webhooks (WebhookEvent) aplicando os eventos da Appmax.'
+    default_batch_size = 100
+    default_interval = 2.0
+    batch_help = 'Eventos processados por lote.'
+
+    def open_worker(self, options):
+        return contextlib.nullcontext(AppmaxEventProcessor())
+
+    def drain(self, processor, batch_size, options):
+        return processor.drain(batch_size)
+
+    def seen(self, counts):
+        return sum(counts) # Processados + com erro
+
+    def summary(self, totals):
+        return f'{totals[0]} eventos processados, {totals[1]} com erro.'
@@ -0,0 +1,59 @@
+# me_cache.py
+"""
+Cache do payload de GET /api/users/me/ no cache do Django (LocMemCache por padrão).
+
+Cada usuário tem um token de versão; o payload fica numa chave que inclui a versão e a mesma
+versão vira o ETag. Escritas em User/Profile (signals em api/signals.py) trocam a versão, o que
+invalida o payload e o ETag de uma vez, sem precisar apagar chaves antigas (expiram pelo TTL).
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import User
+from .serializers import UserReadSerializer
+
+ME_CACHE_TTL = getattr(settings, 'ME_CACHE_TTL', 60 * 15)
+
+
+def _version_key(user_id):
+    return f'me:version:{user_id}'
+
+
+def _payload_key(user_id, version):
+    return f'me:payload:{user_id}:{version}'
+
+
+def get_version(user_id):
+    """Token de versão atual do usuário; cria um novo se não existir (ou tiver sido expulso do cache)."""
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        version = uuid.uuid4().hex[:12]
+        # add() não sobrescreve se outra requisição criou a versão ao mesmo tempo
+        if not cache.add(_version_key(user_id), version, ME_CACHE_TTL):
+            version = cache.get(_version_key(user_id), version)
+    return version
+
+
+def etag_for(user_id, version):
+    return f'"me-{user_id}-{version}"'
+
+
+def get_payload(user_id, version):
+    """
+    Payload serializado de /me para esta versão, serializando só em cache miss. O usuário é lido do BD
+    depois da versão (nunca o request.user, carregado antes dela): uma escrita que a leitura não viu
+    só é commitada depois, e a invalidação pós-commit dela já troca a versão sob a qual o payload fica.
+    """
+    key = _payload_key(user_id, version)
+    payload = cache.get(key)
+    if payload is None:
+        payload = UserReadSerializer(User.objects.select_related('profile').get(pk=user_id)).data
+        cache.set(key, payload, ME_CACHE_TTL)
+    return payload
+
+
+def invalidate(user_id):
+    """Troca a versão do usuário: payload e ETag antigos deixam de valer."""
+    cache.set(_version_key(user_id), uuid.uuid4().hex[:12], ME_CACHE_TTL)
@@ -0,0 +1,157 @@
+# pagination.py
+from base64 import b64decode, b64encode
+from decimal import Decimal
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Paginação por cursor (keyset) com chave composta, ex: (created_at, id).
+
+    Diferente do PageNumberPagination, não roda COUNT(*) nem OFFSET: cada página filtra
+    "depois da última linha vista" com um WHERE sobre a chave de ordenação, então a página 5.000
+    custa o mesmo que a primeira (range scan no índice). O cursor guarda os valores da chave
+    completa, sem o offset de desempate do CursorPagination do DRF.
+
+    Uso no ViewSet:
+        pagination_class = KeysetPagination
+        keyset_ordering = ('-submitted_at', '-id')
+
+    O ?ordering= do OrderingFilter continua valendo se todos os campos pedidos forem colunas não
+    nulas do próprio modelo; a chave primária é acrescentada como desempate.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        reverse, position = self.cursor if self.cursor else (False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(_after(ordering, position))
+
+        # Busca uma linha extra só para saber se existe página seguinte
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        page = results[:self.page_size]
+
+        if reverse:
+            page.reverse()
+            self.has_next = position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.page = page
+        return page
+
+    def get_ordering(self, request, queryset, view):
+        model = queryset.model
+        default = tuple(getattr(view, 'keyset_ordering', None) or self.ordering)
+
+        requested = None
+        for backend in getattr(view, 'filter_backends', []):
+            if hasattr(backend, 'get_ordering') and request.query_params.get(getattr(backend, 'ordering_param', 'ordering')):
+                requested = backend().get_ordering(request, queryset, view)
+                break
+        if not requested or not all(_is_keyset_safe(model, field) for field in requested):
+            return default
+
+        # Garante chave única: desempata pela PK na mesma direção do primeiro campo
+        pk_name = model._meta.pk.name
+        ordering = tuple(requested)
+        if not any(field.lstrip('-') in (pk_name, 'pk') for field in ordering):
+            ordering += (('-' if ordering[0].startswith('-') else '') + pk_name,)
+        return ordering
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(True, self.page[0])
+
+    def _link(self, reverse, obj):
+        position = [_cursor_value(getattr(obj, field.lstrip('-'))) for field in self.ordering]
+        return self.encode_cursor((reverse, position))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            reverse, position = bool(data['r']), list(data['p'])
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            # Cursor gerado com outra ordenação (?ordering= mudou): recomeça do início
+            raise NotFound(self.invalid_cursor_message)
+        return reverse, position
+
+    def encode_cursor(self, cursor):
+        reverse, position = cursor
+        payload = json.dumps({'r': int(reverse), 'p': position}, separators=(',', ':'))
+        encoded = b64encode(payload.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_html_context(self):
+        return {'previous_url': self.get_previous_link(), 'next_url': self.get_next_link()}
+
+
+def _cursor_value(value):
+    # isoformat completo: o DjangoJSONEncoder corta microssegundos e quebraria a igualdade do keyset
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _reverse_ordering(ordering):
+    return tuple(field[1:] if field.startswith('-') else '-' + field for field in ordering)
+
+
+def _after(ordering, position):
+    """WHERE da chave composta: (a, b, c) "depois de" (x, y, z) respeitando a direção de cada campo."""
+    condition = Q()
+    equal_prefix = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip('-')
+        lookup = '__lt' if field.startswith('-') else '__gt'
+        condition |= equal_prefix & Q(**{name + lookup: value})
+        equal_prefix &= Q(**{name: value})
+    return condition
+
+
+def _is_keyset_safe(model, field):
+    name = field.lstrip('-')
+    if name == 'pk':
+        return True
+    if '__' in name:
+        return False
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return False
+    # NULL quebra a comparação > / < do keyset
+    return model_field.concrete and not model_field.null and not model_field.is_relation
@@ -0,0 +1,235 @@
+# permissions.py
+"""
+Motor de autorização com escopo de requisição.
+
+AuthContext calcula uma única vez por requisição, com no máximo duas queries:
+  1. as turmas que o usuário ensina e as turmas em que está matriculado (ativo);
+  2. as atividades que ele criou ou que estão atribuídas a alguma dessas turmas.
+O resultado fica memorizado na própria request. As permissões de objeto e os filtros de
+queryset consultam só esses conjuntos em memória, então checar 1 ou 1.000 objetos numa
+lista custa as mesmas queries.
+"""
+from functools import cached_property
+
+from django.db.models import Q
+from rest_framework import permissions
+
+from . import entitlements
+from core.models import (
+    User, Profile, Payment, Subscription, ClassModel, ClassStudent, Invite,
+    Activity, ActivityClass, Submission, Feedback
+)
+
+
+class AuthContext:
+    """Fatos de autorização do usuário da requisição, carregados sob demanda e memorizados."""
+
+    def __init__(self, user):
+        self.user = user
+        self.authenticated = bool(user and user.is_authenticated)
+        self.user_id = user.pk if self.authenticated else None
+        self.is_teacher = self.authenticated and bool(user.is_teacher)
+        self.is_staff = self.authenticated and bool(user.is_staff)
+
+    # --- Query 1: turmas ---
+    @cached_property
+    def _class_memberships(self):
+        if not self.authenticated:
+            return frozenset(), frozenset()
+        rows = ClassModel.objects.filter(
+            Q(professor_id=self.user_id) |
+            Q(class_students__student_id=self.user_id, class_students__removed_at__isnull=True)
+        ).values_list('id', 'professor_id').distinct()
+        taught, enrolled = set(), set()
+        for class_id, professor_id in rows:
+            (taught if professor_id == self.user_id else enrolled).add(class_id)
+        return frozenset(taught), frozenset(enrolled)
+
+    @property
+    def taught_class_ids(self):
+        return self._class_memberships[0]
+
+    @property
+    def enrolled_class_ids(self):
+        return self._class_memberships[1]
+
+    @property
+    def member_class_ids(self):
+        return self.taught_class_ids | self.enrolled_class_ids
+
+    # --- Query 2: atividades ---
+    @cached_property
+    def _activities(self):
+        """(atividades criadas pelo usuário, mapa atividade -> turmas do usuário onde foi atribuída)."""
+        if not self.authenticated:
+            return frozenset(), {}
+        condition = Q(professor_id=self.user_id)
+        if self.member_class_ids:
+            condition |= Q(activity_classes__class_instance_id__in=self.member_class_ids)
+        rows = Activity.objects.filter(condition).values_list(
+            'id', 'professor_id', 'activity_classes__class_instance_id'
+        )
+        authored, classes_by_activity = set(), {}
+        for activity_id, professor_id, class_id in rows:
+            if professor_id == self.user_id:
+                authored.add(activity_id)
+            if class_id in self.member_class_ids:
+                classes_by_activity.setdefault(activity_id, set()).add(class_id)
+        return frozenset(authored), classes_by_activity
+
+    @property
+    def authored_activity_ids(self):
+        return self._activities[0]
+
+    @cached_property
+    def teaching_activity_ids(self):
+        """Atividades que o usuário criou ou que estão em turmas que ele ensina."""
+        return self.authored_activity_ids | {
+            activity_id for activity_id, classes in self._activities[1].items() if classes & self.taught_class_ids
+        }
+
+    @cached_property
+    def student_activity_ids(self):
+        """Atividades atribuídas a turmas em que o usuário está matriculado."""
+        return frozenset(
+            activity_id for activity_id, classes in self._activities[1].items() if classes & self.enrolled_class_ids
+        )
+
+    @cached_property
+    def premium_active(self):
+        """Direito premium do usuário (cache do Django; sem query em hit)."""
+        return self.authenticated and entitlements.has_premium(self.user_id)
+
+    @property
+    def visible_activity_ids(self):
+        return self.teaching_activity_ids | self.student_activity_ids
+
+    # --- Checagens de objeto (sem query além das duas acima) ---
+    def owns(self, obj):
+        if isinstance(obj, User):
+            return obj.pk == self.user_id
+        if isinstance(obj, Submission):
+            return obj.student_id == self.user_id
+        if isinstance(obj, Feedback):
+            return obj.professor_id == self.user_id
+        if isinstance(obj, (Profile, Payment, Subscription)):
+            return obj.user_id == self.user_id
+        return False
+
+    def teaches(self, obj):
+        """Professor da turma (ou da atividade/turma à qual o objeto pertence)."""
+        if isinstance(obj, ClassModel):
+            return obj.professor_id == self.user_id
+        if isinstance(obj, Invite):
+            return obj.class_invite_id in self.taught_class_ids
+        if isinstance(obj, ClassStudent):
+            return obj.class_instance_id in self.taught_class_ids
+        if isinstance(obj, Activity):
+            return obj.id in self.teaching_activity_ids
+        if isinstance(obj, ActivityClass):
+            return obj.activity_id in self.authored_activity_ids or obj.class_instance_id in self.taught_class_ids
+        if isinstance(obj, Submission):
+            return obj.activity_id in self.teaching_activity_ids
+        if isinstance(obj, Feedback):
+            return obj.professor_id == self.user_id
+        return False
+
+    def teaches_activity(self, obj):
+        if isinstance(obj, Activity):
+            return obj.id in self.authored_activity_ids
+        if isinstance(obj, (ActivityClass, Submission)):
+            return obj.activity_id in self.authored_activity_ids
+        return False
+
+    def is_member(self, obj):
+        """Professor ou aluno ativo da turma relacionada ao objeto."""
+        if isinstance(obj, ClassModel):
+            return obj.id in self.member_class_ids
+        if isinstance(obj, ClassStudent):
+            return obj.class_instance_id in self.member_class_ids or obj.student_id == self.user_id
+        if isinstance(obj, Activity):
+            return obj.id in self.visible_activity_ids
+        if isinstance(obj, Submission):
+            return obj.student_id == self.user_id or obj.activity_id in self.teaching_activity_ids
+        if isinstance(obj, Feedback):
+            submission = obj.submission # Um objeto por requisição de detalhe
+            return obj.professor_id == self.user_id or self.is_member(submission)
+        return False
+
+    # --- Filtros de queryset ---
+    def filter_classes(self, queryset):
+        return queryset.filter(id__in=self.member_class_ids)
+
+    def filter_activities(self, queryset):
+        return queryset.filter(id__in=self.visible_activity_ids)
+
+    def filter_teaching_submissions(self, queryset):
+        return queryset.filter(activity_id__in=self.teaching_activity_ids)
+
+
+def get_auth_context(request):
+    """AuthContext memorizado na requisição (uma instância por request)."""
+    context = getattr(request, '_auth_context', None)
+    if context is None or context.user is not request.user:
+        context = AuthContext(request.user)
+        request._auth_context = context
+    return context
+
+
+# -----------------------------
+# PERMISSÕES PERSONALIZADAS
+# -----------------------------
+
+class ObjectPermission(permissions.BasePermission):
+    """Base: libera no nível da view e decide no nível do objeto via AuthContext."""
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated)
+
+    def has_object_permission(self, request, view, obj):
+        return self.check(get_auth_context(request), obj)
+
+    def check(self, context, obj):
+        raise NotImplementedError
+
+
+class IsTeacher(permissions.BasePermission):
+    """Usuário autenticado com is_teacher. Também vale no nível de objeto para que ~IsTeacher funcione."""
+    def has_permission(self, request, view):
+        return get_auth_context(request).is_teacher
+
+    def has_object_permission(self, request, view, obj):
+        return self.has_permission(request, view)
+
+
+class IsTeacherAndPremiumActive(permissions.BasePermission):
+    """Professor com assinatura premium vigente (gate dos caminhos de criação)."""
+    message = 'É necessária uma assinatura premium ativa para esta ação.'
+
+    def has_permission(self, request, view):
+        context = get_auth_context(request)
+        return context.is_teacher and context.premium_active
+
+
+class IsClassTeacher(ObjectPermission):
+    """Professor da turma do objeto (turma, convite, matrícula, atividade atribuída, submissão)."""
+    def check(self, context, obj):
+        return context.teaches(obj)
+
+
+class IsActivityTeacher(ObjectPermission):
+    """Professor que criou a atividade."""
+    def check(self, context, obj):
+        return context.teaches_activity(obj)
+
+
+class IsOwner(ObjectPermission):
+    """Dono do objeto (usuário, pagamento, assinatura, submissão do aluno, feedback do professor)."""
+    def check(self, context, obj):
+        return context.owns(obj)
+
+
+class IsClassMember(ObjectPermission):
+    """Professor ou aluno ativo de uma turma relacionada ao objeto."""
+    def check(self, context, obj):
+        return context.is_member(obj)
@@ -0,0 +1,69 @@
+# score_stats.py
+"""
+Leitura de GET /api/activities/{id}/stats/.
+
+count, média, desvio padrão e histograma saem dos agregados corridos em ActivityScoreStats (sem
+varrer os Feedbacks), com uma nota por aluno: a que aparece no boletim. Mediana e percentis exatos precisam das notas: são calculados sob demanda
+com NumPy e ficam no cache do Django com a version dos agregados na chave, então valem até a
+próxima escrita de Feedback da atividade.
+"""
+import math
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from core.models import ActivityScoreBucket, ActivityScoreStats
+
+PERCENTILES = (10, 25, 50, 75, 90)
+STATS_CACHE_TTL = getattr(settings, 'ACTIVITY_STATS_CACHE_TTL', 60 * 60)
+
+
+def _round(value):
+    return None if value is None else round(value, 4)
+
+
+def _percentiles(activity_id, version, scale):
+    key = f'activity-stats:pct:{activity_id}:{version}'
+    cached = cache.get(key)
+    if cached is None:
+        scores = np.array(ActivityScoreStats.scores(activity_id), dtype=float)
+        cached = {} if not scores.size else {
+            f'p{p}': _round(v / scale) for p, v in zip(PERCENTILES, np.percentile(scores, PERCENTILES))
+        }
+        cache.set(key, cached, STATS_CACHE_TTL)
+    return cached
+
+
+def activity_stats(activity):
+    stats = ActivityScoreStats.objects.filter(activity_id=activity.id).first()
+    if stats is None:
+        # Primeira leitura: monta os agregados a partir dos Feedbacks existentes
+        ActivityScoreStats.rebuild(activity.id)
+        stats = ActivityScoreStats.objects.get(activity_id=activity.id)
+
+    scale = ActivityScoreStats.scale_for(activity.max_score)
+    counts = dict(ActivityScoreBucket.objects.filter(activity_id=activity.id).values_list('bucket', 'count'))
+    size = ActivityScoreStats.BUCKETS
+    histogram = [
+        {'from': _round(i / size), 'to': _round((i + 1) / size), 'count': counts.get(i, 0)} for i in range(size)
+    ]
+
+    mean = stddev = None
+    if stats.count:
+        raw_mean = stats.score_sum / stats.count
+        mean = raw_mean / scale
+        # Desvio populacional a partir das somas; max() absorve o erro de arredondamento perto de zero
+        stddev = math.sqrt(max(stats.score_sq_sum / stats.count - raw_mean * raw_mean, 0.0)) / scale
+
+    percentiles = _percentiles(activity.id, stats.version, scale) if stats.count else {}
+    return {
+        'activity_id': activity.id,
+        'max_score': scale,
+        'count': stats.count,
+        'mean': _round(mean),
+        'median': percentiles.get('p50'),
+        'stddev': _round(stddev),
+        'percentiles': percentiles,
+        'histogram': histogram,
+    }
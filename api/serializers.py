@@ -1,19 +1,82 @@
 # serializers.py
+import operator
+
 from rest_framework import serializers
+from rest_framework.relations import PKOnlyObject
 from django.contrib.auth.hashers import make_password
 # Importar timezone para validações de data
 from django.utils import timezone
+from django.conf import settings
+
+from .fieldsets import SparseFieldsetMixin
+from core import file_formats, graders
+from core.storage import get_storage
 
 from core.models import (
     User, Profile, Plan, Payment, Subscription, ClassModel,
-    ClassStudent, Invite, Activity, ActivityClass, Submission, Feedback
+    ClassStudent, Invite, Activity, ActivityClass, Submission, Feedback, AutoGradingRule
 )
 
 # -----------------------------
 # 1. SERIALIZERS DE USUÁRIO E PERFIL
 # -----------------------------
 
-class UserReadSerializer(serializers.ModelSerializer):
+def _nullable(cast, value):
+    # Mesmo tratamento do Serializer.to_representation: None passa direto, o resto é convertido pelo campo
+    return None if value is None else cast(value)
+
+
+def _bound_datetime_field():
+    """DateTimeField com a timezone ativa já resolvida (evita consultá-la a cada data formatada)."""
+    return serializers.DateTimeField(read_only=True, default_timezone=timezone.get_current_timezone() if settings.USE_TZ else None)
+
+
+def profile_representation(profile, datetime_field=None):
+    """Representação de leitura do Profile, idêntica a ProfileSerializer(profile).data, sem instanciar serializer."""
+    datetime_field = datetime_field or _bound_datetime_field()
+    return {
+        'age': _nullable(int, profile.age),
+        'school': _nullable(str, profile.school),
+        'teaching_area': _nullable(str, profile.teaching_area),
+        'disciplines_list': [str(d) for d in profile.disciplines_list],
+        'experience_years': _nullable(int, profile.experience_years),
+        'created_at': datetime_field.to_representation(profile.created_at),
+        'updated_at': datetime_field.to_representation(profile.updated_at),
+    }
+
+
+# Conversões dos campos simples, equivalentes ao to_representation de cada um (sem o custo por valor)
+_FAST_CASTS = {
+    serializers.CharField: str,
+    serializers.EmailField: str,
+    serializers.IntegerField: int,
+    serializers.BooleanField: bool,
+}
+
+
+def field_reader(serializer, field, datetime_field):
+    """
+    Função instance -> valor do campo, equivalente ao laço do Serializer.to_representation. Campos
+    simples com source direto viram attrgetter + conversão; o resto usa o próprio campo.
+    """
+    if isinstance(field, serializers.SerializerMethodField):
+        return getattr(serializer, field.method_name)
+    direct = len(field.source_attrs) == 1
+    getter = operator.attrgetter(field.source) if direct else None
+    cast = _FAST_CASTS.get(type(field)) if direct else None
+    if cast is not None:
+        return lambda instance: _nullable(cast, getter(instance))
+    if direct and type(field) is serializers.DateTimeField and not hasattr(field, 'format') and not hasattr(field, 'timezone'):
+        return lambda instance: _nullable(datetime_field.to_representation, getter(instance))
+
+    def read(instance):
+        attribute = field.get_attribute(instance)
+        check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+        return None if check_for_none is None else field.to_representation(attribute)
+    return read
+
+
+class UserReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para representar dados do usuário na leitura."""
     profile = serializers.SerializerMethodField() # Incluir perfil na leitura
 
@@ -26,15 +89,28 @@ class UserReadSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'verified_email']
 
+    # Caminho rápido: um leitor por campo (field_reader), montado uma vez a partir de self.fields (já com
+    # ?fields/?exclude do SparseFieldsetMixin), em vez de percorrer os campos do ModelSerializer e criar um
+    # ProfileSerializer por usuário. Use com select_related('profile') para evitar N+1. JSON idêntico ao
+    # do ModelSerializer (ver api/tests.py).
+    def to_representation(self, instance):
+        # Com many=True a mesma instância (child) serializa todos os itens: prepara tudo uma vez só
+        if not hasattr(self, '_readers'):
+            self._datetime_field = _bound_datetime_field()
+            self._readers = [
+                (field.field_name, field_reader(self, field, self._datetime_field)) for field in self._readable_fields
+            ]
+        return {name: read(instance) for name, read in self._readers}
+
     def get_profile(self, obj):
         # Inclui o perfil se existir
         profile = getattr(obj, 'profile', None)
         if profile:
-            return ProfileSerializer(profile).data
+            return profile_representation(profile, getattr(self, '_datetime_field', None))
         return None
 
 
-class UserWriteSerializer(serializers.ModelSerializer):
+class UserWriteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para criar e atualizar dados básicos do usuário, incluindo senha."""
     password = serializers.CharField(write_only=True, required=False) # required=False permite atualizar sem mudar senha
 
@@ -60,7 +136,7 @@ class UserWriteSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Profile."""
     # Usa disciplines_list para entrada/saída de lista, o modelo converte para/de string
     disciplines_list = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=True)
@@ -103,7 +179,7 @@ class UserProfileUpdateSerializer(serializers.Serializer):
 # 2. PLANOS E FINANCEIRO
 # --------------------------------
 
-class PlanSerializer(serializers.ModelSerializer):
+class PlanSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Plan."""
     class Meta:
         model = Plan
@@ -111,7 +187,7 @@ class PlanSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Payment."""
     formatted_amount = serializers.ReadOnlyField() # Para exibir o valor formatado
     plan_name = serializers.ReadOnlyField(source='plan.name') # Nome do plano para leitura
@@ -123,7 +199,7 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'plan', 'plan_name', 'amount', 'formatted_amount', 'status', 'created_at', 'confirmed_at', 'expires_at']
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Subscription."""
     plan_name = serializers.ReadOnlyField(source='plan.name') # Nome do plano para leitura
 
@@ -170,10 +246,11 @@ class PaymentInitiateSerializer(serializers.Serializer):
 # 3. TURMAS E ASSOCIADOS
 # --------------------------------
 
-class ClassModelSerializer(serializers.ModelSerializer):
+class ClassModelSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo ClassModel."""
     professor_name = serializers.ReadOnlyField(source='professor.full_name') # Nome do professor para leitura
-    students_count = serializers.SerializerMethodField() # Contagem de alunos ativos para leitura
+    # Contagem de alunos ativos: lida do contador desnormalizado (sem COUNT por turma)
+    students_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = ClassModel
@@ -181,12 +258,8 @@ class ClassModelSerializer(serializers.ModelSerializer):
         # professor é definido no backend na criação
         read_only_fields = ['id', 'professor', 'professor_name', 'created_at', 'students_count']
 
-    def get_students_count(self, obj):
-        """Calcula o número de alunos ativos na turma."""
-        return obj.class_students.filter(removed_at__isnull=True).count()
 
-
-class InviteSerializer(serializers.ModelSerializer):
+class InviteSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Invite."""
     class_name = serializers.ReadOnlyField(source='class_invite.name') # Nome da turma para leitura
 
@@ -213,7 +286,29 @@ class InviteSerializer(serializers.ModelSerializer):
         return data
 
 
-class ClassStudentSerializer(serializers.ModelSerializer):
+class InviteBulkCreateSerializer(serializers.Serializer):
+    """Serializer para validar a geração de convites em lote (N convites por turma)."""
+    MAX_TOTAL = 10000 # Limite de convites por requisição
+
+    class_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    count = serializers.IntegerField(min_value=1, max_value=MAX_TOTAL) # Convites por turma
+    alias = serializers.CharField(max_length=100, required=False, allow_null=True, allow_blank=True)
+    max_uses = serializers.IntegerField(min_value=0, required=False, allow_null=True)
+    expires_at = serializers.DateTimeField(required=False, allow_null=True)
+
+    def validate(self, data):
+        data['class_ids'] = list(dict.fromkeys(data['class_ids'])) # Remove ids repetidos mantendo a ordem
+
+        if len(data['class_ids']) * data['count'] > self.MAX_TOTAL:
+            raise serializers.ValidationError({"count": f"Máximo de {self.MAX_TOTAL} convites por requisição."})
+
+        expires_at = data.get('expires_at')
+        if expires_at is not None and expires_at < timezone.now():
+             raise serializers.ValidationError({"expires_at": "Data de expiração não pode ser no passado."})
+        return data
+
+
+class ClassStudentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo ClassStudent (associação Aluno-Turma)."""
     student_name = serializers.ReadOnlyField(source='student.full_name') # Nome do aluno para leitura
     student_email = serializers.ReadOnlyField(source='student.email') # Email do aluno para leitura
@@ -230,16 +325,24 @@ class ClassStudentSerializer(serializers.ModelSerializer):
 # 4. ATIVIDADES
 # --------------------------------
 
-class ActivitySerializer(serializers.ModelSerializer):
+class ActivitySerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Activity."""
     professor_name = serializers.ReadOnlyField(source='professor.full_name') # Nome do professor para leitura
 
     class Meta:
         model = Activity
-        fields = ['id', 'professor', 'professor_name', 'title', 'description', 'max_score', 'due_date', 'notify_before_days', 'status', 'created_at']
+        fields = ['id', 'professor', 'professor_name', 'title', 'description', 'max_score', 'due_date', 'notify_before_days', 'status', 'allowed_formats', 'created_at']
         # professor é definido no backend na criação
         read_only_fields = ['id', 'professor', 'professor_name', 'created_at']
 
+    def validate_allowed_formats(self, value):
+        if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+            raise serializers.ValidationError("Informe uma lista de formatos.")
+        unknown = [name for name in value if name not in file_formats.FORMATS and name not in file_formats.FORMAT_GROUPS]
+        if unknown:
+            raise serializers.ValidationError(f"Formatos desconhecidos: {', '.join(unknown)}.")
+        return sorted(set(value))
+
     # Implementar método validate() para validações customizadas
     def validate(self, data):
         max_score = data.get('max_score')
@@ -270,7 +373,7 @@ class ActivitySerializer(serializers.ModelSerializer):
         return data
 
 
-class ActivityClassSerializer(serializers.ModelSerializer):
+class ActivityClassSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo ActivityClass (associação Atividade-Turma)."""
     activity_title = serializers.ReadOnlyField(source='activity.title') # Título da atividade para leitura
     class_name = serializers.ReadOnlyField(source='class_instance.name') # Nome da turma para leitura
@@ -286,7 +389,7 @@ class ActivityClassSerializer(serializers.ModelSerializer):
 # 5. SUBMISSÕES E FEEDBACK
 # --------------------------------
 
-class SubmissionSerializer(serializers.ModelSerializer):
+class SubmissionSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Submission."""
     student_name = serializers.ReadOnlyField(source='student.full_name') # Nome do aluno para leitura
     activity_title = serializers.ReadOnlyField(source='activity.title') # Título da atividade para leitura
@@ -296,28 +399,43 @@ class SubmissionSerializer(serializers.ModelSerializer):
 
     # Campo para retornar a URL pública do arquivo Cloudinary na leitura
     file_url = serializers.SerializerMethodField() # Adicionado campo de URL
+    # Miniatura e versão de exibição (core/media.py); nulas até o processamento em segundo plano
+    thumbnail_url = serializers.SerializerMethodField()
+    display_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Submission
         # Adicionado 'file_url' para leitura
-        fields = ['id', 'activity', 'activity_title', 'student', 'student_name', 'file_path', 'mime_type', 'submitted_at', 'status', 'file', 'file_url']
+        fields = ['id', 'activity', 'activity_title', 'student', 'student_name', 'file_path', 'mime_type', 'submitted_at', 'status', 'file', 'file_url', 'thumbnail_url', 'display_url']
         # Campos definidos na View/lógica de submissão
-        read_only_fields = ['id', 'activity', 'activity_title', 'student', 'student_name', 'file_path', 'mime_type', 'submitted_at', 'file_url'] # file_url é calculado
+        # activity é gravável só para a criação; update() da view não a altera
+        read_only_fields = ['id', 'activity_title', 'student', 'student_name', 'file_path', 'mime_type', 'submitted_at', 'file_url', 'thumbnail_url', 'display_url'] # URLs são calculadas
+        # A view valida a atividade (membro da turma) e define o status inicial
+        extra_kwargs = {'activity': {'required': False}, 'status': {'required': False}}
 
     # Método para obter a URL do arquivo (se file_path contiver a URL completa)
     # Se file_path for apenas o public_id, construa a URL aqui usando a base do Cloudinary
     def get_file_url(self, obj):
         """Retorna a URL pública do arquivo submetido."""
         if obj.file_path:
-            # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: URL CLOUDINARY <<<
-            # Se file_path já é a URL completa salva, retorne-o diretamente.
-            # Se você salvou apenas o public_id, construa a URL usando sua base do Cloudinary.
-            # Ex: return f"https://res.cloudinary.com/seu-cloud-name/image/upload/{obj.file_path}" # Se file_path é public_id
-            # Ex: return cloudinary.utils.api_url(obj.file_path) # Usando SDK util (se file_path é public_id)
-            return obj.file_path # Assumindo que file_path já é a URL completa
+            if obj.file_path.startswith(('http://', 'https://')):
+                return obj.file_path # Registros antigos guardavam a URL completa
+            # file_path é a chave no backend de armazenamento (core/storage.py)
+            return get_storage().url(obj.file_path)
 
         return None
 
+    def _derivative_url(self, obj, kind):
+        # Chave anotada no queryset da view (BlobDerivative.annotate_keys); sem anotação, sem URL
+        key = getattr(obj, f'{kind}_key', None)
+        return get_storage().url(key) if key else None
+
+    def get_thumbnail_url(self, obj):
+        return self._derivative_url(obj, 'thumbnail')
+
+    def get_display_url(self, obj):
+        return self._derivative_url(obj, 'display')
+
     # Implementar método validate() para validações customizadas
     def validate(self, data):
          # Exemplo: Validar status se ele for enviado na requisição (geralmente só pelo professor)
@@ -332,7 +450,21 @@ class SubmissionSerializer(serializers.ModelSerializer):
          return data
 
 
-class FeedbackSerializer(serializers.ModelSerializer):
+class UploadInitSerializer(serializers.Serializer):
+    """Início de um upload em partes (retomável) para uma submissão."""
+    activity = serializers.PrimaryKeyRelatedField(queryset=Activity.objects.all())
+    filename = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100, required=False, allow_blank=True, default='')
+    size = serializers.IntegerField(min_value=1)
+
+    def validate_size(self, value):
+        max_size = getattr(settings, 'SUBMISSION_MAX_UPLOAD_SIZE', 200 * 1024 * 1024)
+        if value > max_size:
+            raise serializers.ValidationError(f'Arquivo maior que o limite de {max_size} bytes.')
+        return value
+
+
+class FeedbackSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer para o modelo Feedback."""
     professor_name = serializers.ReadOnlyField(source='professor.full_name') # Nome do professor para leitura
 
@@ -379,4 +511,39 @@ class FeedbackSerializer(serializers.ModelSerializer):
 
     # TODO: Implementar método validate() para validações customizadas na criação
     # Ex: Validar que 'submission' existe e que o usuário logado é o professor da atividade associada.
-    # Essa validação também é feita na View, mas pode ser redundante aqui.
\ No newline at end of file
+    # Essa validação também é feita na View, mas pode ser redundante aqui.
+
+
+class FeedbackBulkItemSerializer(serializers.Serializer):
+    """Um item da correção em lote. max_score e a posse da atividade são checados na view, em memória."""
+    submission = serializers.IntegerField()
+    score = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=0, required=False, allow_null=True)
+    comment = serializers.CharField(required=False, allow_null=True, allow_blank=True)
+
+
+class FeedbackBulkSerializer(serializers.Serializer):
+    """Envelope da correção em lote: {"items": [{submission, score, comment}, ...]}."""
+    MAX_ITEMS = 500
+
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_ITEMS)
+
+
+class AutoGradingRuleSerializer(serializers.ModelSerializer):
+    """Regra de correção automática; a config é validada pelo corretor do tipo (core/graders.py)."""
+
+    class Meta:
+        model = AutoGradingRule
+        fields = ['id', 'kind', 'config', 'weight', 'created_at']
+        read_only_fields = ['id', 'created_at']
+
+    def validate_weight(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("O peso deve ser positivo.")
+        return value
+
+    def validate(self, data):
+        try:
+            graders.validate_config(data.get('kind'), data.get('config', {}))
+        except graders.InvalidRuleConfig as e:
+            raise serializers.ValidationError({"config": str(e)})
+        return data
\ No newline at end of file
@@ -0,0 +1,37 @@
+# signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from core.models import User, Profile, Subscription
+from . import entitlements, me_cache
+
+
+def _invalidate_me(user_id):
+    me_cache.invalidate(user_id)
+    # De novo após o commit: um GET concorrente pode ter cacheado o estado antigo antes do commit
+    transaction.on_commit(lambda: me_cache.invalidate(user_id))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    """Invalida o /me do usuário. Login (update_last_login) não altera o payload e é ignorado."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    _invalidate_me(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def profile_changed(sender, instance, **kwargs):
+    _invalidate_me(instance.user_id)
+
+
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def subscription_changed(sender, instance, **kwargs):
+    """Webhooks, cancelamento e admin salvam a Subscription: o direito premium é recalculado no próximo acesso."""
+    user_id = instance.user_id
+    entitlements.invalidate(user_id)
+    transaction.on_commit(lambda: entitlements.invalidate(user_id))
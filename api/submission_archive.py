@@ -0,0 +1,105 @@
+# submission_archive.py
+"""
+ZIP com a última submissão de cada aluno de uma atividade (GET /api/activities/{id}/submissions-zip/).
+
+O arquivo é montado em streaming: zipfile escreve num buffer que não permite seek (usa data
+descriptors), o buffer é esvaziado a cada bloco e cada arquivo é lido do backend de armazenamento
+em blocos de COPY_BLOCK_SIZE. Em memória ficam só o bloco atual e o diretório central (um ZipInfo
+por arquivo), qualquer que seja o tamanho do ZIP. Entradas em ZIP_STORED: PDFs e vídeos já são
+comprimidos, deflate só gastaria CPU.
+"""
+import logging
+import mimetypes
+import re
+import zipfile
+
+from django.utils import timezone
+
+from core.models import StudentActivity, Submission
+from core.storage import COPY_BLOCK_SIZE, get_storage
+
+logger = logging.getLogger(__name__)
+
+SKIPPED_STATUSES = ('uploading', 'upload_failed')
+NO_CLASS = 'Sem turma'
+
+
+class _StreamBuffer:
+    """Destino sem seek para o ZipFile: acumula o que foi escrito até o próximo drain()."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _safe(name):
+    """Nome de pasta/arquivo sem separadores nem caracteres problemáticos."""
+    name = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', '_', name or '').strip(' .')
+    return name[:100] or '_'
+
+
+def latest_submissions(activity_id):
+    """Última submissão com arquivo de cada aluno: (aluno, nome, id, file_path, mime_type, enviada_em, tamanho)."""
+    # is_latest: uma linha por aluno direto do índice parcial, sem deduplicar aqui. Se a última ainda
+    # está em envio (ou falhou), o aluno fica fora: a anterior foi substituída.
+    return (
+        Submission.objects.filter(activity_id=activity_id, is_latest=True, file_path__isnull=False)
+        .exclude(status__in=SKIPPED_STATUSES).exclude(file_path__startswith='http')
+        .order_by('submitted_at', 'id')
+        .values_list('student_id', 'student__full_name', 'id', 'file_path', 'mime_type', 'submitted_at', 'blob__size')
+        .iterator(chunk_size=500)
+    )
+
+
+def archive_entries(activity_id):
+    """(nome no ZIP, file_path, tamanho ou None, enviada_em), organizados em <turma>/<aluno>/."""
+    # Turma de cada aluno na atividade pelo índice materializado; aluno em várias turmas vai na primeira
+    class_of = {}
+    for student_id, class_name in (
+        StudentActivity.objects.filter(activity_id=activity_id)
+        .order_by('class_instance__name', 'class_instance_id')
+        .values_list('student_id', 'class_instance__name').iterator(chunk_size=2000)
+    ):
+        class_of.setdefault(student_id, class_name)
+
+    for student_id, full_name, submission_id, file_path, mime_type, submitted_at, size in latest_submissions(activity_id):
+        folder = f'{_safe(class_of.get(student_id, NO_CLASS))}/{_safe(full_name)} ({student_id})'
+        ext = mimetypes.guess_extension(mime_type or '') or ''
+        submitted_at = timezone.localtime(submitted_at)
+        yield f'{folder}/submissao_{submission_id}_{submitted_at:%Y%m%d-%H%M%S}{ext}', file_path, size, submitted_at
+
+
+def stream_activity_zip(activity_id):
+    """Gerador de blocos do ZIP, para StreamingHttpResponse."""
+    storage = get_storage()
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for arcname, file_path, size, submitted_at in archive_entries(activity_id):
+            try:
+                source = storage.open(file_path)
+            except FileNotFoundError:
+                logger.warning(f"Arquivo {file_path} ausente no armazenamento; fora do ZIP da atividade {activity_id}.")
+                continue
+            info = zipfile.ZipInfo(arcname, date_time=submitted_at.timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            if size is not None:
+                info.file_size = size # Decide sozinho se a entrada precisa de ZIP64
+            with source, zf.open(info, mode='w', force_zip64=size is None) as dest:
+                for block in iter(lambda: source.read(COPY_BLOCK_SIZE), b''):
+                    dest.write(block)
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            yield buffer.drain() # Data descriptor da entrada
+    yield buffer.drain() # Diretório central
@@ -0,0 +1,24 @@
+# testing.py
+"""
+Referências para os testes de igualdade (api/tests.py) e os benchmarks: serializers no caminho padrão
+do ModelSerializer, contra os quais os caminhos rápidos são comparados.
+"""
+from rest_framework import serializers
+
+from core.models import User
+from .serializers import ProfileSerializer, UserReadSerializer
+
+
+class ReferenceUserReadSerializer(serializers.ModelSerializer):
+    """UserReadSerializer sem o caminho rápido: ModelSerializer comum com o ProfileSerializer aninhado."""
+    profile = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = UserReadSerializer.Meta.fields # Campo novo no UserReadSerializer entra na comparação
+
+    def get_profile(self, obj):
+        profile = getattr(obj, 'profile', None)
+        if profile:
+            return ProfileSerializer(profile).data
+        return None
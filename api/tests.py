@@ -67,4 +67,1199 @@
 #         self.assertEqual(response.status_code, status.HTTP_200_OK)
 #         self.assertIn('access', response.data)
 #         self.assertIn('refresh', response.data)
-#         self.assertIn('user', response.data) 
\ No newline at end of file
+#         self.assertIn('user', response.data) 
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from io import BytesIO, StringIO
+
+import numpy as np
+
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.test import APIClient, APIRequestFactory
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api import me_cache
+from api.testing import ReferenceUserReadSerializer
+from api.permissions import IsClassMember, IsClassTeacher, get_auth_context
+from api.serializers import UserReadSerializer
+from core.invite_cache import invite_cache, MISSING
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from core import similarity, upload_offload
+from core.autograde import AutoGrader
+from core.media import MediaPipeline
+from core.storage import get_storage
+from core.testing import (
+    ESSAY, GatedStorage, RecordingStorage, make_activity, make_class, make_image, make_students, make_teacher,
+    make_user, make_zip, storage_backend, submit_file, submit_text, use_temp_storage
+)
+from core.models import (
+    User, Profile, Plan, Payment, Subscription, WebhookEvent, ClassStudent, Invite,
+    Activity, ActivityClass, StudentActivity, Submission, Feedback,
+    ActivityScoreStats, UploadSession, StoredBlob, AutoGradingRule, SubmissionSignature
+)
+
+
+class InviteConsumeConcurrencyTestCase(TransactionTestCase):
+    """Teste de carga com threads: vários alunos consumindo o mesmo código ao mesmo tempo."""
+    STUDENTS = 40
+    MAX_USES = 25
+
+    def setUp(self):
+        invite_cache.clear()
+        self.teacher = make_teacher()
+        self.class_obj = make_class(self.teacher, name='Turma A')
+        self.invite = Invite.objects.create(class_invite=self.class_obj, code='projetor01', max_uses=self.MAX_USES)
+        self.students = make_students(self.STUDENTS)
+
+    def _consume(self, student, barrier):
+        client = APIClient()
+        client.force_authenticate(user=student)
+        barrier.wait()
+        try:
+            return client.post(f'/api/invites/{self.invite.code}/consume/').status_code
+        finally:
+            connection.close()
+
+    def _storm(self, students):
+        barrier = threading.Barrier(len(students))
+        with ThreadPoolExecutor(max_workers=len(students)) as pool:
+            return list(pool.map(lambda s: self._consume(s, barrier), students))
+
+    def test_concurrent_consumers_never_exceed_max_uses(self):
+        # Cada aluno dispara duas vezes: a segunda chamada precisa ser idempotente
+        codes = self._storm(self.students + self.students[:10])
+
+        self.assertNotIn(500, codes)
+        self.invite.refresh_from_db()
+        self.class_obj.refresh_from_db()
+        enrolled = ClassStudent.objects.filter(class_instance=self.class_obj, removed_at__isnull=True).count()
+
+        self.assertEqual(self.invite.uses_count, self.MAX_USES)
+        self.assertEqual(enrolled, self.MAX_USES)
+        self.assertEqual(self.class_obj.students_count, enrolled)
+
+    def test_repeated_consume_is_idempotent(self):
+        client = APIClient()
+        client.force_authenticate(user=self.students[0])
+        url = f'/api/invites/{self.invite.code}/consume/'
+
+        self.assertEqual(client.post(url).status_code, 200)
+        self.assertEqual(client.post(url).status_code, 200)
+
+        self.invite.refresh_from_db()
+        self.assertEqual(self.invite.uses_count, 1)
+        self.assertEqual(ClassStudent.objects.filter(student=self.students[0]).count(), 1)
+
+
+class InviteCodeCacheTestCase(TestCase):
+    def setUp(self):
+        invite_cache.clear()
+        self.teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.class_obj = make_class(self.teacher, name='Turma A')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def test_unknown_code_is_cached_negatively(self):
+        self.assertEqual(self.client.post('/api/invites/naoexiste/consume/').status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertIs(invite_cache.resolve('naoexiste'), MISSING)
+
+        # Criar o convite invalida a entrada negativa
+        Invite.objects.create(class_invite=self.class_obj, code='naoexiste')
+        self.assertEqual(self.client.post('/api/invites/naoexiste/consume/').status_code, 200)
+
+    def test_update_and_exhaustion_invalidate_entry(self):
+        invite = Invite.objects.create(class_invite=self.class_obj, code='abc123', max_uses=1)
+        self.assertFalse(invite_cache.resolve('abc123').exhausted)
+
+        invite.max_uses = 5
+        invite.save()
+        self.assertIsNone(invite_cache.get('abc123'))
+
+        # Esgota o convite por fora do cache: o consumo falha no UPDATE condicional e invalida a entrada
+        invite_cache.resolve('abc123')
+        Invite.objects.filter(pk=invite.pk).update(uses_count=5)
+        self.assertEqual(self.client.post('/api/invites/abc123/consume/').status_code, 400)
+        self.assertFalse(ClassStudent.objects.filter(student=self.student).exists())
+        self.assertTrue(invite_cache.resolve('abc123').exhausted)
+
+        invite.delete()
+        self.assertIsNone(invite_cache.get('abc123'))
+
+    def test_claiming_last_use_marks_entry_exhausted(self):
+        Invite.objects.create(class_invite=self.class_obj, code='ultimo', max_uses=1)
+        invite_cache.resolve('ultimo')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.post('/api/invites/ultimo/consume/').status_code, 200)
+        self.assertTrue(invite_cache.get('ultimo').exhausted)
+
+        other = make_user('aluno2@exemplo.com', '10000000002')
+        self.client.force_authenticate(user=other)
+        with self.assertNumQueries(0): # Recusado pelo cache, sem matrícula nem UPDATE
+            self.assertEqual(self.client.post('/api/invites/ultimo/consume/').status_code, 400)
+
+
+class InviteBulkCreateTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.other = make_user('outro@exemplo.com', '00000000002', is_teacher=True)
+        self.classes = [make_class(self.teacher, name=f'Turma {i}') for i in range(3)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def test_bulk_creates_unique_codes_for_many_classes(self):
+        class_ids = [c.id for c in self.classes]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/invites/bulk/', {'class_ids': class_ids, 'count': 200, 'max_uses': 30}, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Número de queries limitado pelos lotes do INSERT, nunca uma por convite
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertEqual(response.data['created'], 600)
+        self.assertEqual(Invite.objects.count(), 600)
+        self.assertEqual(len({i['code'] for i in response.data['invites']}), 600)
+        self.assertEqual(Invite.objects.filter(class_invite=self.classes[1], max_uses=30).count(), 200)
+
+    def test_bulk_rejects_classes_of_other_teacher(self):
+        foreign = make_class(self.other, name='Alheia')
+        response = self.client.post('/api/invites/bulk/', {'class_ids': [self.classes[0].id, foreign.id], 'count': 2}, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.data['class_ids'], [foreign.id])
+        self.assertFalse(Invite.objects.exists())
+
+
+class UserReadSerializerTestCase(TestCase):
+    def setUp(self):
+        self.with_profile = make_teacher()
+        Profile.objects.filter(user=self.with_profile).update(
+            age=34, school='Escola Ção', disciplines='Matemática, Física', experience_years=0
+        )
+        self.without_profile = make_user('aluno@exemplo.com', '10000000001')
+        Profile.objects.filter(user=self.without_profile).delete()
+        self.admin = User.objects.create_superuser(email='admin@exemplo.com', password=None, full_name='Admin', cpf='99999999999')
+
+    def test_fast_path_renders_identical_json(self):
+        users = User.objects.select_related('profile').order_by('id')
+        render = JSONRenderer().render
+        self.assertEqual(
+            render(UserReadSerializer(users, many=True).data),
+            render(ReferenceUserReadSerializer(users, many=True).data),
+        )
+        for user in users:
+            self.assertEqual(render(UserReadSerializer(user).data), render(ReferenceUserReadSerializer(user).data))
+
+    def test_fast_path_follows_declared_fields(self):
+        # Campo novo (inclusive anulável e com source) entra no caminho rápido sem mexer no to_representation
+        extra = ['is_active', 'verification_sent_at', 'last_login', 'groups']
+
+        class Extended(UserReadSerializer):
+            teacher = serializers.BooleanField(source='is_teacher', read_only=True)
+
+            class Meta(UserReadSerializer.Meta):
+                fields = UserReadSerializer.Meta.fields + extra + ['teacher']
+
+        class ExtendedReference(ReferenceUserReadSerializer):
+            teacher = serializers.BooleanField(source='is_teacher', read_only=True)
+
+            class Meta(ReferenceUserReadSerializer.Meta):
+                fields = ReferenceUserReadSerializer.Meta.fields + extra + ['teacher']
+
+        User.objects.filter(pk=self.with_profile.pk).update(verification_sent_at=timezone.now())
+        users = User.objects.select_related('profile').order_by('id')
+        render = JSONRenderer().render
+        self.assertEqual(render(Extended(users, many=True).data), render(ExtendedReference(users, many=True).data))
+
+    def test_admin_list_has_no_profile_n_plus_one(self):
+        client = APIClient()
+        client.force_authenticate(user=self.admin)
+        with self.assertNumQueries(1):
+            response = client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+
+class MeCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('aluno@exemplo.com', '10000000001')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_me_is_served_from_cache_with_etag(self):
+        first = self.client.get('/api/users/me/')
+        self.assertEqual(first.status_code, 200)
+        etag = first['ETag']
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/users/me/')
+        self.assertEqual(second.data, first.data)
+
+        not_modified = self.client.get('/api/users/me/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def _get_me(self, **extra):
+        # Como numa requisição real, o usuário autenticado é recarregado do BD a cada chamada
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        return self.client.get('/api/users/me/', **extra)
+
+    def test_writes_invalidate_payload_and_etag(self):
+        etag = self._get_me()['ETag']
+
+        profile = Profile.objects.get(user=self.user)
+        profile.school = 'Escola Nova'
+        profile.save()
+        response = self._get_me(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['profile']['school'], 'Escola Nova')
+
+        response = self.client.patch('/api/users/me/', {'user': {'full_name': 'Nome Novo'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._get_me().data['full_name'], 'Nome Novo')
+
+
+    def test_payload_is_not_built_from_stale_request_user(self):
+        stale = User.objects.get(pk=self.user.pk) # Autenticado antes da escrita de outra requisição
+        self._get_me()
+        User.objects.filter(pk=self.user.pk).update(full_name='Nome Novo')
+        me_cache.invalidate(self.user.pk) # Invalidação pós-commit da escrita
+        self.client.force_authenticate(user=stale)
+        self.assertEqual(self.client.get('/api/users/me/').data['full_name'], 'Nome Novo')
+
+class KeysetPaginationTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        activity = Activity.objects.create(professor=self.teacher, title='Lista 1', status='open')
+        Submission.objects.bulk_create([
+            Submission(activity=activity, student=self.student, status='pending') for _ in range(45)
+        ])
+        # Metade com o mesmo submitted_at: o desempate pelo id precisa manter a ordem estável
+        ids = list(Submission.objects.order_by('id').values_list('id', flat=True))
+        Submission.objects.filter(id__in=ids[:23]).update(submitted_at=timezone.now() - timezone.timedelta(days=1))
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def _walk(self, url):
+        pages = []
+        while url:
+            with self.assertNumQueries(1): # Sem COUNT(*): só a query da página
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            url = response.data['next']
+        return pages
+
+    def test_walks_all_rows_forward_and_backward(self):
+        pages = self._walk('/api/submissions/?page_size=10')
+        ids = [row['id'] for page in pages for row in page['results']]
+        expected = list(Submission.objects.order_by('-submitted_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 5)
+        self.assertIsNone(pages[0]['previous'])
+
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual(previous['results'], pages[-2]['results'])
+
+    def test_ordering_filter_is_honored_with_pk_tiebreaker(self):
+        pages = self._walk('/api/submissions/?page_size=7&ordering=submitted_at')
+        ids = [row['id'] for page in pages for row in page['results']]
+        self.assertEqual(ids, list(Submission.objects.order_by('submitted_at', 'id').values_list('id', flat=True)))
+
+
+class SparseFieldsetTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        for i in range(5):
+            Activity.objects.create(professor=self.teacher, title=f'Lista {i}', status='open')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def test_fields_trims_payload_and_select(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/activities/?fields=id,title,due_date')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data[0]), {'id', 'title', 'due_date'})
+        self.assertEqual(len(ctx.captured_queries), 1)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertNotIn('description', sql)
+        self.assertNotIn('core_user', sql)
+
+    def test_related_field_is_joined_instead_of_lazy_loaded(self):
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/activities/?fields=id,professor_name')
+        self.assertEqual(response.data[0], {'id': response.data[0]['id'], 'professor_name': 'prof'})
+
+    def test_exclude_and_user_fast_path(self):
+        response = self.client.get('/api/activities/?exclude=description,professor_name')
+        self.assertNotIn('description', response.data[0])
+        self.assertIn('title', response.data[0])
+
+        admin = User.objects.create_superuser(email='admin@exemplo.com', password=None, full_name='Admin', cpf='99999999999')
+        self.client.force_authenticate(user=admin)
+        response = self.client.get('/api/users/?fields=id,email')
+        self.assertEqual(set(response.data[0]), {'id', 'email'})
+
+
+    def test_user_fast_path_sparse_fields_follow_declared_fields(self):
+        # Subclasse com campo extra: ?fields= com ele não depende de uma tabela de leitores mantida à mão
+        class Extended(UserReadSerializer):
+            class Meta(UserReadSerializer.Meta):
+                fields = UserReadSerializer.Meta.fields + ['is_active']
+
+        request = Request(APIRequestFactory().get('/api/users/', {'fields': 'id,is_active,profile'}))
+        users = User.objects.select_related('profile').order_by('id')
+        data = Extended(users, many=True, context={'request': request}).data
+        self.assertEqual(data[0], {'id': self.teacher.id, 'is_active': True, 'profile': data[0]['profile']})
+        self.assertEqual(data[0]['profile'], ReferenceUserReadSerializer(self.teacher).data['profile'])
+
+class AuthorizationEngineTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.other_teacher = make_user('prof2@exemplo.com', '00000000002', is_teacher=True)
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.classes = [make_class(self.teacher, [self.student] if i == 0 else [], name=f'Turma {i}') for i in range(3)]
+        self.foreign_class = make_class(self.other_teacher, name='Outra')
+        # Atividade de outro professor atribuída a uma turma do professor: ele também a corrige
+        self.activity = make_activity(self.other_teacher, self.classes[0])
+        self.hidden = make_activity(self.other_teacher, self.foreign_class, title='Oculta')
+        self.client = APIClient()
+
+    def _context(self, user):
+        request = APIRequestFactory().get('/')
+        request.user = user
+        return request, get_auth_context(request)
+
+    def test_context_is_memoized_and_costs_two_queries(self):
+        request, context = self._context(self.teacher)
+        with self.assertNumQueries(2):
+            self.assertEqual(context.taught_class_ids, {c.id for c in self.classes})
+            self.assertEqual(context.teaching_activity_ids, {self.activity.id})
+            self.assertIs(get_auth_context(request), context)
+            self.assertTrue(IsClassTeacher().has_object_permission(request, None, self.classes[1]))
+            self.assertFalse(IsClassMember().has_object_permission(request, None, self.foreign_class))
+            self.assertFalse(IsClassMember().has_object_permission(request, None, self.hidden))
+
+        _, context = self._context(self.student)
+        self.assertEqual(context.enrolled_class_ids, {self.classes[0].id})
+        self.assertEqual(context.student_activity_ids, {self.activity.id})
+
+    def test_list_permission_cost_does_not_grow_with_rows(self):
+        self.client.force_authenticate(user=self.teacher)
+        for total in (5, 40):
+            Submission.objects.bulk_create([
+                Submission(activity=self.activity, student=self.student, status='pending') for _ in range(total)
+            ])
+            Submission.objects.create(activity=self.hidden, student=self.student, status='pending')
+            with self.assertNumQueries(3): # Turmas + atividades + página
+                response = self.client.get('/api/submissions/?page_size=100')
+            self.assertTrue(all(row['activity'] == self.activity.id for row in response.data['results']))
+
+    def test_submission_requires_enrollment_and_class_update_requires_teacher(self):
+        self.client.force_authenticate(user=self.student)
+        response = self.client.post('/api/submissions/', {'status': 'pending'})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(user=self.other_teacher)
+        response = self.client.patch(f'/api/classes/{self.classes[0].id}/', {'name': 'X'})
+        self.assertEqual(response.status_code, 403)
+        self.client.force_authenticate(user=self.teacher)
+        response = self.client.patch(f'/api/classes/{self.classes[0].id}/', {'name': 'X'})
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(APPMAX_WEBHOOK_SECRET='segredo-de-teste')
+class AppmaxWebhookInboxTestCase(TestCase):
+    def setUp(self):
+        self.user = make_user('aluno@exemplo.com', '10000000001')
+        self.plan = Plan.objects.create(name='Premium', price_cents=2990)
+        self.subscription = Subscription.objects.create(
+            user=self.user, plan=self.plan, appmax_subscription_id='sub_1', status='pending'
+        )
+        self.client = APIClient()
+
+    def _post(self, payload, secret='segredo-de-teste'):
+        body = json.dumps(payload).encode()
+        signature = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+        return self.client.post('/api/webhooks/appmax/', body, content_type='application/json', HTTP_X_APPMAX_SIGNATURE=signature)
+
+    def test_unsigned_or_forged_events_are_rejected_before_recording(self):
+        payload = {'event': 'charge_success', 'transaction_id': 'txn_1', 'subscription_id': 'sub_1', 'status': 'approved'}
+        unsigned = self.client.post('/api/webhooks/appmax/', payload, format='json')
+        self.assertEqual(unsigned.status_code, 401)
+        self.assertEqual(self._post(payload, secret='outro').status_code, 401)
+        with override_settings(APPMAX_WEBHOOK_SECRET=''):
+            self.assertEqual(self._post(payload, secret='').status_code, 403) # Sem segredo: rota desabilitada
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    def test_ack_is_immediate_and_duplicates_cost_one_lookup(self):
+        payload = {'event': 'charge_success', 'transaction_id': 'txn_1', 'subscription_id': 'sub_1', 'status': 'approved'}
+        response = self._post(payload)
+        self.assertEqual(response.data, {'status': 'success'})
+        # Nada foi processado ainda: só o evento bruto está na fila
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'pending')
+
+        with self.assertNumQueries(1):
+            response = self._post(payload)
+        self.assertEqual((response.status_code, response.data), (200, {'status': 'duplicate'}))
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+        body = b'x'
+        signature = hmac.new(b'segredo-de-teste', body, hashlib.sha256).hexdigest()
+        self.assertEqual(self.client.post('/api/webhooks/appmax/', body, content_type='application/json', HTTP_X_APPMAX_SIGNATURE=signature).status_code, 400)
+
+    def test_worker_drains_events_with_status_mapping(self):
+        self._post({'event': 'charge_success', 'transaction_id': 'txn_1', 'subscription_id': 'sub_1', 'status': 'approved'})
+        self._post({'event': 'subscription_update', 'subscription_id': 'sub_1', 'status': 'cancelled'})
+        self._post({'event': 'charge_failed', 'transaction_id': 'txn_2', 'subscription_id': 'sub_missing'})
+
+        out = StringIO()
+        call_command('process_webhooks', '--batch-size', '2', stdout=out)
+        self.assertIn('3 eventos processados, 0 com erro', out.getvalue())
+
+        payment = Payment.objects.get(appmax_transaction_id='txn_1')
+        self.assertEqual((payment.status, payment.user_id), ('confirmed', self.user.id))
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'cancelled')
+        self.assertIsNotNone(self.subscription.cancelled_at)
+        self.assertFalse(WebhookEvent.objects.exclude(status='processed').exists())
+
+
+    def test_events_without_ids_fail_without_touching_legacy_rows(self):
+        legacy = [
+            Payment.objects.create(user=self.user, plan=self.plan, amount=29.9, method='pix', status='pending')
+            for _ in range(2)
+        ] # Anteriores à coluna appmax_transaction_id (NULL)
+        self._post({'event': 'payment_update', 'status': 'approved'})
+        self._post({'event': 'charge_success', 'subscription_id': 'sub_1', 'status': 'approved'})
+        self._post({'event': 'subscription_update', 'status': 'cancelled'})
+
+        out = StringIO()
+        call_command('process_webhooks', stdout=out)
+        self.assertIn('0 eventos processados, 3 com erro', out.getvalue())
+        self.assertEqual(set(WebhookEvent.objects.values_list('status', 'attempts')), {('failed', 1)})
+        self.assertEqual({p.status for p in Payment.objects.filter(pk__in=[p.pk for p in legacy])}, {'pending'})
+        self.assertEqual(Payment.objects.count(), 2)
+        self.subscription.refresh_from_db()
+        self.assertEqual(self.subscription.status, 'pending')
+
+class PremiumEntitlementTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.plan = Plan.objects.create(name='Premium', price_cents=2990)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _create_class(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post('/api/classes/', {'name': 'Turma', 'status': 'active'}, format='json')
+        touched = any('core_subscription' in q['sql'] for q in ctx.captured_queries)
+        return response.status_code, touched
+
+    def test_gate_is_cached_and_invalidated_by_cancel(self):
+        self.assertEqual(self._create_class(), (403, True))
+
+        Subscription.objects.create(user=self.teacher, plan=self.plan, appmax_subscription_id='sub_1', status='active')
+        self.assertEqual(self._create_class(), (201, True))
+        self.assertEqual(self._create_class(), (201, False)) # Cache hit: sem ida ao banco
+
+        self.assertEqual(self.client.post('/api/subscriptions/cancel/').status_code, 200)
+        self.assertEqual(self._create_class()[0], 403)
+
+    def test_expired_subscription_is_not_premium(self):
+        Subscription.objects.create(
+            user=self.teacher, plan=self.plan, appmax_subscription_id='sub_1', status='active',
+            expires_at=timezone.now() - timezone.timedelta(minutes=1)
+        )
+        self.assertEqual(self._create_class()[0], 403)
+
+
+class StudentActivityIndexTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.class_a = make_class(self.teacher, name='A')
+        self.class_b = make_class(self.teacher, name='B')
+        self.activity = Activity.objects.create(professor=self.teacher, title='Lista', status='open')
+
+    def _feed(self):
+        return set(StudentActivity.objects.filter(student=self.student).values_list('activity_id', flat=True))
+
+    def test_index_follows_assignments_and_enrollments(self):
+        enrollment = ClassStudent.objects.create(class_instance=self.class_a, student=self.student)
+        ClassStudent.objects.create(class_instance=self.class_b, student=self.student)
+        link_a = ActivityClass.objects.create(activity=self.activity, class_instance=self.class_a)
+        ActivityClass.objects.create(activity=self.activity, class_instance=self.class_b)
+        self.assertEqual(self._feed(), {self.activity.id})
+
+        # Continua visível pela turma B depois de sair da turma A
+        link_a.delete()
+        self.assertEqual(self._feed(), {self.activity.id})
+
+        enrollment = ClassStudent.objects.get(pk=enrollment.pk)
+        enrollment.removed_at = timezone.now()
+        enrollment.save()
+        ClassStudent.objects.filter(class_instance=self.class_b).delete()
+        self.assertEqual(self._feed(), set())
+
+        # Reativação pelo convite (UPDATE condicional, sem post_save)
+        ActivityClass.objects.create(activity=self.activity, class_instance=self.class_a)
+        StudentActivity.objects.all().delete()
+        ClassStudent.enroll(self.class_a.id, self.student)
+        self.assertEqual(self._feed(), {self.activity.id})
+
+        client = APIClient()
+        client.force_authenticate(user=self.student)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get('/api/activities/')
+        self.assertEqual([row['id'] for row in response.data], [self.activity.id])
+        self.assertNotIn('core_classstudent', ctx.captured_queries[-1]['sql'])
+
+    def test_check_and_rebuild_commands(self):
+        ClassStudent.objects.create(class_instance=self.class_a, student=self.student)
+        ActivityClass.objects.create(activity=self.activity, class_instance=self.class_a)
+        StudentActivity.objects.all().delete()
+        StudentActivity.objects.create(student=self.student, activity=self.activity, class_instance=self.class_b)
+
+        with self.assertRaisesMessage(CommandError, '1 linhas faltando, 1 sobrando'):
+            call_command('check_student_activity_index', stdout=StringIO())
+        out = StringIO()
+        call_command('rebuild_student_activity_index', '--batch-size', '1', stdout=out)
+        self.assertIn('1 linhas inseridas, 1 removidas', out.getvalue())
+        call_command('check_student_activity_index', stdout=StringIO())
+        self.assertEqual(
+            list(StudentActivity.objects.values_list('class_instance_id', flat=True)), [self.class_a.id]
+        )
+
+
+class GradebookTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.ana = make_user('ana@exemplo.com', '10000000001')
+        self.bia = make_user('bia@exemplo.com', '10000000002')
+        self.class_obj = make_class(self.teacher, [self.ana, self.bia])
+        self.activities = [make_activity(self.teacher, self.class_obj, title=f'L{i}') for i in range(2)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _grade(self, student, activity, *scores):
+        submission = Submission.objects.create(activity=activity, student=student, status='pending')
+        for score in scores:
+            Feedback.objects.create(submission=submission, professor=self.teacher, score=score)
+
+    def test_matrix_uses_latest_score_and_means(self):
+        self._grade(self.ana, self.activities[0], 4, 8) # Reavaliação: vale a última
+        self._grade(self.ana, self.activities[1], 6)
+        self._grade(self.bia, self.activities[0], 10)
+        Submission.objects.create(activity=self.activities[1], student=self.bia, status='pending') # Sem nota
+
+        with self.assertNumQueries(4): # Turma (permissão) + alunos + atividades + células (nota em subquery)
+            response = self.client.get(f'/api/classes/{self.class_obj.id}/gradebook/')
+        data = response.data
+        self.assertEqual([s['name'] for s in data['students']], ['ana', 'bia'])
+        self.assertEqual(data['scores'], [[8.0, 6.0], [10.0, None]])
+        self.assertEqual(data['submitted'], [[True, True], [True, True]])
+        self.assertEqual(data['student_means'], [7.0, 10.0])
+        self.assertEqual(data['activity_means'], [9.0, 6.0])
+
+    def test_activity_stats_match_gradebook(self):
+        self._grade(self.ana, self.activities[0], 4)
+        self._grade(self.ana, self.activities[0], 8) # Reenvio corrigido: só a nota nova conta
+        self._grade(self.bia, self.activities[0], 10)
+        self._grade(self.bia, self.activities[0]) # Reenvio sem nota: a antiga sai dos dois
+        gradebook = self.client.get(f'/api/classes/{self.class_obj.id}/gradebook/').data
+        stats = self.client.get(f'/api/activities/{self.activities[0].id}/stats/').data
+        self.assertEqual(gradebook['scores'], [[8.0, None], [None, None]])
+        self.assertEqual(stats['count'], 1)
+        self.assertAlmostEqual(stats['mean'] * stats['max_score'], gradebook['activity_means'][0])
+
+    def test_only_class_teacher(self):
+        self.client.force_authenticate(user=self.ana)
+        self.assertEqual(self.client.get(f'/api/classes/{self.class_obj.id}/gradebook/').status_code, 403)
+
+
+class ActivityStatsViewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.activity = Activity.objects.create(professor=self.teacher, title='Prova', status='open', max_score=20)
+        self.students = make_students(4)
+        self.submissions = [
+            Submission.objects.create(activity=self.activity, student=s, status='pending') for s in self.students
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _stats(self):
+        return self.client.get(f'/api/activities/{self.activity.id}/stats/').data
+
+    def _grade(self, i, score):
+        return Feedback.objects.create(submission=self.submissions[i], professor=self.teacher, score=score)
+
+    def test_incremental_aggregates_match_recompute(self):
+        self._grade(0, 10)
+        data = self._stats() # Primeira leitura monta os agregados
+        self.assertEqual((data['count'], data['mean']), (1, 0.5))
+
+        second = self._grade(1, 20)
+        self._grade(2, 4)
+        second = Feedback.objects.get(pk=second.pk)
+        second.score = 16
+        second.save()
+        Feedback.objects.create(submission=self.submissions[3], professor=self.teacher, score=None) # Sem nota: ignorado
+        self._grade(3, 2).delete()
+
+        data = self._stats()
+        scores = np.array([10, 16, 4]) / 20
+        self.assertEqual(data['count'], 3)
+        self.assertAlmostEqual(data['mean'], scores.mean(), places=4)
+        self.assertAlmostEqual(data['stddev'], scores.std(), places=4)
+        self.assertAlmostEqual(data['median'], 0.5, places=4)
+        self.assertEqual([b['count'] for b in data['histogram']], [0, 0, 1, 0, 0, 1, 0, 0, 1, 0])
+
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        ActivityScoreStats.rebuild(self.activity.id)
+        rebuilt = ActivityScoreStats.objects.get(activity=self.activity)
+        self.assertEqual((stats.count, stats.score_sum), (rebuilt.count, rebuilt.score_sum))
+        self.assertAlmostEqual(stats.score_sq_sum, rebuilt.score_sq_sum)
+
+    def test_percentiles_cached_until_next_write(self):
+        self._grade(0, 10)
+        self._stats()
+        with CaptureQueriesContext(connection) as ctx:
+            self._stats()
+        self.assertFalse(any('core_feedback' in q['sql'] for q in ctx.captured_queries))
+
+        self._grade(1, 20)
+        self.assertEqual(self._stats()['median'], 0.75)
+
+        # max_score mudou: normalização e histograma são refeitos
+        self.activity.max_score = 10
+        self.activity.save()
+        self.assertEqual(self._stats()['histogram'][-1]['count'], 2)
+
+
+class ResumableUploadTestCase(TestCase):
+    def setUp(self):
+        self.root = use_temp_storage(self)
+        self.teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.activity = make_activity(self.teacher, make_class(self.teacher, [self.student]), title='Vídeo')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def _put(self, upload_id, offset, data):
+        return self.client.generic(
+            'PUT', f'/api/submissions/uploads/{upload_id}/', data,
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_chunked_upload_resume_and_complete(self):
+        content = b'\x00\x00\x00\x18ftypmp42' + bytes(range(256)) * 40 # ~10 KB, cabeçalho de MP4
+        response = self.client.post('/api/submissions/uploads/', {
+            'activity': self.activity.id, 'filename': 'aula.mp4', 'content_type': 'video/mp4', 'size': len(content),
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['upload_id']
+
+        self.assertEqual(self._put(upload_id, 0, content[:4000]).data['offset'], 4000)
+        # Cliente perdeu a resposta e reenviou a partir de um offset errado: 409 com o offset confirmado
+        conflict = self._put(upload_id, 0, content[:4000])
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, 4000))
+        self.assertEqual(self.client.get(f'/api/submissions/uploads/{upload_id}/').data['offset'], 4000)
+        self.assertEqual(self.client.post(f'/api/submissions/uploads/{upload_id}/complete/').status_code, 409)
+
+        self.assertEqual(self._put(upload_id, 4000, content[4000:]).data['offset'], len(content))
+        self.assertEqual(self._put(upload_id, len(content), b'x').status_code, 413) # Além do tamanho declarado
+
+        response = self.client.post(f'/api/submissions/uploads/{upload_id}/complete/')
+        self.assertEqual(response.status_code, 201)
+        submission = Submission.objects.get(pk=response.data['id'])
+        self.assertEqual((submission.student, submission.mime_type), (self.student, 'video/mp4'))
+        with get_storage().open(submission.file_path) as f:
+            self.assertEqual(f.read(), content)
+        self.assertEqual(UploadSession.objects.get(pk=upload_id).submission, submission)
+
+    def _create_upload(self, size):
+        response = self.client.post('/api/submissions/uploads/', {
+            'activity': self.activity.id, 'filename': 'aula.mp4', 'content_type': 'video/mp4', 'size': size,
+        }, format='json')
+        return UploadSession.objects.get(pk=response.data['upload_id'])
+
+    def test_concurrent_part_at_same_offset_is_rejected_while_writing(self):
+        content = b'\x00\x00\x00\x18ftypmp42' + b'x' * 100
+        session = self._create_upload(len(content))
+        token = session.claim_write(0) # Outra requisição gravando a parte do offset 0
+        self.assertIsNotNone(token)
+        self.assertIsNone(session.claim_write(0))
+        conflict = self._put(session.id, 0, content)
+        self.assertEqual((conflict.status_code, conflict.data['offset']), (409, 0))
+
+        # Reserva expirada (worker morreu no meio da parte): a próxima PUT assume
+        UploadSession.objects.filter(pk=session.pk).update(writer_until=timezone.now() - timezone.timedelta(seconds=1))
+        self.assertEqual(self._put(session.id, 0, content).data['offset'], len(content))
+        session.refresh_from_db()
+        self.assertIsNone(session.writer_token)
+        self.assertFalse(session.advance(0, len(content), token)) # A requisição antiga não confirma mais nada
+
+    def test_cleanup_aborts_abandoned_uploads_and_discards_parts(self):
+        content = b'\x00\x00\x00\x18ftypmp42' + b'x' * 100
+        stale = self._create_upload(len(content))
+        self._put(stale.id, 0, content[:50])
+        fresh = self._create_upload(len(content))
+        self._put(fresh.id, 0, content[:50])
+        UploadSession.objects.filter(pk=stale.pk).update(updated_at=timezone.now() - timezone.timedelta(hours=48))
+
+        out = StringIO()
+        call_command('cleanup_uploads', '--older-than-hours', '24', '--batch-size', '1', stdout=out)
+        self.assertIn('1 uploads abandonados cancelados', out.getvalue())
+        self.assertEqual(UploadSession.objects.get(pk=stale.pk).status, 'aborted')
+        self.assertEqual(UploadSession.objects.get(pk=fresh.pk).status, 'open')
+        storage = get_storage()
+        self.assertEqual(storage.uploaded_size(stale.id), 0)
+        self.assertEqual(storage.uploaded_size(fresh.id), 50)
+
+    def test_complete_hashes_outside_the_write_transaction(self):
+        content = b'\x00\x00\x00\x18ftypmp42' + b'x' * 100
+        session = self._create_upload(len(content))
+        self._put(session.id, 0, content)
+        RecordingStorage.calls = []
+        with storage_backend(self.root, 'core.testing.RecordingStorage'):
+            depth = len(connection.atomic_blocks) # Transações do próprio TestCase
+            response = self.client.post(f'/api/submissions/uploads/{session.id}/complete/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(('digest', depth), RecordingStorage.calls)
+
+    def test_duplicate_upload_reuses_blob_without_file_work_in_transaction(self):
+        content = b'\x00\x00\x00\x18ftypmp42' + b'y' * 100
+        first = self._create_upload(len(content))
+        self._put(first.id, 0, content)
+        self.assertEqual(self.client.post(f'/api/submissions/uploads/{first.id}/complete/').status_code, 201)
+
+        second = self._create_upload(len(content))
+        self._put(second.id, 0, content)
+        RecordingStorage.calls = []
+        with storage_backend(self.root, 'core.testing.RecordingStorage'):
+            depth = len(connection.atomic_blocks)
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/submissions/uploads/{second.id}/complete/')
+            self.assertEqual(get_storage().uploaded_size(second.id), 0)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(RecordingStorage.calls, [('digest', depth), ('discard', depth)])
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+
+    def test_only_students_of_the_activity(self):
+        other = make_user('outro@exemplo.com', '10000000002')
+        self.client.force_authenticate(user=other)
+        response = self.client.post('/api/submissions/uploads/', {
+            'activity': self.activity.id, 'filename': 'a.pdf', 'content_type': 'application/pdf', 'size': 10,
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class AsyncUploadOffloadTestCase(TransactionTestCase):
+    def setUp(self):
+        use_temp_storage(self, 'core.testing.GatedStorage', SUBMISSION_UPLOAD_WORKERS=2)
+        GatedStorage.gate.clear()
+        self.addCleanup(GatedStorage.gate.set)
+
+        teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.class_obj = make_class(teacher, [self.student])
+        self.activity = make_activity(teacher, self.class_obj, title='Trabalho')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def _submit(self, content):
+        return self.client.post('/api/submissions/', {
+            'activity': self.activity.id, 'file': SimpleUploadedFile('t.pdf', content, 'application/pdf'),
+        }, format='multipart')
+
+    def test_create_returns_before_transfer(self):
+        response = self._submit(b'%PDF-1.4 conteudo')
+        self.assertEqual((response.status_code, response.data['status']), (201, 'uploading'))
+        submission = Submission.objects.get(pk=response.data['id'])
+        self.assertEqual(submission.status, 'uploading') # Transferência ainda presa no backend
+
+        GatedStorage.gate.set()
+        upload_offload.wait_for_transfers(timeout=5)
+        submission.refresh_from_db()
+        self.assertEqual(submission.status, 'pending')
+        with get_storage().open(submission.file_path) as f:
+            self.assertEqual(f.read(), b'%PDF-1.4 conteudo')
+        self.assertFalse(os.path.exists(upload_offload.staging_path(submission.file_path)))
+
+    def test_replacement_deletes_previous_file_after_transfer(self):
+        GatedStorage.gate.set()
+        first = self._submit(b'v1').data
+        upload_offload.wait_for_transfers(timeout=5)
+        old_key = Submission.objects.get(pk=first['id']).file_path
+
+        response = self.client.patch(f'/api/submissions/{first["id"]}/', {
+            'file': SimpleUploadedFile('t2.pdf', b'v2', 'application/pdf'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        upload_offload.wait_for_transfers(timeout=5)
+        submission = Submission.objects.get(pk=first['id'])
+        self.assertEqual(submission.status, 'pending')
+        self.assertNotEqual(submission.file_path, old_key)
+        with self.assertRaises(FileNotFoundError):
+            get_storage().open(old_key)
+
+    def test_identical_content_stored_once_and_refcounted(self):
+        GatedStorage.gate.set()
+        GatedStorage.saves = 0
+        other = make_user('outro@exemplo.com', '10000000002')
+        ClassStudent.objects.create(class_instance=self.class_obj, student=other)
+
+        first = self._submit(b'mesmo pdf')
+        upload_offload.wait_for_transfers(timeout=5)
+        self.client.force_authenticate(user=other)
+        second = self._submit(b'mesmo pdf')
+        self.assertEqual(second.data['status'], 'pending') # Já armazenado: nada a enviar
+        upload_offload.wait_for_transfers(timeout=5)
+
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.ref_count, GatedStorage.saves), (2, 1))
+        self.assertEqual(Submission.objects.get(pk=first.data['id']).file_path, blob.key)
+
+        Submission.objects.get(pk=first.data['id']).delete()
+        with get_storage().open(blob.key) as f: # Ainda referenciado pela segunda submissão
+            self.assertEqual(f.read(), b'mesmo pdf')
+        self.assertEqual(self.client.delete(f'/api/submissions/{second.data["id"]}/').status_code, 204)
+        self.assertFalse(StoredBlob.objects.exists())
+        with self.assertRaises(FileNotFoundError):
+            get_storage().open(blob.key)
+
+
+class SubmissionZipTestCase(TestCase):
+    def setUp(self):
+        use_temp_storage(self)
+        self.teacher = make_teacher()
+        self.students = make_students(2)
+        classes = [make_class(self.teacher, [student], name) for student, name in zip(self.students, ['Turma A', 'Turma B'])]
+        self.activity = make_activity(self.teacher, *classes, title='Relatório')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _submit(self, student, content):
+        return submit_file(self.activity, student, content, 'application/pdf')
+
+    def test_streams_latest_submission_per_student(self):
+        self._submit(self.students[0], b'rascunho')
+        latest = self._submit(self.students[0], b'final')
+        Submission.objects.create(activity=self.activity, student=self.students[1], status='upload_failed',
+                                  file_path='blobs/xx/falhou') # Substituída pela seguinte
+        self._submit(self.students[1], b'b' * 200_000) # Vários blocos
+
+        response = self.client.get(f'/api/activities/{self.activity.id}/submissions-zip/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        names = sorted(archive.namelist())
+        self.assertEqual(len(names), 2)
+        self.assertTrue(names[0].startswith(f'Turma A/aluno0 ({self.students[0].id})/submissao_{latest.id}_'))
+        self.assertTrue(names[0].endswith('.pdf'))
+        self.assertEqual(archive.read(names[0]), b'final')
+        self.assertTrue(names[1].startswith('Turma B/aluno1'))
+        self.assertEqual(archive.read(names[1]), b'b' * 200_000)
+
+    def test_only_activity_teacher(self):
+        self.client.force_authenticate(user=self.students[0])
+        self.assertEqual(self.client.get(f'/api/activities/{self.activity.id}/submissions-zip/').status_code, 403)
+
+
+class LatestSubmissionFlagTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.activity = Activity.objects.create(professor=self.teacher, title='Lista', status='open')
+
+    def _submit(self):
+        return Submission.objects.create(activity=self.activity, student=self.student, status='pending')
+
+    def _latest_ids(self):
+        return list(Submission.objects.filter(is_latest=True).values_list('id', flat=True))
+
+    def test_resubmission_and_delete_keep_single_latest(self):
+        first, second = self._submit(), self._submit()
+        third = self._submit()
+        self.assertEqual(self._latest_ids(), [third.id])
+        third.delete()
+        self.assertEqual(self._latest_ids(), [second.id])
+        first.delete() # Não era a última: nada muda
+        self.assertEqual(self._latest_ids(), [second.id])
+
+    def test_backfill_migration_marks_only_newest(self):
+        from importlib import import_module
+        from django.apps import apps
+        rows = [self._submit() for _ in range(3)]
+        other = Submission.objects.create(activity=self.activity, student=self.teacher, status='pending')
+        Submission.objects.update(is_latest=True) # Estado logo após o AddField
+        migration = import_module('core.migrations.0011_submission_latest_index')
+        migration.backfill_is_latest(apps, None)
+        self.assertEqual(sorted(self._latest_ids()), [rows[-1].id, other.id])
+
+    def test_review_queue_filter(self):
+        self._submit()
+        latest = self._submit()
+        client = APIClient()
+        client.force_authenticate(user=self.teacher)
+        response = client.get(f'/api/submissions/?activity={self.activity.id}&is_latest=true&status=pending')
+        self.assertEqual([row['id'] for row in response.data['results']], [latest.id])
+
+
+class FeedbackBulkTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.teacher = make_teacher()
+        self.other_teacher = make_user('outro@exemplo.com', '00000000002', is_teacher=True)
+        self.activity = Activity.objects.create(professor=self.teacher, title='Prova', status='open', max_score=10)
+        students = make_students(40)
+        self.submissions = Submission.objects.bulk_create([
+            Submission(activity=self.activity, student=s, status='pending') for s in students
+        ])
+        ActivityScoreStats.rebuild(self.activity.id)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+
+    def _post(self, items):
+        return self.client.post('/api/feedbacks/bulk/', {'items': items}, format='json')
+
+    def test_bulk_grading_constant_queries_and_stats(self):
+        def items(subs):
+            return [{'submission': sub.id, 'score': str(i % 11), 'comment': 'ok'} for i, sub in enumerate(subs)]
+
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self._post(items(self.submissions[:5])).status_code, 201)
+        with CaptureQueriesContext(connection) as many:
+            response = self._post(items(self.submissions[5:]))
+        self.assertEqual((response.status_code, response.data['created']), (201, 35))
+        self.assertEqual(len(many), len(few)) # Não cresce com o número de itens
+        self.assertEqual(Feedback.objects.count(), 40)
+
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        ActivityScoreStats.rebuild(self.activity.id)
+        rebuilt = ActivityScoreStats.objects.get(activity=self.activity)
+        self.assertEqual((stats.count, stats.score_sum), (rebuilt.count, rebuilt.score_sum))
+
+    def test_response_serializes_without_per_row_queries(self):
+        items = [{'submission': sub.id, 'score': '5'} for sub in self.submissions]
+        # Submissões citadas + savepoint + notas atuais (2) + estatísticas (savepoint, UPDATE, max_score,
+        # faixas, release) + INSERT + release: nenhuma query de professor/submissão por feedback
+        with self.assertNumQueries(11):
+            response = self._post(items)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({row['professor_name'] for row in response.data['feedbacks']}, {self.teacher.full_name})
+        self.assertEqual(len(response.data['feedbacks']), 40)
+
+    def test_bulk_regrade_replaces_student_score(self):
+        Feedback.objects.create(submission=self.submissions[0], professor=self.teacher, score=3)
+        response = self._post([
+            {'submission': self.submissions[0].id, 'score': '9'}, {'submission': self.submissions[1].id, 'score': '4'},
+        ])
+        self.assertEqual(response.status_code, 201)
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        self.assertEqual((stats.count, stats.score_sum), (2, 13.0))
+        self.assertEqual(sorted(ActivityScoreStats.scores(self.activity.id)), [4.0, 9.0])
+
+    def test_per_item_errors_create_nothing(self):
+        foreign = Activity.objects.create(professor=self.other_teacher, title='Outra', status='open')
+        foreign_sub = Submission.objects.create(activity=foreign, student=self.submissions[0].student, status='pending')
+        response = self._post([
+            {'submission': self.submissions[0].id, 'score': '8'},
+            {'submission': self.submissions[1].id, 'score': '11'}, # Acima de max_score
+            {'submission': foreign_sub.id, 'score': '5'}, # Atividade de outro professor
+            {'submission': 999999},
+            {'submission': self.submissions[2].id, 'score': '-1'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([e['index'] for e in response.data['items']], [1, 2, 3, 4])
+        self.assertIn('score', response.data['items'][0])
+        self.assertFalse(Feedback.objects.exists())
+
+
+class AutoGradingTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        use_temp_storage(self)
+        self.teacher = make_teacher()
+        self.activity = make_activity(self.teacher, title='Quiz', max_score=10)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.teacher)
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+
+    def test_rules_endpoint_validates_config(self):
+        url = f'/api/activities/{self.activity.id}/autograding-rules/'
+        response = self.client.put(url, [{'kind': 'answer_key', 'config': {}}], format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(url, [
+            {'kind': 'answer_key', 'config': {'answers': {'1': 'b'}}, 'weight': 2},
+            {'kind': 'rubric_keywords', 'config': {'criteria': [{'keywords': ['célula']}]}},
+        ], format='json')
+        self.assertEqual((response.status_code, len(response.data)), (200, 2))
+        self.assertEqual(AutoGradingRule.objects.filter(activity=self.activity).count(), 2)
+
+    def test_replaced_file_drops_old_automatic_feedback(self):
+        AutoGradingRule.objects.create(activity=self.activity, kind='answer_key', config={'answers': {'1': 'b'}})
+        submission = submit_text(self.activity, self.student, '1) b')
+        ActivityScoreStats.rebuild(self.activity.id)
+        with AutoGrader(workers=1) as grader:
+            grader.drain()
+
+            client = APIClient()
+            client.force_authenticate(user=self.student)
+            response = client.patch(f'/api/submissions/{submission.id}/', {
+                'file': SimpleUploadedFile('r.txt', b'1) c', 'text/plain'),
+            }, format='multipart')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(Feedback.objects.filter(submission=submission).exists())
+
+            Submission.objects.filter(pk=submission.pk).update(status='pending')
+            get_storage().save(Submission.objects.get(pk=submission.pk).file_path, [b'1) c']) # Transferência concluída
+            grader.drain()
+            Submission.objects.filter(pk=submission.pk).update(autograded_at=None) # Correção repetida
+            grader.drain()
+
+        self.assertEqual(list(Feedback.objects.filter(submission=submission).values_list('score', flat=True)), [Decimal('0.00')])
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        self.assertEqual((stats.count, stats.score_sum), (1, 0.0))
+
+
+class SimilarityIndexTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        use_temp_storage(self)
+        self.teacher = make_teacher()
+        self.activity = make_activity(self.teacher, title='Redação')
+        self.students = make_students(2)
+
+    def test_similar_pairs_endpoint(self):
+        submit_text(self.activity, self.students[0], ESSAY)
+        submit_text(self.activity, self.students[1], ESSAY.upper())
+        similarity.drain()
+
+        client = APIClient()
+        client.force_authenticate(user=self.teacher)
+        response = client.get(f'/api/activities/{self.activity.id}/similar-pairs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([s['student_id'] for s in response.data[0]['submissions']], [self.students[0].id, self.students[1].id])
+
+    def test_file_replaced_in_place_is_reindexed(self):
+        submit_text(self.activity, self.students[0], ESSAY)
+        clean = submit_text(self.activity, self.students[1], "Texto original sobre respiração celular e mitocôndrias, escrito do zero.")
+        self.assertEqual(similarity.drain(), (2, 0))
+
+        client = APIClient()
+        client.force_authenticate(user=self.students[1])
+        response = client.patch(f'/api/submissions/{clean.id}/', {
+            'file': SimpleUploadedFile('r.txt', ESSAY.encode(), 'text/plain'),
+        }, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(SubmissionSignature.objects.filter(submission=clean).exists())
+
+        clean = Submission.objects.get(pk=clean.pk)
+        get_storage().save(clean.file_path, [ESSAY.encode()]) # Transferência concluída
+        Submission.objects.filter(pk=clean.pk).update(status='pending')
+        self.assertEqual(similarity.drain(), (1, 1))
+
+
+class SubmissionFormatTestCase(TestCase):
+    def setUp(self):
+        self.root = use_temp_storage(self)
+        teacher = make_teacher()
+        self.student = make_user('aluno@exemplo.com', '10000000001')
+        self.activity = make_activity(teacher, make_class(teacher, [self.student]), title='Relatório', allowed_formats=['pdf', 'docx'])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.student)
+
+    def test_disallowed_multipart_upload_is_flagged_without_storing(self):
+        valid = self.client.post('/api/submissions/', {
+            'activity': self.activity.id, 'file': SimpleUploadedFile('r.pdf', b'%PDF-1.4 relatorio', 'text/plain'),
+        }, format='multipart')
+        self.assertEqual(valid.status_code, 201)
+        self.assertEqual(Submission.objects.get(pk=valid.data['id']).mime_type, 'application/pdf') # Pelo conteúdo
+
+        response = self.client.post('/api/submissions/', {
+            'activity': self.activity.id, 'file': SimpleUploadedFile('r.pdf', make_zip('fotos/a.txt'), 'application/pdf'),
+        }, format='multipart')
+        self.assertEqual((response.status_code, response.data['format']), (415, 'zip'))
+        flagged = Submission.objects.get(pk=response.data['submission'])
+        self.assertEqual((flagged.status, flagged.file_path, flagged.is_latest), ('invalid_format', None, False))
+        self.assertTrue(Submission.objects.get(pk=valid.data['id']).is_latest) # A entrega válida continua valendo
+        self.assertEqual(len(os.listdir(f'{self.root}/staging')), 1) # Só o PDF passou pelo staging
+
+    def test_staging_failure_is_handled_in_create_and_update(self):
+        created = self.client.post('/api/submissions/', {
+            'activity': self.activity.id, 'file': SimpleUploadedFile('r.pdf', b'%PDF-1.4 v1', 'application/pdf'),
+        }, format='multipart')
+        self.assertEqual(created.status_code, 201)
+        blocked = f'{self.root}/bloqueado'
+        open(blocked, 'w').close() # Staging inutilizável (ex: disco cheio): makedirs/gravação falham com OSError
+        with override_settings(SUBMISSION_STAGING_DIR=f'{blocked}/staging'):
+            response = self.client.post('/api/submissions/', {
+                'activity': self.activity.id, 'file': SimpleUploadedFile('r.pdf', b'%PDF-1.4 v2', 'application/pdf'),
+            }, format='multipart')
+            self.assertEqual((response.status_code, response.data), (500, {"error": "Falha ao armazenar o arquivo."}))
+            response = self.client.patch(f'/api/submissions/{created.data["id"]}/', {
+                'file': SimpleUploadedFile('r.pdf', b'%PDF-1.4 v3', 'application/pdf'),
+            }, format='multipart')
+            self.assertEqual((response.status_code, response.data), (500, {"error": "Falha ao armazenar o arquivo."}))
+        self.assertEqual(Submission.objects.get(pk=created.data['id']).blob_id, hashlib.sha256(b'%PDF-1.4 v1').hexdigest())
+        self.assertEqual(Submission.objects.count(), 1) # Continua só com a entrega e o arquivo anteriores
+
+    def test_disallowed_chunked_upload_is_rejected_on_first_part(self):
+        content = b'MZ\x90\x00' + bytes(20000)
+        upload_id = self.client.post('/api/submissions/uploads/', {
+            'activity': self.activity.id, 'filename': 'r.pdf', 'content_type': 'application/pdf', 'size': len(content),
+        }, format='json').data['upload_id']
+        response = self.client.generic(
+            'PUT', f'/api/submissions/uploads/{upload_id}/', content[:10000],
+            content_type='application/octet-stream', HTTP_UPLOAD_OFFSET='0',
+        )
+        self.assertEqual(response.status_code, 415)
+        session = UploadSession.objects.get(pk=upload_id)
+        self.assertEqual((session.status, session.submission.status), ('aborted', 'invalid_format'))
+        self.assertEqual(get_storage().uploaded_size(upload_id), 0)
+
+
+class SubmissionMediaTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        use_temp_storage(self)
+        self.teacher = make_teacher()
+        self.activity = make_activity(self.teacher, title='Fotos do experimento')
+        self.students = make_students(3)
+
+    def test_list_includes_thumbnail_keys(self):
+        for student, size in zip(self.students, [(400, 300), (200, 100), (300, 300)]):
+            submit_file(self.activity, student, make_image(size, 'PNG'), 'image/png', stored=True)
+        with MediaPipeline(workers=1) as pipeline:
+            pipeline.drain()
+
+        client = APIClient()
+        client.force_authenticate(user=self.teacher)
+        with CaptureQueriesContext(connection) as queries:
+            rows = client.get('/api/submissions/').data['results']
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(row['thumbnail_url'] for row in rows))
+        self.assertLessEqual(len(queries), 4) # Chaves vêm na mesma query da lista
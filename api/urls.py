@@ -78,7 +78,7 @@ urlpatterns = [
 
     # Rotas de Pagamento/Assinatura Específicas (TODO: Mover para actions em PaymentViewSet/SubscriptionViewSet)
     # 4path('api/payments/initiate/', PaymentInitiateView.as_view(), name='payment_initiate'), # Nome de URL: use hífens e prefixo relevante
-    # 4path('api/webhooks/appmax/', AppmaxWebhookView.as_view(), name='appmax_webhook'), # Nome fixo para Appmax
+    path('api/webhooks/appmax/', AppmaxWebhookView.as_view(), name='appmax_webhook'), # Nome fixo para Appmax
     # path('api/users/me/payments/', UserPaymentsView.as_view(), name='user_payments'), # Mover
     # path('api/payments/<int:pk>/', PaymentDetailView.as_view(), name='payment_detail'), # ViewSet já gera payments/{pk}/
     # path('api/users/me/subscription/', UserSubscriptionView.as_view(), name='user_subscription'), # Mover
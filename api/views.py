@@ -1,12 +1,16 @@
 # views.py
+from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 # Importar timezone explicitamente
 from django.utils import timezone
-from django.db.models import Q
+from django.db import transaction, IntegrityError
+from django.db.models import F, Q
 from django.contrib.auth.hashers import check_password
 from rest_framework import viewsets, status, permissions, views, generics
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 
@@ -15,6 +19,8 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.pagination import PageNumberPagination # Para paginação
+from .pagination import KeysetPagination # Paginação por cursor (keyset), opcional por ViewSet
+from .fieldsets import SparseQuerysetMixin # Sparse fieldsets (?fields=/?exclude=) + planejamento da query
 
 # TODO: Importar biblioteca para Throttling
 from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
@@ -28,6 +34,7 @@ from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
 # import cloudinary.api
 # from cloudinary.utils import api_url
 
+import io
 import uuid
 import random
 import string
@@ -39,14 +46,25 @@ import logging
 # Import dos modelos
 from core.models import (
     User, Profile, Plan, Payment, Subscription, ClassModel,
-    ClassStudent, Invite, Activity, ActivityClass, Submission, Feedback
+    ClassStudent, Invite, Activity, ActivityClass, StudentActivity, Submission, Feedback, WebhookEvent,
+    UploadSession, StoredBlob, BlobDerivative, ActivityScoreStats, AutoGradingRule, SimilarityPair,
+    SubmissionSignature
 )
+from core.invite_cache import invite_cache, MISSING
+from . import me_cache, webhooks
+from core.invite_codes import allocate_invite_codes
+from core import autograde, file_formats, upload_offload
+from core.storage import UploadTooLarge, get_storage
+from .gradebook import build_gradebook # Matriz alunos x atividades (pandas/NumPy)
+from .score_stats import activity_stats # Estatísticas das notas por atividade
+from .submission_archive import stream_activity_zip # ZIP das submissões em streaming
 # Import dos serializers
 from .serializers import (
     UserReadSerializer, UserWriteSerializer, ProfileSerializer, UserProfileUpdateSerializer,
     PlanSerializer, PaymentSerializer, SubscriptionSerializer, PaymentInitiateSerializer,
-    ClassModelSerializer, InviteSerializer, ClassStudentSerializer,
-    ActivitySerializer, ActivityClassSerializer, SubmissionSerializer, FeedbackSerializer
+    ClassModelSerializer, InviteSerializer, InviteBulkCreateSerializer, ClassStudentSerializer,
+    ActivitySerializer, ActivityClassSerializer, SubmissionSerializer, FeedbackSerializer, UploadInitSerializer,
+    FeedbackBulkSerializer, FeedbackBulkItemSerializer, AutoGradingRuleSerializer
 )
 
 # Configurando o logger
@@ -55,18 +73,18 @@ logger = logging.getLogger(__name__)
 # -----------------------------
 # PERMISSÕES PERSONALIZADAS (Manter e refinar)
 # -----------------------------
-class IsTeacher(permissions.BasePermission): pass
-class IsClassTeacher(permissions.BasePermission): pass
-class IsActivityTeacher(permissions.BasePermission): pass
-class IsOwner(permissions.BasePermission): pass
-class IsClassMember(permissions.BasePermission): pass
-# TODO: Criar permissão IsTeacherAndPremiumActive
-# TODO: Refinar as permissões para Submissions/Feedbacks (Aluno dono vs Professor da atividade)
+# Motor de autorização com escopo de requisição (api/permissions.py): turmas/atividades do usuário
+# carregadas uma vez por request, checagens de objeto e filtros de queryset sem queries extras.
+from .permissions import (
+    IsTeacher, IsTeacherAndPremiumActive, IsClassTeacher, IsActivityTeacher, IsOwner, IsClassMember,
+    get_auth_context
+)
 
 # --------------------------------
 # BASE VIEWSET (Com filtros, busca, ordenação e paginação padrão)
 # --------------------------------
-class BaseModelViewSet(viewsets.ModelViewSet):
+class BaseModelViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
+    # SparseQuerysetMixin: com ?fields=/?exclude= ajusta select_related/only() aos campos pedidos
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     pagination_class = PageNumberPagination # Configuração de paginação padrão (ex: 10 items por página)
 
@@ -74,6 +92,10 @@ class BaseModelViewSet(viewsets.ModelViewSet):
     # search_fields = []
     # ordering_fields = []
 
+    # Listas longas podem optar por paginação keyset (sem COUNT/OFFSET):
+    # pagination_class = KeysetPagination
+    # keyset_ordering = ('-created_at', '-id')
+
 
 # --------------------------------
 # 1. AUTENTICAÇÃO (APIViews customizadas)
@@ -177,7 +199,7 @@ class AuthLogoutView(views.APIView):
 
 class UserViewSet(BaseModelViewSet): # Herda de BaseModelViewSet para filtros/paginação
     """Viewset para listar (Admin), obter detalhes e gerenciar o usuário logado (/me)."""
-    queryset = User.objects.all() # Queryset base para listar/detalhe (Admin)
+    queryset = User.objects.select_related('profile') # Perfil no mesmo SELECT (evita N+1 na lista do Admin)
 
     # TODO: Definir search_fields e ordering_fields se a lista geral for relevante (Admin)
     search_fields = ['full_name', 'email', 'cpf'] # Cuidado ao buscar por CPF, apenas Admin
@@ -216,9 +238,14 @@ class UserViewSet(BaseModelViewSet): # Herda de BaseModelViewSet para filtros/pa
         user = request.user
 
         if request.method == 'GET':
-            # UserReadSerializer já inclui o perfil
-            serializer = self.get_serializer(user) # Usa UserReadSerializer
-            return Response(serializer.data)
+            # Payload em cache por usuário, versionado; a versão também é o ETag (GET condicional)
+            version = me_cache.get_version(user.id)
+            etag = me_cache.etag_for(user.id, version)
+            headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+            if_none_match = request.headers.get('If-None-Match', '')
+            if etag in [tag.strip() for tag in if_none_match.split(',')]:
+                return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+            return Response(me_cache.get_payload(user.id, version), headers=headers)
 
         # Para PUT e PATCH, usar o UserProfileUpdateSerializer
         serializer = self.get_serializer(user, data=request.data, partial=request.method == 'PATCH')
@@ -285,6 +312,8 @@ class PaymentViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
     """ViewSet para listar (Admin), obter detalhes (Dono/Admin) e listar pagamentos do usuário logado."""
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     # TODO: Definir search_fields e ordering_fields
     search_fields = ['method', 'status']
@@ -397,7 +426,8 @@ class SubscriptionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         subscription.status = 'cancelled'
         subscription.cancelled_at = timezone.now()
         subscription.save()
-        # TODO: Lógica adicional após cancelamento (ex: remover acesso premium imediatamente, enviar e-mail de confirmação)
+        # O save() acima dispara o signal que invalida o direito premium em cache (api/entitlements.py)
+        # TODO: Lógica adicional após cancelamento (ex: enviar e-mail de confirmação)
 
         return Response({
             'message': 'Solicitação de cancelamento de assinatura processada. O status final será confirmado em breve.'
@@ -461,7 +491,7 @@ class PaymentInitiateView(views.APIView):
                 amount=plan.price_cents / 100,
                 method=method,
                 status='pending',
-                # appmax_transaction_id=appmax_response_data['appmax_transaction_id'], # Adicionar campo no modelo Payment
+                appmax_transaction_id=appmax_response_data['appmax_transaction_id'], # Usado pelos webhooks para achar o pagamento
             )
 
             subscription = None
@@ -491,73 +521,43 @@ class PaymentInitiateView(views.APIView):
 
 
 class AppmaxWebhookView(views.APIView):
-    # ... (mantida como no código anterior, com TODOs e lógica esboçada para eventos)
-    """Recebe e processa webhooks da Appmax para atualizar status de pagamentos/assinaturas."""
+    """Recebe webhooks da Appmax e os enfileira (WebhookEvent) para processamento em lote."""
     permission_classes = [permissions.AllowAny]
     # TODO: Implementar Throttling
     # throttling_classes = [...]
 
     def post(self, request):
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: VERIFICAÇÃO DE AUTENTICIDADE DO WEBHOOK (ESSENCIAL!) <<<
-        # Verificar assinatura HMAC.
-
+        # Autenticidade antes de qualquer gravação: o evento muda Subscription/Payment (acesso premium).
+        # Sem APPMAX_WEBHOOK_SECRET configurado a rota recusa tudo.
+        if not webhooks.webhook_secret():
+            logger.error("Webhook Appmax recusado: APPMAX_WEBHOOK_SECRET não configurado.")
+            return Response({'status': 'error', 'message': 'Webhook desabilitado'}, status=status.HTTP_403_FORBIDDEN)
+        if not webhooks.verify_signature(request.body, request.headers.get(webhooks.SIGNATURE_HEADER)):
+            logger.warning("Webhook Appmax com assinatura inválida.")
+            return Response({'status': 'error', 'message': 'Assinatura inválida'}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Só grava o evento bruto e responde 200 na hora; o processamento (status de Payment/Subscription,
+        # acesso premium) roda em lote no comando process_webhooks (api/webhooks.py).
         try:
             data = json.loads(request.body)
-            event_type = data.get('event')
-            appmax_transaction_id = data.get('transaction_id')
-            appmax_subscription_id = data.get('subscription_id')
-            appmax_status = data.get('status')
-            # TODO: Extrair outros dados cruciais do payload
-
-            logger.info(f"Webhook Appmax recebido: Evento={event_type}, Transaction ID Appmax={appmax_transaction_id}, Subscription ID Appmax={appmax_subscription_id}, Status Appmax={appmax_status}")
-
-            # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: PROCESSAR DIFERENTES EVENTOS E PAYLOADS <<<
-            # Encontrar modelos locais (Payment/Subscription) usando IDs da Appmax.
-            # Atualizar status e dados nos modelos locais.
-            # Lidar com criação de novos Payments para cobranças recorrentes.
-            # Implementar _map_appmax_status e _map_appmax_subscription_status completos.
-            # Adicionar lógica para conceder/remover acesso premium.
-
-            # Exemplo BÁSICO de fluxo (substituir pela lógica real para cada event_type):
-            if event_type == 'payment_update':
-                # Encontrar Payment local usando appmax_transaction_id
-                # Atualizar status e confirmed_at
-                # Se for o primeiro pagamento de assinatura, ativar Subscription
-                 pass # Implemente a lógica real
-
-            elif event_type == 'subscription_update':
-                # Encontrar Subscription local usando appmax_subscription_id
-                # Atualizar status (cancelled, expired, past_due)
-                # Lógica para remover acesso premium se status for cancelado/expirado
-                 pass # Implemente a lógica real
-
-            elif event_type in ['charge_success', 'charge_failed']:
-                 # Encontrar Subscription local usando appmax_subscription_id
-                 # Criar NOVO Payment para esta cobrança recorrente, salvando transaction_id e vinculando à Subscription
-                 # Atualizar status da Subscription se necessário (ex: 'active' se sucesso, 'past_due' se falha)
-                 pass # Implemente a lógica real
-
-            # TODO: Lidar com outros eventos (refund, etc.)
-
-            return Response({'status': 'success'}) # Appmax espera 200 OK
-
-        except json.JSONDecodeError:
+            if not isinstance(data, dict):
+                raise ValueError('payload não é um objeto JSON')
+        except (json.JSONDecodeError, ValueError):
             logger.error("Erro ao decodificar JSON do webhook Appmax.")
             return Response({'status': 'error', 'message': 'Payload inválido'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            event, created = WebhookEvent.record(data)
         except Exception as e:
-            logger.error(f"Erro inesperado processando webhook Appmax: {e}", exc_info=True)
+            logger.error(f"Erro inesperado gravando webhook Appmax: {e}", exc_info=True)
             return Response({'status': 'error', 'message': 'Erro interno no servidor'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    # TODO: Mapear status da Appmax para o seu modelo (COMPLETAR)
-    def _map_appmax_status(self, appmax_status):
-        # ... (implementação como no código anterior)
-        status_map = {'approved': 'confirmed', 'pending': 'pending', 'processing': 'pending', 'rejected': 'failed', 'refunded': 'failed', 'chargeback': 'failed',}
-        return status_map.get(appmax_status, 'pending')
+        if not created:
+            # Reentrega do mesmo evento: nada a fazer
+            return Response({'status': 'duplicate'})
 
-    def _map_appmax_subscription_status(self, appmax_status):
-        # ... (implementação como no código anterior)
-        status_map = {'active': 'active', 'cancelled': 'cancelled', 'past_due': 'past_due', 'expired': 'expired', 'pending_payment': 'pending', 'trialing': 'active',}
-        return status_map.get(appmax_status, 'pending')
+        logger.info(f"Webhook Appmax recebido: Evento={event.event_type}, Transaction ID Appmax={data.get('transaction_id')}, Subscription ID Appmax={data.get('subscription_id')}, Status Appmax={data.get('status')}")
+        return Response({'status': 'success'}) # Appmax espera 200 OK
 
 
 # UserPaymentsView e UserSubscriptionView foram movidas para @actions nos ViewSets correspondentes.
@@ -579,7 +579,7 @@ class ClassModelViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
     def get_permissions(self):
          """Define permissões baseadas na ação."""
          # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: PERMISSÕES DE TURMA <<<
-         # - create: IsTeacher (e talvez IsTeacherAndPremiumActive).
+         # - create: IsTeacherAndPremiumActive.
          # - list: Decidir quem pode listar o quê (filtrado no get_queryset).
          # - retrieve: IsClassMember (Professor ou Aluno da turma) OU Admin.
          # - update/partial_update/destroy: IsClassTeacher.
@@ -587,7 +587,7 @@ class ClassModelViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
          # - students (@action aninhada): IsAuthenticated, IsClassMember.
          # - remove_student (@action aninhada): IsAuthenticated, IsClassTeacher.
          if self.action == 'create':
-             self.permission_classes = [permissions.IsAuthenticated, IsTeacher] # TODO: Add IsTeacherAndPremiumActive
+             self.permission_classes = [permissions.IsAuthenticated, IsTeacherAndPremiumActive] # Direito premium em cache (api/entitlements.py)
          elif self.action in ['update', 'partial_update', 'destroy']:
              self.permission_classes = [permissions.IsAuthenticated, IsClassTeacher]
          elif self.action in ['retrieve']:
@@ -611,11 +611,8 @@ class ClassModelViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
             # - Apenas turmas "públicas"?
             # - Nenhuma?
             if user.is_authenticated:
-                 # Exemplo: Retorna apenas as turmas do usuário logado (similar a UserClassesView anterior)
-                 return ClassModel.objects.filter(
-                     Q(professor=user) |
-                     Q(class_students__student=user, class_students__removed_at__isnull=True)
-                 ).distinct()
+                 # Apenas as turmas do usuário logado (ids já carregados pelo contexto de autorização)
+                 return get_auth_context(self.request).filter_classes(ClassModel.objects.all()).select_related('professor')
             else:
                  # Exemplo: Não autenticado não vê a lista geral
                  return ClassModel.objects.none()
@@ -627,21 +624,17 @@ class ClassModelViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
 
     def perform_create(self, serializer):
         """Define o professor logado na criação da turma."""
-        # A permissão IsTeacher (e IsTeacherAndPremiumActive) já garantiu que é um professor elegível
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: ACESSO PREMIUM (CRIAR TURMA) <<<
-        # A permissão IsTeacherAndPremiumActive deve ser verificada ANTES de perform_create.
+        # A permissão IsTeacherAndPremiumActive já garantiu que é um professor elegível
         serializer.save(professor=self.request.user, status='active')
 
     # --- Actions centralizadas ---
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated], url_path='me')
     def my_classes(self, request):
         """Lista as turmas onde o usuário autenticado é professor ou aluno (/users/me/classes/)."""
-        user = request.user
-        # Busca turmas onde o usuário é professor OU aluno ativo
-        queryset = ClassModel.objects.filter(
-            Q(professor=user) |
-            Q(class_students__student=user, class_students__removed_at__isnull=True)
-        ).distinct().select_related('professor').prefetch_related('class_students') # Otimizações de busca
+        # Turmas onde o usuário é professor OU aluno ativo, sem JOIN/DISTINCT sobre as matrículas
+        queryset = get_auth_context(request).filter_classes(
+            ClassModel.objects.all()
+        ).select_related('professor') # students_count vem do contador desnormalizado na própria turma
 
         # Usa paginação e filtros/busca padrão de BaseModelViewSet
         page = self.paginate_queryset(queryset)
@@ -652,6 +645,12 @@ class ClassModelViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsClassTeacher | permissions.IsAdminUser], url_path='gradebook')
+    def gradebook(self, request, pk=None):
+        """Boletim da turma: alunos ativos x atividades com a última nota, médias por aluno e por atividade."""
+        class_obj = self.get_object() # Verifica IsClassTeacher na turma
+        return Response(build_gradebook(class_obj.id))
+
     # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: CENTRALIZAR LISTA DE ALUNOS <<<
     # Transformar ClassStudentsView em uma @action aninhada
     # @action(detail=True, methods=['get'], serializer_class=ClassStudentSerializer, permission_classes=[permissions.IsAuthenticated, IsClassMember])
@@ -714,7 +713,7 @@ class InviteViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # - consume (@action): Apenas Aluno (autenticado), e a lógica interna valida.
         if self.action == 'consume':
              self.permission_classes = [permissions.IsAuthenticated, ~IsTeacher] # Apenas aluno autenticado pode consumir
-        elif self.action in ['create', 'update', 'partial_update', 'destroy', 'list', 'retrieve']:
+        elif self.action in ['create', 'bulk_create', 'update', 'partial_update', 'destroy', 'list', 'retrieve']:
              self.permission_classes = [permissions.IsAuthenticated, IsTeacher] # Apenas professor (filtra no get_queryset)
 
         return super().get_permissions()
@@ -722,6 +721,9 @@ class InviteViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
     def get_queryset(self):
         """Filtra queryset para listar/detalhe apenas convites das turmas do professor logado."""
         user = self.request.user
+        if self.action == 'consume':
+            # O aluno precisa resolver qualquer código; a validade é checada na própria action
+            return Invite.objects.select_related('class_invite')
         if user.is_teacher:
             # Professor só vê os convites das SUAS turmas
             return Invite.objects.filter(class_invite__professor=user).select_related('class_invite')
@@ -745,49 +747,106 @@ class InviteViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # Verificar se o usuário logado é o professor da turma antes de criar o convite para ela
         if class_obj.professor != self.request.user:
              # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: TRATAMENTO DE ERROS <<<
-             raise permissions.PermissionDenied("Você não é o professor desta turma.")
+             raise PermissionDenied("Você não é o professor desta turma.")
 
         serializer.validated_data['class_invite'] = class_obj # Define o objeto turma no validated_data
 
-        # Gerar código único para o convite antes de salvar
-        # TODO: Garantir unicidade do código de forma robusta (ex: loop try/except ou usar um pacote)
-        code = uuid.uuid4().hex[:10]
+        # Gerar código único para o convite antes de salvar (alocador checa colisões no BD)
+        code = allocate_invite_codes(1)[0]
         serializer.save(code=code)
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsTeacher], url_path='bulk')
+    def bulk_create(self, request):
+        """Gera N convites para uma ou várias turmas do professor com um único bulk_create."""
+        serializer = InviteBulkCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        class_ids = data['class_ids']
+
+        # Verifica a posse de todas as turmas com uma query
+        owned_ids = set(ClassModel.objects.filter(id__in=class_ids, professor=request.user).values_list('id', flat=True))
+        not_owned = [class_id for class_id in class_ids if class_id not in owned_ids]
+        if not_owned:
+            return Response({"error": "Você não é o professor destas turmas.", "class_ids": not_owned}, status=status.HTTP_403_FORBIDDEN)
+
+        total = len(class_ids) * data['count']
+        for attempt in range(3):
+            codes = iter(allocate_invite_codes(total))
+            invites = [
+                Invite(
+                    class_invite_id=class_id,
+                    code=next(codes),
+                    alias=data.get('alias'),
+                    max_uses=data.get('max_uses'),
+                    expires_at=data.get('expires_at'),
+                )
+                for class_id in class_ids
+                for _ in range(data['count'])
+            ]
+            try:
+                with transaction.atomic():
+                    created = Invite.objects.bulk_create(invites, batch_size=1000)
+                break
+            except IntegrityError:
+                # Outro processo inseriu um dos códigos entre a checagem e o INSERT: realoca o lote inteiro
+                logger.warning(f"Colisão de código ao gerar {total} convites em lote (tentativa {attempt + 1}).")
+        else:
+            return Response({"error": "Não foi possível gerar códigos únicos. Tente novamente."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+
+        # bulk_create não dispara post_save: remove possíveis entradas negativas destes códigos
+        for invite in created:
+            invite_cache.invalidate(invite.code)
+
+        return Response({
+            "created": len(created),
+            "invites": [{"id": invite.id, "class_invite": invite.class_invite_id, "code": invite.code} for invite in created],
+        }, status=status.HTTP_201_CREATED)
+
 
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated, ~IsTeacher], url_path='consume')
     def consume(self, request, code=None): # Usa 'code' como argumento vindo da URL por causa do lookup_field
         """Endpoint para um aluno usar um código de convite para entrar em uma turma."""
-        # get_object() usará o lookup_field 'code' para buscar o convite
-        invite = self.get_object()
+        # Resolve o código pelo cache em processo (inclui cache negativo para códigos inexistentes)
+        # em vez de get_object(), que iria ao BD a cada tentativa
+        invite = invite_cache.resolve(code)
+        if invite is MISSING:
+            return Response({"detail": "Convite não encontrado."}, status=status.HTTP_404_NOT_FOUND)
 
         user = request.user # Já garantido que é autenticado e não é professor
 
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: CONSUMIR CONVITE LÓGICA <<<
-        # Verificar validade do convite: usos, expiração, se aluno já está na turma.
-        if invite.max_uses is not None and invite.uses_count >= invite.max_uses:
+        now = timezone.now()
+
+        # Verificações rápidas sobre o snapshot em cache (evita escrita para convites já inválidos).
+        # A guarda definitiva é o UPDATE condicional em Invite.claim_use.
+        if invite.exhausted:
             return Response({"error": "Este convite atingiu o número máximo de usos."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if invite.expires_at is not None and invite.expires_at < timezone.now():
+        if invite.expires_at is not None and invite.expires_at < now:
              return Response({"error": "Este convite expirou."}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Verificar se o aluno já é membro ativo da turma
-        if ClassStudent.objects.filter(class_instance=invite.class_invite, student=user, removed_at__isnull=True).exists():
-             return Response({"error": "Você já é membro desta turma."}, status=status.HTTP_400_BAD_REQUEST)
-
-
-        # Criar a associação ClassStudent
-        ClassStudent.objects.create(
-            class_instance=invite.class_invite,
-            student=user
-        )
-
-        # Incrementar o contador de usos do convite
-        invite.uses_count += 1
-        invite.save()
+        # Matrícula + reserva do uso numa única transação curta. A matrícula vem primeiro para que o
+        # lock da linha do convite (tomado pelo UPDATE) fique retido o menor tempo possível.
+        with transaction.atomic():
+            _, enrolled = ClassStudent.enroll(invite.class_id, user)
+            if not enrolled:
+                # Idempotente: repetir o consumo não gasta outro uso nem gera erro de unicidade
+                return Response({
+                    "message": "Você já é membro desta turma."
+                }, status=status.HTTP_200_OK)
+
+            if not Invite.claim_use(invite.id, now=now):
+                # Outro aluno levou o último uso (ou o convite expirou) entre a leitura e o UPDATE;
+                # descarta a entrada para a próxima leitura trazer o estado esgotado do BD
+                transaction.set_rollback(True)
+                invite_cache.invalidate(code)
+                return Response({"error": "Este convite atingiu o número máximo de usos ou expirou."}, status=status.HTTP_400_BAD_REQUEST)
+
+            if invite.max_uses is not None and Invite.objects.filter(pk=invite.id, uses_count__gte=F('max_uses')).exists():
+                # Este consumo levou o último uso: o cache passa a responder "esgotado" sem ir ao BD
+                transaction.on_commit(lambda: invite_cache.set(code, invite._replace(exhausted=True)))
 
         return Response({
-            "message": f"Você entrou na turma '{invite.class_invite.name}' com sucesso!"
+            "message": f"Você entrou na turma '{invite.class_name}' com sucesso!"
         }, status=status.HTTP_200_OK)
 
 
@@ -808,17 +867,18 @@ class ActivityViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
     # TODO: Definir search_fields e ordering_fields
     search_fields = ['title', 'description', 'professor__full_name']
     ordering_fields = ['created_at', 'due_date', 'title']
+    similar_pairs_limit = 500 # Pares devolvidos por similar-pairs
 
     def get_permissions(self):
         """Define permissões baseadas na ação."""
         # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: PERMISSÕES DE ATIVIDADE <<<
-        # - create: IsTeacher (e talvez IsTeacherAndPremiumActive).
+        # - create: IsTeacherAndPremiumActive.
         # - list: Decidir quem pode listar o quê (filtrado no get_queryset).
         # - retrieve: Professor da atividade, Membro da turma associada (via ActivityClass), Admin.
         # - update/partial_update/destroy: Apenas professor da atividade (IsActivityTeacher).
         # - list_by_class (@action aninhada): IsAuthenticated, IsClassMember na turma.
         if self.action == 'create':
-             self.permission_classes = [permissions.IsAuthenticated, IsTeacher] # TODO: Add IsTeacherAndPremiumActive
+             self.permission_classes = [permissions.IsAuthenticated, IsTeacherAndPremiumActive] # Direito premium em cache (api/entitlements.py)
         elif self.action in ['update', 'partial_update', 'destroy']:
              self.permission_classes = [permissions.IsAuthenticated, IsActivityTeacher] # Verificar se o usuário é professor da activity
         elif self.action in ['retrieve']:
@@ -843,11 +903,9 @@ class ActivityViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
             if user.is_teacher:
                  return Activity.objects.filter(professor=user)
             elif user.is_authenticated: # Aluno
-                 # Busca atividades associadas a turmas onde o aluno é membro ativo
-                 return Activity.objects.filter(
-                     activity_classes__class_instance__class_students__student=user,
-                     activity_classes__class_instance__class_students__removed_at__isnull=True
-                 ).distinct()
+                 # Atividades das turmas onde o aluno é membro ativo, via índice materializado StudentActivity
+                 # (range scan em student_id; mantido pelos signals de ActivityClass/ClassStudent)
+                 return Activity.objects.filter(id__in=StudentActivity.activity_ids_for(user.id))
             # Admin vê todas por padrão com IsAdminUser permission na classe/get_permissions
             return super().get_queryset() # Queryset base para Admin
 
@@ -856,9 +914,61 @@ class ActivityViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
 
     def perform_create(self, serializer):
         """Define o professor logado na criação da atividade."""
-        # A permissão IsTeacher (e IsTeacherAndPremiumActive) já garantiu que é um professor elegível
+        # A permissão IsTeacherAndPremiumActive já garantiu que é um professor elegível
         serializer.save(professor=self.request.user)
 
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsClassTeacher | permissions.IsAdminUser], url_path='stats')
+    def stats(self, request, pk=None):
+        """Estatísticas das notas da atividade, normalizadas por max_score (agregados incrementais)."""
+        activity = self.get_object() # Professor da atividade ou de uma turma onde ela foi atribuída
+        return Response(activity_stats(activity))
+
+    @action(detail=True, methods=['get', 'put'], permission_classes=[permissions.IsAuthenticated, IsActivityTeacher], url_path='autograding-rules')
+    def autograding_rules(self, request, pk=None):
+        """GET: regras de correção automática da atividade. PUT: substitui a lista inteira."""
+        activity = self.get_object()
+        if request.method == 'PUT':
+            serializer = AutoGradingRuleSerializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                AutoGradingRule.objects.filter(activity=activity).delete()
+                AutoGradingRule.objects.bulk_create([
+                    AutoGradingRule(activity=activity, **rule) for rule in serializer.validated_data
+                ])
+        rules = AutoGradingRule.objects.filter(activity=activity).order_by('id')
+        return Response(AutoGradingRuleSerializer(rules, many=True).data)
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsClassTeacher | permissions.IsAdminUser], url_path='submissions-zip')
+    def submissions_zip(self, request, pk=None):
+        """ZIP em streaming com a última submissão de cada aluno, em pastas <turma>/<aluno>/."""
+        activity = self.get_object()
+        response = StreamingHttpResponse(stream_activity_zip(activity.id), content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="atividade_{activity.id}_submissoes.zip"'
+        return response
+
+    @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated, IsClassTeacher | permissions.IsAdminUser], url_path='similar-pairs')
+    def similar_pairs(self, request, pk=None):
+        """Pares de submissões parecidas (índice MinHash/LSH, comando index_similarity), mais parecidos primeiro."""
+        activity = self.get_object()
+        pairs = (
+            SimilarityPair.objects.filter(activity=activity)
+            .order_by('-similarity', 'id')
+            .values(
+                'similarity', 'detected_at', 'submission_a_id', 'submission_b_id',
+                'submission_a__student_id', 'submission_a__student__full_name',
+                'submission_b__student_id', 'submission_b__student__full_name',
+            )[:self.similar_pairs_limit]
+        )
+        return Response([{
+            'similarity': round(pair['similarity'], 3),
+            'detected_at': pair['detected_at'],
+            'submissions': [
+                {'id': pair[f'submission_{side}_id'], 'student_id': pair[f'submission_{side}__student_id'],
+                 'student_name': pair[f'submission_{side}__student__full_name']}
+                for side in ('a', 'b')
+            ],
+        } for pair in pairs])
+
     # TODO: Adicionar @action para listar atividades de uma turma específica?
     # Exemplo (requer ViewSet aninhado ou rota customizada com ID da turma):
     # @action(detail=False, methods=['get'], serializer_class=ActivitySerializer, permission_classes=[IsAuthenticated, IsClassMember], url_path='by_class/(?P<class_pk>[^/.]+)')
@@ -914,7 +1024,7 @@ class ActivityClassViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # Verificar se o usuário logado é o professor da 'activity' OU da 'class_instance'.
         if activity.professor != self.request.user and class_instance.professor != self.request.user:
             # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: TRATAMENTO DE ERROS <<<
-            raise permissions.PermissionDenied("Você não é o professor da atividade nem da turma associada.")
+            raise PermissionDenied("Você não é o professor da atividade nem da turma associada.")
 
         serializer.save()
 
@@ -929,14 +1039,26 @@ class ActivityClassViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
 # 7. SUBMISSÕES E FEEDBACK (ViewSets com actions customizadas e integração Cloudinary)
 # --------------------------------
 
+def _request_body_stream(request):
+    """
+    Corpo bruto da requisição como stream, sem carregar na memória (nunca request.body/request.data).
+    request.stream do DRF já é o wsgi.input limitado ao Content-Length; None quando não há corpo.
+    """
+    return request.stream or io.BytesIO()
+
+
 class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
-    """ViewSet para operações CRUD em Submissões, com upload para Cloudinary."""
+    """ViewSet para operações CRUD em Submissões, com upload direto ou em partes (retomável)."""
     queryset = Submission.objects.all()
     serializer_class = SubmissionSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-submitted_at', '-id')
 
     # TODO: Definir search_fields e ordering_fields
     search_fields = ['status', 'activity__title', 'student__full_name']
     ordering_fields = ['submitted_at', 'status']
+    # Fila de correção: ?activity=<id>&is_latest=true&status=pending (índices parciais em is_latest)
+    filterset_fields = ['activity', 'status', 'is_latest']
 
     def get_permissions(self):
         """Define permissões baseadas na ação."""
@@ -946,9 +1068,9 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # - retrieve: Aluno (dono), Professor (atividade/turma), Admin.
         # - update/partial_update: Aluno (dono, se no prazo), Professor (atividade/turma, para status?). Admin.
         # - destroy: Aluno (dono, se permitido/no prazo), Professor (atividade/turma). Admin.
-        if self.action == 'create':
+        if self.action in ['create', 'upload_init', 'upload_detail', 'upload_complete']:
              self.permission_classes = [permissions.IsAuthenticated, ~IsTeacher] # Apenas aluno autenticado
-             # Lógica adicional na view.create() para verificar associação Atividade-Turma-Aluno
+             # Lógica adicional na view.create()/upload_init() para verificar associação Atividade-Turma-Aluno
         elif self.action in ['retrieve']:
              self.permission_classes = [permissions.IsAuthenticated, IsOwner | IsClassTeacher | permissions.IsAdminUser] # Combine/refine
         elif self.action in ['update', 'partial_update']:
@@ -965,21 +1087,21 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
 
         # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: FILTRAGEM DA LISTA GERAL DE SUBMISSÕES <<<
         # Quem vê o quê na lista /api/submissions/list?
+        # Miniaturas: chaves dos derivados anotadas por subquery (sem N+1 e sem processar nada aqui)
         if user.is_teacher:
              # Submissões para atividades criadas por ele OU associadas a turmas que ele ensina
-             return Submission.objects.filter(
-                 Q(activity__professor=user) |
-                 Q(activity__activity_classes__class_instance__professor=user)
-             ).distinct().select_related('activity', 'student')
+             return BlobDerivative.annotate_keys(get_auth_context(self.request).filter_teaching_submissions(
+                 Submission.objects.all()
+             ).select_related('activity', 'student'))
         elif user.is_authenticated: # Aluno
              # Apenas as submissões dele
-             return Submission.objects.filter(student=user).select_related('activity', 'student')
+             return BlobDerivative.annotate_keys(Submission.objects.filter(student=user).select_related('activity', 'student'))
         # Admin vê todas por padrão com IsAdminUser permission na classe/get_permissions
-        return super().get_queryset().select_related('activity', 'student') # Queryset base para Admin
+        return BlobDerivative.annotate_keys(super().get_queryset().select_related('activity', 'student')) # Queryset base para Admin
 
 
     def create(self, request, *args, **kwargs):
-        """Cria uma nova submissão, lidando com o upload de arquivo para Cloudinary."""
+        """Cria uma nova submissão; o arquivo é transferido em segundo plano (status 'uploading')."""
         # User: Já garantido que é autenticado e não professor pela permission_classes (~IsTeacher)
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True) # Valida campos como activity, file, etc.
@@ -993,13 +1115,8 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # 3. Verificar se a atividade está aberta para submissões (status, due_date).
         # 4. Verificar se um arquivo foi fornecido se a atividade exige um arquivo (regra de negócio).
 
-        # Exemplo de validação de associação Atividade-Turma-Aluno
-        is_member = ClassStudent.objects.filter(
-            class_instance__activity_classes__activity=activity,
-            student=request.user,
-            removed_at__isnull=True
-        ).exists()
-        if not is_member:
+        # Associação Atividade-Turma-Aluno resolvida pelo contexto de autorização da requisição
+        if activity is None or activity.id not in get_auth_context(request).student_activity_ids:
              # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: TRATAMENTO DE ERROS <<<
              return Response({"error": "Você não é membro de uma turma onde esta atividade foi atribuída."}, status=status.HTTP_403_FORBIDDEN)
 
@@ -1008,61 +1125,190 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         #      return Response({"error": "Esta atividade não está aberta para submissões no momento."}, status=status.HTTP_400_BAD_REQUEST)
 
 
-        file_path = None # URL do Cloudinary
+        staged = None # (sha256, tamanho) do arquivo copiado para o staging
         mime_type = None
-        public_id = None # ID do Cloudinary para deleção futura
 
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: CLOUDINARY UPLOAD (CREATE) <<<
-        # Fazer upload do file_obj para o Cloudinary usando o SDK.
-        # Obter a URL (`secure_url`), `mime_type` (ou format), e `public_id` do resultado do upload.
-        # Lidar com erros de upload.
+        # Arquivos pequenos podem vir direto no multipart; vídeos e arquivos grandes usam o upload em
+        # partes (upload_init/upload_detail/upload_complete), que é retomável.
+        # O multipart só é copiado para o staging local (com SHA-256); conteúdo já armazenado não é
+        # reenviado, e o novo vai para o backend no pool de uploads (core/upload_offload.py).
         if file_obj:
-            try:
-                # Exemplo de chamada Cloudinary (SUBSTITUIR):
-                # upload_result = cloudinary.uploader.upload(
-                #     file_obj,
-                #     folder=f"submissions/activity_{activity.id}/user_{request.user.id}", # Exemplo de organização de pastas
-                #     public_id=f"{activity.id}_{request.user.id}_{uuid.uuid4().hex[:5]}", # Nome único
-                #     resource_type='auto' # Detectar tipo automaticamente
-                # )
-                # file_path = upload_result['secure_url']
-                # mime_type = upload_result.get('resource_type') + '/' + upload_result.get('format') # Ou file_obj.content_type
-                # public_id = upload_result['public_id'] # SALVAR este ID no modelo Submission!
-
-                # Placeholder:
-                file_path = f"http://cloudinary.com/placeholder/submissions/{uuid.uuid4().hex}"
-                mime_type = file_obj.content_type
-                public_id = f"placeholder_id_{uuid.uuid4().hex[:8]}" # Salvar este ID
-                logger.info(f"Placeholder: Arquivo '{file_obj.name}' seria enviado para Cloudinary. URL: {file_path}, Public ID: {public_id}")
-
-            except Exception as e:
-                logger.error(f"Erro no upload para Cloudinary para activity {activity.id}, user {request.user.id}: {e}", exc_info=True)
-                # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: TRATAMENTO DE ERROS <<<
-                return Response({"error": "Falha no upload do arquivo para a nuvem."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: SALVAR SUBMISSION <<<
-        # Criar a instância de Submission no BD:
-        # student=request.user
-        # activity=activity
-        # file_path = URL do Cloudinary
-        # mime_type = tipo do arquivo
-        # status='pending' (ou 'late' se o prazo passou - verificar due_date aqui)
-        # cloudinary_public_id = public_id # Adicionar este campo no modelo Submission e salvar!
-        submission = Submission.objects.create(
-            activity=activity,
-            student=request.user,
-            file_path=file_path, # URL salva no DB
-            mime_type=mime_type,
-            status='pending', # TODO: Verificar due_date para status 'late'
-            # cloudinary_public_id=public_id, # Salvar o public_id do Cloudinary
-        )
+            # Formato pelo conteúdo (primeiros KB), não pelo content_type do cliente; recusado antes do staging
+            fmt = file_formats.sniff(file_formats.read_head(file_obj))
+            if not file_formats.is_allowed(fmt, activity.allowed_formats):
+                return self._reject_format(request, activity, fmt)
+            staged = self._stage_file(request, activity.id, file_obj)
+            if staged is None:
+                return self._stage_failed()
+            mime_type = file_formats.mime_type_for(fmt, file_obj.content_type)
+
+        # TODO: status 'late' se o prazo passou - verificar due_date aqui
+        with transaction.atomic():
+            submission = Submission(
+                activity=activity,
+                student=request.user,
+                mime_type=mime_type,
+                status='pending', # TODO: Verificar due_date para status 'late'
+            )
+            if staged:
+                upload_offload.attach(submission, *staged) # Define blob, file_path e status ('uploading' se falta enviar)
+            submission.save()
 
         # Retornar os dados da submissão criada
         headers = self.get_success_headers(self.get_serializer(submission).data)
         return Response(self.get_serializer(submission).data, status=status.HTTP_201_CREATED, headers=headers)
 
 
+    def _stage_file(self, request, activity_id, file_obj):
+        """Copia o multipart para o staging (core/upload_offload.py). None se a gravação falhou (ex: disco cheio)."""
+        try:
+            return upload_offload.stage(file_obj.chunks())
+        except Exception as e:
+            logger.error(f"Erro ao gravar arquivo da submissão para activity {activity_id}, user {request.user.id}: {e}", exc_info=True)
+            return None
+
+    def _stage_failed(self):
+        return Response({"error": "Falha ao armazenar o arquivo."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def _reject_format(self, request, activity, fmt, session=None):
+        """
+        Arquivo fora dos formatos aceitos: registra a tentativa (status 'invalid_format', sem arquivo e
+        sem virar a última submissão do aluno) e responde 415. Nada é enviado ao armazenamento.
+        """
+        submission = Submission.objects.create(
+            activity=activity, student=request.user, mime_type=file_formats.FORMATS[fmt],
+            status='invalid_format', is_latest=False,
+        )
+        if session is not None:
+            UploadSession.objects.filter(id=session.id).update(status='aborted', submission=submission)
+        return Response({
+            "error": "Formato de arquivo não aceito nesta atividade.",
+            'format': fmt,
+            'allowed_formats': activity.allowed_formats,
+            'submission': submission.id,
+        }, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    # --- Upload em partes (retomável): init -> PUT das partes -> complete ---
+    @action(detail=False, methods=['post'], url_path='uploads')
+    def upload_init(self, request):
+        """Abre um upload: {activity, filename, content_type, size} -> {upload_id, offset, chunk_size}."""
+        serializer = UploadInitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        activity = data['activity']
+        if activity.id not in get_auth_context(request).student_activity_ids:
+             return Response({"error": "Você não é membro de uma turma onde esta atividade foi atribuída."}, status=status.HTTP_403_FORBIDDEN)
+
+        session = UploadSession.objects.create(
+            student=request.user, activity=activity, filename=data['filename'],
+            content_type=data['content_type'], total_size=data['size'],
+        )
+        return Response({
+            'upload_id': str(session.id),
+            'offset': 0,
+            'size': session.total_size,
+            'chunk_size': getattr(settings, 'SUBMISSION_UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024),
+        }, status=status.HTTP_201_CREATED)
+
+    def _get_upload(self, request, upload_id):
+        return get_object_or_404(UploadSession, id=upload_id, student=request.user)
+
+    @action(detail=False, methods=['get', 'put', 'delete'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})')
+    def upload_detail(self, request, upload_id=None):
+        """
+        GET: offset confirmado (para retomar). DELETE: cancela.
+        PUT: corpo binário da parte, gravado em streaming a partir do header Upload-Offset, que precisa
+        ser igual ao offset confirmado (senão 409 com o offset atual).
+        """
+        session = self._get_upload(request, upload_id)
+        if request.method == 'GET':
+            return Response({'upload_id': str(session.id), 'offset': session.received_bytes, 'size': session.total_size, 'status': session.status})
+
+        if session.status != 'open':
+            return Response({"error": "Upload já finalizado ou cancelado.", 'status': session.status}, status=status.HTTP_409_CONFLICT)
+
+        storage = get_storage()
+        if request.method == 'DELETE':
+            UploadSession.objects.filter(id=session.id, status='open').update(status='aborted')
+            storage.discard(session.id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({"error": "Header Upload-Offset obrigatório."}, status=status.HTTP_400_BAD_REQUEST)
+        if offset != session.received_bytes:
+            return Response({"error": "Offset fora de ordem.", 'offset': session.received_bytes}, status=status.HTTP_409_CONFLICT)
+
+        # Reserva a escrita: duas PUTs no mesmo offset não gravam juntas no arquivo parcial
+        token = session.claim_write(offset)
+        if token is None:
+            session.refresh_from_db(fields=['received_bytes'])
+            return Response({"error": "Outra parte está sendo gravada ou offset fora de ordem.", 'offset': session.received_bytes}, status=status.HTTP_409_CONFLICT)
+        try:
+            stream = _request_body_stream(request)
+            if offset == 0:
+                # Primeira parte: formato checado pelos primeiros KB, antes de gravar e de receber o resto
+                stream = file_formats.SniffedStream(stream)
+                fmt = file_formats.sniff(stream.head) if stream.head else None
+                if fmt and not file_formats.is_allowed(fmt, session.activity.allowed_formats):
+                    storage.discard(session.id)
+                    return self._reject_format(request, session.activity, fmt, session=session)
+                if fmt:
+                    UploadSession.objects.filter(id=session.id).update(content_type=file_formats.mime_type_for(fmt, session.content_type))
+            try:
+                written = storage.write_chunk(session.id, offset, stream, limit=session.total_size - offset)
+            except UploadTooLarge:
+                return Response({"error": "Parte excede o tamanho declarado do arquivo.", 'offset': offset}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            if not session.advance(offset, written, token):
+                session.refresh_from_db(fields=['received_bytes'])
+                return Response({"error": "Offset fora de ordem.", 'offset': session.received_bytes}, status=status.HTTP_409_CONFLICT)
+        finally:
+            session.release_write(token) # No-op se advance já soltou a reserva
+        return Response({'offset': session.received_bytes, 'size': session.total_size})
+
+    @action(detail=False, methods=['post'], url_path=r'uploads/(?P<upload_id>[0-9a-f-]{36})/complete')
+    def upload_complete(self, request, upload_id=None):
+        """Fecha o upload completo e cria a Submission apontando para o arquivo armazenado."""
+        session = self._get_upload(request, upload_id)
+        if session.status == 'completed' and session.submission_id:
+            # complete repetido (resposta perdida na rede): devolve a mesma submissão
+            return Response(self.get_serializer(session.submission).data, status=status.HTTP_200_OK)
+        if session.status != 'open':
+            return Response({"error": "Upload cancelado."}, status=status.HTTP_409_CONFLICT)
+        if session.received_bytes != session.total_size:
+            return Response({"error": "Upload incompleto.", 'offset': session.received_bytes, 'size': session.total_size}, status=status.HTTP_409_CONFLICT)
+
+        # SHA-256 numa leitura sequencial do arquivo parcial: as partes chegam em requisições separadas
+        # (outros workers, retomadas depois de restart) e o estado do hashlib não é serializável para ser
+        # guardado na UploadSession entre elas. Calculado antes da transação: com o SQLite em modo
+        # IMMEDIATE, ler até 200 MB dentro dela seguraria o lock de escrita do banco inteiro. O arquivo não
+        # muda mais: o upload está completo e qualquer PUT além do tamanho declarado é recusada.
+        storage = get_storage()
+        sha256, size = storage.digest(session.id)
+
+        with transaction.atomic():
+            if not UploadSession.objects.filter(id=session.id, status='open', received_bytes=size).update(status='completed'):
+                return Response({"error": "Upload já finalizado."}, status=status.HTTP_409_CONFLICT)
+            # Conteúdo idêntico já armazenado: só soma uma referência ao blob (digest já calculado acima) e
+            # apaga o arquivo parcial depois do commit, fora do lock de escrita
+            blob = StoredBlob.acquire(sha256, size)
+            if blob.stored:
+                transaction.on_commit(lambda: storage.discard(session.id))
+            else:
+                storage.finalize(session.id, blob.key)
+                StoredBlob.mark_stored(blob.sha256)
+            submission = Submission.objects.create(
+                activity_id=session.activity_id,
+                student=request.user,
+                file_path=blob.key,
+                blob=blob,
+                mime_type=session.content_type or None, # Detectado na primeira parte
+                status='pending', # TODO: Verificar due_date para status 'late'
+            )
+            UploadSession.objects.filter(id=session.id).update(submission=submission)
+        return Response(self.get_serializer(submission).data, status=status.HTTP_201_CREATED)
+
     def update(self, request, *args, **kwargs):
         """Atualiza uma submissão, lidando com upload de arquivo e permissões (Aluno/Professor)."""
         # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: LÓGICA DE UPDATE DE SUBMISSÃO <<<
@@ -1093,22 +1339,40 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
              # TODO: Verificar prazo da atividade (instance.activity.due_date)
              # TODO: Validar que o Aluno SÓ PODE atualizar campos permitidos (ex: 'file')
              # Remover outros campos não permitidos da validated_data antes de salvar
+             if file_obj:
+                 fmt = file_formats.sniff(file_formats.read_head(file_obj))
+                 if not file_formats.is_allowed(fmt, instance.activity.allowed_formats):
+                     # Troca recusada: a submissão continua com o arquivo que já tinha
+                     return Response({"error": "Formato de arquivo não aceito nesta atividade.", 'format': fmt, 'allowed_formats': instance.activity.allowed_formats}, status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
              if 'status' in serializer.validated_data and serializer.validated_data['status'] != 'pending':
                  # Aluno talvez só possa resetar para pendente ou não mudar status
                  return Response({"error": "Alunos geralmente não podem alterar o status da submissão."}, status=status.HTTP_403_FORBIDDEN)
-             if 'status' in serializer.validated_data:
+             if 'status' in serializer.validated_data and instance.status != 'uploading':
                   instance.status = new_status # Permitir Aluno mudar status para pending?
 
+             staged = None
              if file_obj:
-                 # TODO: Implementar deleção do arquivo anterior no Cloudinary usando o public_id salvo no modelo
-                 # TODO: Fazer upload do novo arquivo para Cloudinary
-                 # TODO: Atualizar instance.file_path, instance.mime_type, public_id
-                 logger.info(f"Placeholder: Aluno atualizando arquivo para submissão {instance.id}. Novo arquivo: {file_obj.name}")
-                 instance.file_path = f"http://cloudinary.com/placeholder/submissions/updated_{uuid.uuid4().hex}" # Placeholder
-                 instance.mime_type = file_obj.content_type # Placeholder
-                 # instance.cloudinary_public_id = new_public_id # Salvar novo public_id
-
-             instance.save() # Salva a instância com as alterações permitidas
+                 # Cópia para o staging fora da transação, com a mesma resposta de erro do create
+                 staged = self._stage_file(request, instance.activity_id, file_obj)
+                 if staged is None:
+                     return self._stage_failed()
+
+             with transaction.atomic():
+                 old_blob_id = old_path = None
+                 if file_obj:
+                     old_blob_id, old_path = instance.blob_id, instance.file_path
+                     instance.mime_type = file_formats.mime_type_for(fmt, file_obj.content_type)
+                     instance.autograded_at = None # Arquivo novo: volta para a fila da correção automática
+                     autograde.discard_automatic([instance.id]) # Nota automática era do arquivo antigo
+                     SubmissionSignature.drop([instance.id]) # Volta para a fila do índice de similaridade
+                     upload_offload.attach(instance, *staged)
+
+                 instance.save() # Salva a instância com as alterações permitidas
+                 if old_blob_id:
+                     StoredBlob.release(old_blob_id) # Objeto remoto só some se ninguém mais o usa
+                 elif old_path and not old_path.startswith(('http://', 'https://')):
+                     storage = get_storage()
+                     transaction.on_commit(lambda: storage.delete(old_path)) # Arquivo antigo, sem blob
 
         elif instance.activity.professor == request.user or (hasattr(request.user, 'is_teacher') and request.user.is_teacher): # Professor da atividade ou relacionado ou Admin
              # Atualização por Professor (apenas status?)
@@ -1164,19 +1428,13 @@ class SubmissionViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
              return Response({"error": "Você não tem permissão para deletar esta submissão."}, status=status.HTTP_403_FORBIDDEN)
 
 
-        # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: CLOUDINARY DELETE <<<
-        # Chamar a API do Cloudinary para deletar o arquivo usando o public_id SALVO no modelo Submission.
-        if instance.file_path: # Ou use instance.cloudinary_public_id
+        # Arquivos com blob são liberados pelo signal post_delete (contagem de referências); submissões
+        # antigas sem blob apagam o arquivo direto. A deleção local no BD ocorre mesmo se falhar.
+        if not instance.blob_id and instance.file_path and not instance.file_path.startswith(('http://', 'https://')):
             try:
-                # Exemplo hipotético de chamada Cloudinary (SUBSTITUIR, precisa do public_id salvo)
-                # public_id = instance.cloudinary_public_id # Obter o public_id salvo no modelo
-                # if public_id:
-                #    cloudinary.uploader.destroy(public_id)
-                logger.info(f"Placeholder: Arquivo no Cloudinary para submissão {instance.id} (Public ID: [salvo no modelo]) seria deletado.")
+                get_storage().delete(instance.file_path)
             except Exception as e:
-                 logger.error(f"Erro ao deletar arquivo no Cloudinary para submissão {instance.id}: {e}", exc_info=True)
-                 # TODO: Decidir se falhar na deleção do Cloudinary impede a deleção local ou apenas loga o erro.
-                 # Geralmente, a deleção local no BD deve ocorrer mesmo que a deleção na nuvem falhe.
+                 logger.error(f"Erro ao deletar arquivo da submissão {instance.id}: {e}", exc_info=True)
 
 
         # Deleta a instância do banco de dados
@@ -1189,6 +1447,8 @@ class FeedbackViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
     """ViewSet para operações CRUD em Feedback."""
     queryset = Feedback.objects.all()
     serializer_class = FeedbackSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
 
     # TODO: Definir search_fields e ordering_fields
     search_fields = ['comment', 'professor__full_name', 'submission__student__full_name']
@@ -1239,11 +1499,65 @@ class FeedbackViewSet(BaseModelViewSet): # Herda de BaseModelViewSet
         # Verificar se o usuário logado é o professor da atividade associada à submissão.
         if self.request.user != activity_professor:
              # TODO: >>> PONTO DE REVISÃO E IMPLEMENTAÇÃO: TRATAMENTO DE ERROS <<<
-             raise permissions.PermissionDenied("Você não é o professor da atividade para a qual está tentando dar feedback.")
+             raise PermissionDenied("Você não é o professor da atividade para a qual está tentando dar feedback.")
 
         # Salvar o feedback, definindo o professor como o usuário logado
         serializer.save(professor=self.request.user)
 
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAuthenticated, IsTeacher], url_path='bulk')
+    def bulk_create(self, request):
+        """
+        Correção em lote: {"items": [{submission, score, comment}, ...]}. Submissões e atividades vêm numa
+        query só; max_score e a posse são checados em memória e os feedbacks entram num único
+        bulk_create. Tudo ou nada: com qualquer item inválido, responde 400 com os erros por item.
+        """
+        envelope = FeedbackBulkSerializer(data=request.data)
+        envelope.is_valid(raise_exception=True)
+        rows, errors = [], {}
+        for index, raw in enumerate(envelope.validated_data['items']):
+            item = FeedbackBulkItemSerializer(data=raw)
+            if item.is_valid():
+                rows.append((index, item.validated_data))
+            else:
+                errors[index] = item.errors
+
+        # (activity_id, professor_id, max_score) de todas as submissões citadas, numa query
+        submissions = {
+            row[0]: row[1:] for row in Submission.objects.filter(id__in={item['submission'] for _, item in rows})
+            .values_list('id', 'activity_id', 'activity__professor_id', 'activity__max_score')
+        }
+        for index, item in rows:
+            found = submissions.get(item['submission'])
+            if found is None:
+                errors[index] = {'submission': ["Submissão não encontrada."]}
+            elif found[1] != request.user.id:
+                errors[index] = {'submission': ["Você não é o professor da atividade desta submissão."]}
+            elif item.get('score') is not None and found[2] is not None and item['score'] > found[2]:
+                errors[index] = {'score': [f"Pontuação ({item['score']}) não pode ser maior que a pontuação máxima da atividade ({found[2]})."]}
+
+        if errors:
+            return Response({
+                "error": "Nenhum feedback foi criado.",
+                "items": [{'index': index, **errors[index]} for index in sorted(errors)],
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        # Instância já carregada do professor em todas as linhas: professor_name na resposta não faz uma
+        # query por feedback (submission sai como id, sem carregar a relação)
+        professor = request.user
+        feedbacks = [
+            Feedback(submission_id=item['submission'], professor=professor, score=item.get('score'), comment=item.get('comment'))
+            for _, item in rows
+        ]
+        with transaction.atomic():
+            # bulk_create não dispara post_save: as estatísticas recebem as notas novas antes dele
+            ActivityScoreStats.apply_new_feedbacks([(f.submission_id, f.score) for f in feedbacks])
+            created = Feedback.objects.bulk_create(feedbacks, batch_size=500)
+
+        return Response({
+            "created": len(created),
+            "feedbacks": FeedbackSerializer(created, many=True, context=self.get_serializer_context()).data,
+        }, status=status.HTTP_201_CREATED)
+
     # TODO: Adicionar @action para listar feedbacks de uma submissão específica?
     # Exemplo (requer ViewSet aninhado ou rota customizada com ID da submissão):
     # @action(detail=False, methods=['get'], serializer_class=FeedbackSerializer, permission_classes=[IsAuthenticated, IsClassMember], url_path='by_submission/(?P<submission_pk>[^/.]+)')
@@ -0,0 +1,162 @@
+# webhooks.py
+"""
+Processamento assíncrono dos webhooks da Appmax.
+
+AppmaxWebhookView só grava o evento bruto em WebhookEvent (com chave de idempotência) e responde
+200 na hora. O comando process_webhooks drena a fila em lotes chamando AppmaxEventProcessor; cada
+evento roda no seu próprio savepoint, então um evento com erro não desfaz os demais do lote.
+"""
+import hashlib
+import hmac
+import logging
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.models import Payment, Subscription, WebhookEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 5 # Depois disso o evento fica como 'failed' para análise manual
+SIGNATURE_HEADER = 'X-Appmax-Signature'
+
+
+def webhook_secret():
+    return getattr(settings, 'APPMAX_WEBHOOK_SECRET', '')
+
+
+def verify_signature(raw_body, signature):
+    """HMAC-SHA256 (hex) do corpo bruto com APPMAX_WEBHOOK_SECRET, comparado em tempo constante."""
+    secret = webhook_secret()
+    if not secret or not signature:
+        return False
+    expected = hmac.new(secret.encode(), raw_body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.strip().lower())
+
+
+class InvalidEvent(ValueError):
+    """Evento que nunca vai ser aplicável (ex: sem o id que o identifica): falha direto, sem novas tentativas."""
+
+
+# Id obrigatório por tipo de evento. Sem ele o filtro viraria IS NULL e pegaria os registros antigos
+# (criados antes das colunas da Appmax) em vez de nenhum
+REQUIRED_IDS = {
+    'payment_update': ('transaction_id',),
+    'subscription_update': ('subscription_id',),
+    'charge_success': ('transaction_id', 'subscription_id'),
+    'charge_failed': ('transaction_id', 'subscription_id'),
+}
+
+
+class AppmaxEventProcessor:
+    """Aplica os eventos da Appmax aos modelos locais (Payment/Subscription)."""
+
+    def drain(self, batch_size=100):
+        """Processa um lote de eventos pendentes. Retorna (processados, com_erro)."""
+        with transaction.atomic():
+            queryset = WebhookEvent.objects.filter(status='pending').order_by('id')
+            if connection.features.has_select_for_update_skip_locked:
+                # Vários workers em paralelo pegam lotes diferentes (PostgreSQL); no SQLite a escrita já é serial
+                queryset = queryset.select_for_update(skip_locked=True)
+            events = list(queryset[:batch_size])
+
+            processed = failed = 0
+            now = timezone.now()
+            for event in events:
+                event.attempts += 1
+                try:
+                    with transaction.atomic():
+                        self.process(event.event_type, event.payload)
+                except InvalidEvent as e:
+                    logger.warning(f"Webhook {event.id} ({event.event_type}) inválido: {e}")
+                    event.last_error = str(e)
+                    event.status = 'failed'
+                    failed += 1
+                except Exception as e:
+                    logger.error(f"Erro processando webhook {event.id} ({event.event_type}): {e}", exc_info=True)
+                    event.last_error = str(e)
+                    if event.attempts >= MAX_ATTEMPTS:
+                        event.status = 'failed'
+                    failed += 1
+                else:
+                    event.status = 'processed'
+                    event.processed_at = now
+                    event.last_error = ''
+                    processed += 1
+
+            if events:
+                WebhookEvent.objects.bulk_update(events, ['status', 'attempts', 'last_error', 'processed_at'])
+        return processed, failed
+
+    def process(self, event_type, data):
+        missing = [name for name in REQUIRED_IDS.get(event_type, ()) if not data.get(name)]
+        if missing:
+            raise InvalidEvent(f"evento '{event_type}' sem {', '.join(missing)}.")
+        appmax_transaction_id = data.get('transaction_id')
+        appmax_subscription_id = data.get('subscription_id')
+        appmax_status = data.get('status')
+
+        if event_type == 'payment_update':
+            self._payment_update(appmax_transaction_id, appmax_status)
+        elif event_type == 'subscription_update':
+            self._subscription_update(appmax_subscription_id, appmax_status)
+        elif event_type in ['charge_success', 'charge_failed']:
+            self._charge(event_type, appmax_transaction_id, appmax_subscription_id, appmax_status)
+        else:
+            # TODO: Lidar com outros eventos (refund, etc.)
+            logger.info(f"Webhook Appmax ignorado: evento '{event_type}' sem tratamento.")
+
+    def _payment_update(self, appmax_transaction_id, appmax_status):
+        new_status = self._map_appmax_status(appmax_status)
+        updates = {'status': new_status}
+        if new_status == 'confirmed':
+            updates['confirmed_at'] = timezone.now()
+        updated = Payment.objects.filter(appmax_transaction_id=appmax_transaction_id).update(**updates)
+        if not updated:
+            logger.warning(f"Webhook Appmax: pagamento com transaction_id={appmax_transaction_id} não encontrado.")
+
+    def _subscription_update(self, appmax_subscription_id, appmax_status):
+        subscription = Subscription.objects.filter(appmax_subscription_id=appmax_subscription_id).first()
+        if subscription is None:
+            logger.warning(f"Webhook Appmax: assinatura {appmax_subscription_id} não encontrada.")
+            return
+        subscription.status = self._map_appmax_subscription_status(appmax_status)
+        if subscription.status == 'cancelled' and subscription.cancelled_at is None:
+            subscription.cancelled_at = timezone.now()
+        subscription.save()
+
+    def _charge(self, event_type, appmax_transaction_id, appmax_subscription_id, appmax_status):
+        subscription = (
+            Subscription.objects.select_related('plan')
+            .filter(appmax_subscription_id=appmax_subscription_id).first()
+        )
+        if subscription is None:
+            logger.warning(f"Webhook Appmax: assinatura {appmax_subscription_id} não encontrada para cobrança.")
+            return
+
+        success = event_type == 'charge_success'
+        payment_status = self._map_appmax_status(appmax_status or ('approved' if success else 'rejected'))
+        # Cobrança recorrente vira um NOVO Payment, identificado pelo transaction_id da Appmax
+        Payment.objects.update_or_create(
+            appmax_transaction_id=appmax_transaction_id,
+            defaults={
+                'user_id': subscription.user_id,
+                'plan': subscription.plan,
+                'amount': subscription.plan.price_cents / 100,
+                'method': 'card',
+                'status': payment_status,
+                'confirmed_at': timezone.now() if payment_status == 'confirmed' else None,
+            },
+        )
+        subscription.status = 'active' if success else 'past_due'
+        subscription.save()
+
+    # TODO: Mapear status da Appmax para o seu modelo (COMPLETAR)
+    def _map_appmax_status(self, appmax_status):
+        status_map = {'approved': 'confirmed', 'pending': 'pending', 'processing': 'pending', 'rejected': 'failed', 'refunded': 'failed', 'chargeback': 'failed',}
+        return status_map.get(appmax_status, 'pending')
+
+    def _map_appmax_subscription_status(self, appmax_status):
+        status_map = {'active': 'active', 'cancelled': 'cancelled', 'past_due': 'past_due', 'expired': 'expired', 'pending_payment': 'pending', 'trialing': 'active',}
+        return status_map.get(appmax_status, 'pending')
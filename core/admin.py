@@ -2,7 +2,8 @@ from django.contrib import admin
 from .models import (
     User, Profile, Plan, Payment, ClassModel,
     Invite, ClassStudent, Activity, ActivityClass,
-    Submission, Feedback
+    Submission, Feedback, WebhookEvent, ActivityReminder, Notification, StoredBlob,
+    AutoGradingRule, SimilarityPair
 )
 
 @admin.register(User)
@@ -30,9 +31,10 @@ class PaymentAdmin(admin.ModelAdmin):
 
 @admin.register(ClassModel)
 class ClassModelAdmin(admin.ModelAdmin):
-    list_display = ('name', 'professor', 'status', 'created_at')
+    list_display = ('name', 'professor', 'status', 'students_count', 'created_at')
     list_filter = ('status',)
     search_fields = ('name', 'professor__full_name')
+    readonly_fields = ('students_count',) # Mantido pelos signals de ClassStudent
 
 @admin.register(Invite)
 class InviteAdmin(admin.ModelAdmin):
@@ -50,6 +52,12 @@ class ActivityAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('title', 'professor__full_name')
 
+@admin.register(AutoGradingRule)
+class AutoGradingRuleAdmin(admin.ModelAdmin):
+    list_display = ('activity', 'kind', 'weight', 'created_at')
+    list_filter = ('kind',)
+    search_fields = ('activity__title',)
+
 @admin.register(ActivityClass)
 class ActivityClassAdmin(admin.ModelAdmin):
     list_display = ('activity', 'class_instance')
@@ -61,8 +69,40 @@ class SubmissionAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     search_fields = ('activity__title', 'student__full_name')
 
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ('sha256', 'size', 'ref_count', 'stored', 'created_at')
+    list_filter = ('stored',)
+    search_fields = ('sha256',)
+    readonly_fields = ('sha256', 'size', 'ref_count', 'created_at')
+
+@admin.register(SimilarityPair)
+class SimilarityPairAdmin(admin.ModelAdmin):
+    list_display = ('activity', 'submission_a', 'submission_b', 'similarity', 'detected_at')
+    search_fields = ('activity__title',)
+    raw_id_fields = ('submission_a', 'submission_b')
+
 @admin.register(Feedback)
 class FeedbackAdmin(admin.ModelAdmin):
     list_display = ('submission', 'professor', 'score', 'automatic', 'created_at')
     list_filter = ('automatic',)
     search_fields = ('submission__activity__title', 'professor__full_name')
+
+@admin.register(WebhookEvent)
+class WebhookEventAdmin(admin.ModelAdmin):
+    list_display = ('event_type', 'idempotency_key', 'status', 'attempts', 'received_at', 'processed_at')
+    list_filter = ('provider', 'status', 'event_type')
+    search_fields = ('idempotency_key',)
+    readonly_fields = ('payload', 'received_at', 'processed_at')
+
+@admin.register(ActivityReminder)
+class ActivityReminderAdmin(admin.ModelAdmin):
+    list_display = ('activity', 'fire_at', 'due_date', 'status', 'fired_at')
+    list_filter = ('status',)
+    search_fields = ('activity__title',)
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'activity', 'created_at', 'read_at')
+    list_filter = ('kind',)
+    search_fields = ('user__email', 'message')
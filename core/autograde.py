@@ -0,0 +1,102 @@
+# autograde.py
+"""
+Correção automática das submissões (Feedback.automatic=True).
+
+O comando run_autograder chama AutoGrader.drain() em lotes: as submissões novas (últimas do aluno,
+'pending'/'late', ainda sem autograded_at) das atividades com AutoGradingRule são lidas do banco
+e o texto vem do backend de armazenamento, tudo no processo principal. A correção, que é o trabalho
+de CPU, roda num ProcessPoolExecutor com um processo por núcleo (core/graders.py, sem Django). O
+resultado volta numa transação curta: claim condicional em autograded_at (dois workers nunca
+gravam a mesma submissão) e um bulk_create dos Feedbacks. Nada disso roda nos workers HTTP.
+"""
+import logging
+import os
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import graders
+from .models import ActivityScoreStats, AutoGradingRule, Feedback, Submission
+from .storage import read_text
+from .workers import ProcessPool
+
+logger = logging.getLogger(__name__)
+
+MAX_CONTENT_BYTES = getattr(settings, 'AUTOGRADE_MAX_CONTENT_BYTES', 1024 * 1024)
+
+
+def discard_automatic(submission_ids):
+    """
+    Apaga os Feedbacks automáticos das submissões (arquivo trocado ou nova correção). O post_delete
+    de Feedback tira as notas de ActivityScoreStats.
+    """
+    Feedback.objects.filter(submission_id__in=submission_ids, automatic=True).delete()
+
+
+class AutoGrader(ProcessPool):
+    """Corretor com um processo por núcleo (AUTOGRADE_WORKERS); use como context manager."""
+
+    def default_workers(self):
+        return getattr(settings, 'AUTOGRADE_WORKERS', None) or os.cpu_count() or 1
+
+    def pending(self, batch_size):
+        return list(
+            Submission.objects.filter(
+                autograded_at__isnull=True, is_latest=True, status__in=('pending', 'late'),
+                activity_id__in=AutoGradingRule.objects.values('activity_id'),
+            ).order_by('id').values_list(
+                'id', 'activity_id', 'activity__professor_id', 'activity__max_score', 'file_path', 'mime_type'
+            )[:batch_size]
+        )
+
+    def drain(self, batch_size=200):
+        """Corrige um lote. Retorna (submissões vistas, feedbacks criados)."""
+        rows = self.pending(batch_size)
+        if not rows:
+            return 0, 0
+
+        rules = {}
+        for activity_id, kind, config, weight in AutoGradingRule.objects.filter(
+            activity_id__in={row[1] for row in rows}
+        ).order_by('id').values_list('activity_id', 'kind', 'config', 'weight'):
+            rules.setdefault(activity_id, []).append((kind, config, weight))
+
+        jobs = [(row, read_text(row[4], row[5], MAX_CONTENT_BYTES)) for row in rows]
+        gradable = [(row, content) for row, content in jobs if content is not None]
+        chunksize = max(1, len(gradable) // (self.workers * 4))
+        results = self.executor.map(
+            graders.grade_submission,
+            [rules.get(row[1], []) for row, _ in gradable], [content for _, content in gradable],
+            chunksize=chunksize,
+        )
+        graded = {row[0]: (row, result) for (row, _), result in zip(gradable, results) if result is not None}
+
+        now = timezone.now()
+        with transaction.atomic():
+            # Claim: só grava o que ninguém gravou entre a leitura do lote e agora
+            claimed = set(
+                Submission.objects.select_for_update().filter(
+                    id__in=[row[0] for row in rows], autograded_at__isnull=True
+                ).values_list('id', flat=True)
+            )
+            Submission.objects.filter(id__in=claimed).update(autograded_at=now)
+            # Uma nota automática por submissão: a correção nova substitui a anterior
+            discard_automatic(claimed)
+
+            feedbacks = []
+            for submission_id, ((_, _, professor_id, max_score, _, _), (fraction, comment)) in graded.items():
+                if submission_id not in claimed:
+                    continue
+                scale = ActivityScoreStats.scale_for(max_score)
+                feedbacks.append(Feedback(
+                    submission_id=submission_id, professor_id=professor_id, score=Decimal(str(round(fraction * scale, 2))),
+                    comment=comment, automatic=True,
+                ))
+            # bulk_create não dispara post_save: estatísticas das notas atualizadas em lote
+            ActivityScoreStats.apply_new_feedbacks([(f.submission_id, f.score) for f in feedbacks])
+            Feedback.objects.bulk_create(feedbacks, batch_size=500)
+
+        logger.info(f"Correção automática: {len(claimed)} submissões, {len(feedbacks)} feedbacks.")
+        return len(rows), len(feedbacks)
@@ -0,0 +1,189 @@
+# file_formats.py
+"""
+Detecção do formato real dos arquivos de submissão pelos primeiros bytes (magic bytes).
+
+O content_type do upload vem do cliente e não é confiável. sniff() olha só os SNIFF_BYTES iniciais:
+assinaturas conhecidas (PDF, imagens, áudio, vídeo, compactados) e, nos ZIPs, os nomes das primeiras
+entradas (cabeçalhos locais), que distinguem DOCX/XLSX/PPTX e ODT/ODS/ODP de um ZIP comum. Texto é
+reconhecido por exclusão (sem bytes nulos e quase todo imprimível).
+
+Activity.allowed_formats lista os formatos (ou grupos, ex: 'document') aceitos na atividade; vazio
+aceita qualquer um. A checagem roda antes de o arquivo ir para o armazenamento.
+"""
+import struct
+
+from .storage import is_text
+
+SNIFF_BYTES = 8 * 1024
+
+# Formato -> MIME gravado em Submission.mime_type
+FORMATS = {
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+    'jpeg': 'image/jpeg',
+    'gif': 'image/gif',
+    'webp': 'image/webp',
+    'mp4': 'video/mp4',
+    'mov': 'video/quicktime',
+    'webm': 'video/webm',
+    'mkv': 'video/x-matroska',
+    'avi': 'video/x-msvideo',
+    'm4a': 'audio/mp4',
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'ogg': 'audio/ogg',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'odt': 'application/vnd.oasis.opendocument.text',
+    'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+    'odp': 'application/vnd.oasis.opendocument.presentation',
+    'ole': 'application/x-ole-storage', # DOC/XLS/PPT antigos (não dá para separar só pelo cabeçalho)
+    'zip': 'application/zip',
+    'rar': 'application/vnd.rar',
+    '7z': 'application/x-7z-compressed',
+    'gzip': 'application/gzip',
+    'text': 'text/plain',
+    'unknown': 'application/octet-stream',
+}
+
+FORMAT_GROUPS = {
+    'document': ('pdf', 'docx', 'odt', 'ole', 'text'),
+    'spreadsheet': ('xlsx', 'ods', 'ole'),
+    'presentation': ('pptx', 'odp', 'ole', 'pdf'),
+    'image': ('png', 'jpeg', 'gif', 'webp'),
+    'video': ('mp4', 'mov', 'webm', 'mkv', 'avi'),
+    'audio': ('m4a', 'mp3', 'wav', 'ogg'),
+    'archive': ('zip', 'rar', '7z', 'gzip'),
+}
+
+_SIGNATURES = (
+    (b'%PDF-', 'pdf'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'\xff\xd8\xff', 'jpeg'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'ole'),
+    (b'Rar!\x1a\x07', 'rar'),
+    (b'7z\xbc\xaf\x27\x1c', '7z'),
+    (b'\x1f\x8b', 'gzip'),
+    (b'OggS', 'ogg'),
+    (b'ID3', 'mp3'),
+)
+
+_ZIP_LOCAL_HEADER = b'PK\x03\x04'
+_ODF_MIMETYPES = {
+    b'application/vnd.oasis.opendocument.text': 'odt',
+    b'application/vnd.oasis.opendocument.spreadsheet': 'ods',
+    b'application/vnd.oasis.opendocument.presentation': 'odp',
+}
+_OOXML_PARTS = ((b'word/', 'docx'), (b'xl/', 'xlsx'), (b'ppt/', 'pptx'))
+
+
+def _sniff_zip(head):
+    """Tipo de um ZIP pelos nomes das entradas cujos cabeçalhos locais cabem no head."""
+    offset = 0
+    while 0 <= offset and offset + 30 <= len(head):
+        _, _, _, _, _, compressed_size, _, name_len, extra_len = struct.unpack_from('<HHHHIIIHH', head, offset + 6)
+        name = head[offset + 30:offset + 30 + name_len]
+        data_start = offset + 30 + name_len + extra_len
+        if name == b'mimetype':
+            # ODF: primeira entrada, sem compressão, com o MIME do documento
+            return _ODF_MIMETYPES.get(head[data_start:data_start + compressed_size], 'zip')
+        for prefix, fmt in _OOXML_PARTS:
+            if name.startswith(prefix):
+                return fmt
+        # Próximo cabeçalho: busca pela assinatura (com data descriptor o tamanho só vem depois dos dados)
+        offset = head.find(_ZIP_LOCAL_HEADER, data_start)
+    return 'zip'
+
+
+def _is_text(head):
+    if b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+        return True
+    except UnicodeDecodeError as e:
+        if e.start >= len(head) - 3 and e.reason == 'unexpected end of data':
+            return True # Caractere multibyte cortado no fim do head
+    # Latin-1/Windows-1252: texto se quase não tem caracteres de controle
+    controls = sum(1 for b in head if b < 32 and b not in (9, 10, 12, 13))
+    return controls <= len(head) // 100
+
+
+def sniff(head):
+    """Formato (chave de FORMATS) a partir dos primeiros bytes do arquivo."""
+    if not head:
+        return 'unknown'
+    for magic, fmt in _SIGNATURES:
+        if head.startswith(magic):
+            return fmt
+    if head.startswith(_ZIP_LOCAL_HEADER):
+        return _sniff_zip(head)
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand == b'qt  ':
+            return 'mov'
+        return 'm4a' if brand in (b'M4A ', b'M4B ') else 'mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'): # EBML (Matroska)
+        return 'webm' if b'webm' in head[:64] else 'mkv'
+    if head.startswith(b'RIFF'):
+        return {b'WEBP': 'webp', b'WAVE': 'wav', b'AVI ': 'avi'}.get(head[8:12], 'unknown')
+    if head[:2] in (b'\xff\xfb', b'\xff\xf3', b'\xff\xf2'): # Frame MPEG sem tag ID3
+        return 'mp3'
+    return 'text' if _is_text(head) else 'unknown'
+
+
+def expand(allowed):
+    """Formatos aceitos a partir da lista da atividade (formatos e grupos); None = qualquer um."""
+    if not allowed:
+        return None
+    formats = set()
+    for name in allowed:
+        formats.update(FORMAT_GROUPS.get(name, (name,)))
+    return formats
+
+
+def is_allowed(fmt, allowed):
+    formats = expand(allowed)
+    return formats is None or fmt in formats
+
+
+def mime_type_for(fmt, declared=None):
+    """MIME a gravar: o detectado, exceto em texto, onde o declarado (text/csv, JSON...) é mais preciso."""
+    if fmt == 'text' and declared and is_text(declared):
+        return declared
+    return FORMATS.get(fmt, FORMATS['unknown'])
+
+
+def read_head(fileobj):
+    """Lê até SNIFF_BYTES do início de um arquivo e volta o cursor para o começo."""
+    fileobj.seek(0)
+    head = fileobj.read(SNIFF_BYTES)
+    fileobj.seek(0)
+    return head
+
+
+class SniffedStream:
+    """Lê o início de um stream (corpo da requisição) para o sniff e devolve os mesmos bytes no read()."""
+
+    def __init__(self, stream, size=SNIFF_BYTES):
+        self._stream = stream
+        chunks = []
+        remaining = size
+        while remaining > 0:
+            block = stream.read(remaining)
+            if not block:
+                break
+            chunks.append(block)
+            remaining -= len(block)
+        self.head = b''.join(chunks)
+        self._pending = self.head
+
+    def read(self, size=-1):
+        if self._pending:
+            data = self._pending if size is None or size < 0 else self._pending[:size]
+            self._pending = self._pending[len(data):]
+            return data
+        return self._stream.read(size)
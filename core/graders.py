@@ -0,0 +1,162 @@
+# graders.py
+"""
+Corretores automáticos (AutoGradingRule.kind -> função).
+
+Funções puras, sem Django nem banco: rodam nos processos do ProcessPoolExecutor do core/autograde.py
+e recebem só dados simples (config da regra e o texto da submissão). Cada corretor devolve
+(fração em [0, 1], comentário) ou None quando não se aplica ao conteúdo. Para um novo tipo de
+regra basta registrar a função com @grader('tipo') e um validador de config.
+"""
+import json
+import re
+import unicodedata
+
+GRADERS = {}
+VALIDATORS = {}
+
+
+class InvalidRuleConfig(ValueError):
+    """Config de regra incompatível com o corretor."""
+
+
+def grader(kind, validator=None):
+    def register(func):
+        GRADERS[kind] = func
+        if validator:
+            VALIDATORS[kind] = validator
+        return func
+    return register
+
+
+def validate_config(kind, config):
+    if kind not in GRADERS:
+        raise InvalidRuleConfig(f"Tipo de regra desconhecido: {kind}.")
+    if not isinstance(config, dict):
+        raise InvalidRuleConfig("A configuração deve ser um objeto.")
+    if kind in VALIDATORS:
+        VALIDATORS[kind](config)
+
+
+def _normalize(text):
+    """Minúsculas, sem acentos e com espaços colapsados."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return ' '.join(text.lower().split())
+
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def normalize_words(text):
+    """Só as palavras do texto, normalizadas (usado também pelo índice de similaridade)."""
+    return _normalize(_NON_WORD.sub(' ', text))
+
+
+# -----------------------------
+# GABARITO (submissões estruturadas)
+# -----------------------------
+
+_ANSWER_LINE = re.compile(r'^\s*(\w+)\s*[:=).-]\s*(.+?)\s*$')
+
+
+def _parse_answers(content):
+    """Respostas em JSON ({"1": "b"} ou {"answers": {...}}) ou em linhas "1: b"."""
+    try:
+        data = json.loads(content)
+    except ValueError:
+        data = None
+    if isinstance(data, dict):
+        data = data.get('answers', data)
+        if isinstance(data, dict):
+            return {str(k): v for k, v in data.items()}
+        return None
+    answers = {}
+    for line in content.splitlines():
+        match = _ANSWER_LINE.match(line)
+        if match:
+            answers[match.group(1)] = match.group(2)
+    return answers or None
+
+
+def _validate_answer_key(config):
+    answers = config.get('answers')
+    if not isinstance(answers, dict) or not answers:
+        raise InvalidRuleConfig("Informe 'answers' como um objeto {questão: resposta}.")
+
+
+@grader('answer_key', _validate_answer_key)
+def answer_key(config, content):
+    answers = _parse_answers(content)
+    if answers is None:
+        return None
+    key = {str(k): v for k, v in config['answers'].items()}
+    fold = (lambda v: ' '.join(str(v).split())) if config.get('case_sensitive') else _normalize
+    wrong = [q for q, expected in key.items() if q not in answers or fold(answers[q]) != fold(expected)]
+    correct = len(key) - len(wrong)
+    comment = f"Gabarito: {correct}/{len(key)} corretas."
+    if wrong:
+        comment += f" Revisar: {', '.join(wrong[:20])}."
+    return correct / len(key), comment
+
+
+# -----------------------------
+# RUBRICA POR PALAVRAS-CHAVE (texto livre)
+# -----------------------------
+
+def _validate_rubric(config):
+    criteria = config.get('criteria')
+    if not isinstance(criteria, list) or not criteria:
+        raise InvalidRuleConfig("Informe 'criteria' como lista de {keywords, points}.")
+    for criterion in criteria:
+        keywords = criterion.get('keywords') if isinstance(criterion, dict) else None
+        if not isinstance(keywords, list) or not keywords or not all(isinstance(k, str) and k.strip() for k in keywords):
+            raise InvalidRuleConfig("Cada critério precisa de 'keywords' (lista de textos).")
+        if not isinstance(criterion.get('points', 1), (int, float)) or criterion.get('points', 1) <= 0:
+            raise InvalidRuleConfig("'points' deve ser um número positivo.")
+
+
+@grader('rubric_keywords', _validate_rubric)
+def rubric_keywords(config, content):
+    text = ' ' + normalize_words(content) + ' '
+    if not text.strip():
+        return None
+    total = earned = 0.0
+    missing = []
+    for criterion in config['criteria']:
+        points = float(criterion.get('points', 1))
+        total += points
+        # Critério atendido se qualquer palavra-chave aparece (palavra inteira, sem acento/caixa)
+        if any(f' {normalize_words(word)} ' in text for word in criterion['keywords']):
+            earned += points
+        else:
+            missing.append(criterion.get('label') or criterion['keywords'][0])
+    comment = f"Rubrica: {earned:g}/{total:g} pontos."
+    if missing:
+        comment += f" Faltou abordar: {', '.join(missing[:10])}."
+    return earned / total, comment
+
+
+def grade_submission(rules, content):
+    """
+    Aplica as regras (kind, config, weight) ao texto. Média ponderada das regras que se aplicam;
+    None se nenhuma se aplica. Roda nos processos do pool.
+    """
+    total_weight = weighted = 0.0
+    comments = []
+    for kind, config, weight in rules:
+        func = GRADERS.get(kind)
+        if func is None:
+            continue
+        try:
+            result = func(config, content)
+        except Exception as e: # Regra quebrada não derruba o lote
+            comments.append(f"[{kind}] erro na correção automática: {e}")
+            continue
+        if result is None:
+            continue
+        fraction, comment = result
+        total_weight += weight
+        weighted += weight * min(max(fraction, 0.0), 1.0)
+        comments.append(comment)
+    if not total_weight:
+        return None
+    return weighted / total_weight, ' '.join(comments)
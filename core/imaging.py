@@ -0,0 +1,84 @@
+# imaging.py
+"""
+Derivados de imagem das submissões (miniatura e versão de exibição), gerados com Pillow.
+
+Funções puras, sem Django nem banco: rodam nos processos do ProcessPoolExecutor do core/media.py e
+recebem só os bytes do arquivo e o MIME. render() devolve {tipo: (bytes, mime, largura, altura)}:
+'thumbnail' para toda imagem suportada e 'display' (JPEG recomprimido, lado maior limitado) só
+quando o original é pesado, como as fotos de câmera de celular. PDFs escaneados geram miniatura a
+partir da primeira imagem JPEG embutida; PDF só com texto/vetores não tem miniatura (renderizar
+página exigiria poppler/pdfium).
+"""
+import io
+import re
+
+from PIL import Image, ImageOps
+
+THUMBNAIL_SIZE = (320, 320)
+THUMBNAIL_QUALITY = 75
+DISPLAY_MAX_SIDE = 2048
+DISPLAY_QUALITY = 82
+DISPLAY_MIN_BYTES = 1024 * 1024 # Originais menores que isso já servem para exibição
+MAX_PIXELS = 60_000_000 # Acima disso (bomba de descompressão) a imagem é ignorada
+
+IMAGE_MIME_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+PDF_MIME_TYPE = 'application/pdf'
+
+_PDF_JPEG = re.compile(rb'/DCTDecode.{0,400}?stream\r?\n', re.DOTALL)
+
+
+def supports(mime_type):
+    return mime_type in IMAGE_MIME_TYPES or mime_type == PDF_MIME_TYPE
+
+
+def _first_pdf_jpeg(content):
+    """Primeiro stream JPEG (DCTDecode) do PDF: a página de um PDF escaneado."""
+    match = _PDF_JPEG.search(content)
+    if match is None:
+        return None
+    end = content.find(b'endstream', match.end())
+    return content[match.end():end] if end > 0 else None
+
+
+def _open(content, target_side):
+    image = Image.open(io.BytesIO(content))
+    if image.width * image.height > MAX_PIXELS:
+        return None
+    if image.format == 'JPEG':
+        # Decodifica JPEG já reduzido (escala 1/2, 1/4, 1/8): bem menos CPU e memória que a imagem cheia
+        image.draft('RGB', (target_side, target_side))
+    image = ImageOps.exif_transpose(image) # Fotos de celular guardam a rotação no EXIF
+    if image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, 'white') # JPEG não tem transparência
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    return image
+
+
+def _encode(image, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue(), 'image/jpeg', image.width, image.height
+
+
+def render(content, mime_type):
+    """Derivados do arquivo; {} se não há o que gerar. Roda nos processos do pool."""
+    source = _first_pdf_jpeg(content) if mime_type == PDF_MIME_TYPE else content
+    if not source:
+        return {}
+    wants_display = mime_type in IMAGE_MIME_TYPES and len(content) > DISPLAY_MIN_BYTES
+    image = _open(source, DISPLAY_MAX_SIDE if wants_display else max(THUMBNAIL_SIZE))
+    if image is None:
+        return {}
+
+    derivatives = {}
+    if wants_display:
+        display = image.copy()
+        display.thumbnail((DISPLAY_MAX_SIDE, DISPLAY_MAX_SIDE), Image.LANCZOS)
+        encoded = _encode(display, DISPLAY_QUALITY)
+        if len(encoded[0]) < len(content): # Só vale se ficou menor que o original
+            derivatives['display'] = encoded
+    image.thumbnail(THUMBNAIL_SIZE, Image.LANCZOS)
+    derivatives['thumbnail'] = _encode(image, THUMBNAIL_QUALITY)
+    return derivatives
@@ -0,0 +1,91 @@
+# invite_cache.py
+"""
+Cache em processo (TTL + LRU) dos códigos de convite resolvidos.
+
+Os códigos são a entrada pública mais martelada no início do semestre; códigos digitados errado
+ou chutados também ficam em cache (negativo) por pouco tempo para não irem ao banco toda vez.
+O cache é local a cada worker: os signals de Invite invalidam o worker que fez a escrita e o TTL
+limita a defasagem dos demais.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+
+from .models import Invite
+
+
+# Dados mínimos para validar o consumo sem tocar no BD. uses_count não fica em cache porque muda a
+# cada consumo; a guarda real é o UPDATE condicional em Invite.claim_use.
+CachedInvite = namedtuple('CachedInvite', ['id', 'class_id', 'class_name', 'expires_at', 'max_uses', 'exhausted'])
+
+# Sentinela para "código não existe"
+MISSING = object()
+
+
+class InviteCodeCache:
+    """LRU com TTL, thread-safe. Entradas positivas e negativas têm TTLs separados."""
+
+    def __init__(self, ttl=60, negative_ttl=5, max_entries=10000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # code -> (expira_em_monotonic, valor)
+        self._lock = threading.Lock()
+
+    def get(self, code):
+        """Retorna CachedInvite, MISSING (negativo) ou None se não estiver em cache."""
+        with self._lock:
+            item = self._entries.get(code)
+            if item is None:
+                return None
+            deadline, value = item
+            if deadline < time.monotonic():
+                del self._entries[code]
+                return None
+            self._entries.move_to_end(code)
+            return value
+
+    def set(self, code, value):
+        ttl = self.negative_ttl if value is MISSING else self.ttl
+        with self._lock:
+            self._entries[code] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(code)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, code):
+        with self._lock:
+            self._entries.pop(code, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def resolve(self, code):
+        """Resolve o código via cache; em miss faz uma única query (values) e guarda o resultado."""
+        value = self.get(code)
+        if value is not None:
+            return value
+
+        row = (
+            Invite.objects.filter(code=code)
+            .values_list('id', 'class_invite_id', 'class_invite__name', 'expires_at', 'max_uses', 'uses_count')
+            .first()
+        )
+        if row is None:
+            value = MISSING
+        else:
+            invite_id, class_id, class_name, expires_at, max_uses, uses_count = row
+            exhausted = max_uses is not None and uses_count >= max_uses
+            value = CachedInvite(invite_id, class_id, class_name, expires_at, max_uses, exhausted)
+        self.set(code, value)
+        return value
+
+
+invite_cache = InviteCodeCache(
+    ttl=getattr(settings, 'INVITE_CACHE_TTL', 60),
+    negative_ttl=getattr(settings, 'INVITE_CACHE_NEGATIVE_TTL', 5),
+    max_entries=getattr(settings, 'INVITE_CACHE_MAX_ENTRIES', 10000),
+)
@@ -0,0 +1,45 @@
+# invite_codes.py
+"""
+Alocação de códigos de convite únicos em lote.
+
+Em vez de tentar inserir linha a linha até não colidir, gera um lote de candidatos, descarta
+duplicatas em memória e remove os já existentes com uma query IN por bloco. Só os poucos
+candidatos descartados são regerados, então são ~n/LOOKUP_CHUNK_SIZE queries e nenhum retry por linha.
+"""
+import secrets
+
+from .models import Invite
+
+CODE_LENGTH = 10 # Mesmo formato de antes (uuid4().hex[:10])
+LOOKUP_CHUNK_SIZE = 900 # Abaixo do limite de variáveis por query do SQLite antigo
+MAX_ROUNDS = 10
+
+
+def random_code(length=CODE_LENGTH):
+    return secrets.token_hex((length + 1) // 2)[:length]
+
+
+def allocate_invite_codes(n, generate=random_code):
+    """Retorna uma lista com n códigos distintos entre si e ainda não usados em Invite."""
+    codes = set()
+    for _ in range(MAX_ROUNDS):
+        missing = n - len(codes)
+        if missing <= 0:
+            break
+        # Gera só os que faltam; colisões com o BD voltam para a próxima rodada
+        candidates = set()
+        while len(candidates) < missing:
+            code = generate()
+            if code not in codes:
+                candidates.add(code)
+
+        candidates = list(candidates)
+        for start in range(0, len(candidates), LOOKUP_CHUNK_SIZE):
+            chunk = candidates[start:start + LOOKUP_CHUNK_SIZE]
+            taken = set(Invite.objects.filter(code__in=chunk).values_list('code', flat=True))
+            codes.update(c for c in chunk if c not in taken)
+    else:
+        if len(codes) < n:
+            raise RuntimeError('Não foi possível alocar códigos de convite únicos.')
+
+    return list(codes)[:n]
@@ -0,0 +1,26 @@
+from core.models import ClassModel, StudentActivity
+
+
+def diff_batches(batch_size):
+    """
+    Percorre as turmas por keyset em id e, para cada lote, compara o índice StudentActivity com o
+    esperado (alunos ativos x atividades atribuídas). Gera (turmas_do_lote, faltando, sobrando), onde
+    faltando são tuplas (aluno, atividade, turma) e sobrando são ids de StudentActivity.
+    """
+    last_id = 0
+    while True:
+        class_ids = list(
+            ClassModel.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not class_ids:
+            return
+        last_id = class_ids[-1]
+
+        expected = set(StudentActivity.expected_rows(class_ids))
+        actual = {
+            (s, a, c): pk for pk, s, a, c in StudentActivity.objects.filter(class_instance_id__in=class_ids)
+            .values_list('id', 'student_id', 'activity_id', 'class_instance_id')
+        }
+        missing = expected - actual.keys()
+        extra = [pk for row, pk in actual.items() if row not in expected]
+        yield class_ids, missing, extra
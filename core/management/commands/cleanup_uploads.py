@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import UploadSession
+from core.storage import get_storage
+
+
+class Command(BaseCommand):
+    help = "Cancela uploads retomáveis abandonados ('open' sem partes novas) e apaga os arquivos parciais."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-hours', type=float, default=getattr(settings, 'SUBMISSION_UPLOAD_EXPIRY_HOURS', 24),
+                            help='Idade mínima (desde a última parte recebida) para considerar o upload abandonado.')
+        parser.add_argument('--batch-size', type=int, default=500, help='Uploads cancelados por lote.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timezone.timedelta(hours=options['older_than_hours'])
+        storage = get_storage()
+        total = 0
+        while True:
+            expired = UploadSession.expire_abandoned(before, batch_size=options['batch_size'])
+            for upload_id in expired:
+                storage.discard(upload_id)
+            total += len(expired)
+            if len(expired) < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'{total} uploads abandonados cancelados.'))
@@ -0,0 +1,14 @@
+from core import similarity
+from core.workers import DrainCommand
+
+
+class Command(DrainCommand):
+    help = 'Indexa as submissões novas (MinHash/LSH) e registra os pares de textos parecidos (SimilarityPair).'
+    default_batch_size = 200
+    batch_help = 'Submissões por lote.'
+
+    def drain(self, worker, batch_size, options):
+        return similarity.drain(batch_size)
+
+    def summary(self, totals):
+        return f'{totals[0]} submissões indexadas, {totals[1]} pares suspeitos.'
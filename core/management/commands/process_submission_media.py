@@ -0,0 +1,21 @@
+from core.media import MediaPipeline
+from core.workers import DrainCommand
+
+
+class Command(DrainCommand):
+    help = 'Gera miniaturas e versões de exibição das submissões de imagem e PDF (BlobDerivative).'
+    default_batch_size = 50
+    batch_help = 'Arquivos por lote.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=None, help='Processos do Pillow (padrão: SUBMISSION_MEDIA_WORKERS).')
+
+    def open_worker(self, options):
+        return MediaPipeline(workers=options['workers'])
+
+    def drain(self, pipeline, batch_size, options):
+        return pipeline.drain(batch_size)
+
+    def summary(self, totals):
+        return f'{totals[0]} arquivos processados, {totals[1]} derivados gerados.'
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from core.models import StudentActivity
+
+from ._student_activity_index import diff_batches
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói/repara em lote o índice materializado aluno -> atividade (StudentActivity).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Turmas processadas por lote.')
+
+    def handle(self, *args, **options):
+        checked = inserted = deleted = 0
+        for class_ids, missing, extra in diff_batches(options['batch_size']):
+            checked += len(class_ids)
+            if missing:
+                StudentActivity.insert_rows(missing)
+            if extra:
+                StudentActivity.objects.filter(id__in=extra).delete()
+            inserted += len(missing)
+            deleted += len(extra)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{checked} turmas verificadas, {inserted} linhas inseridas, {deleted} removidas.'
+        ))
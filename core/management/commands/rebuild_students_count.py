@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from core.models import ClassModel, ClassStudent
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói/repara em lote o contador desnormalizado ClassModel.students_count.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Turmas processadas por lote.')
+        parser.add_argument('--dry-run', action='store_true', help='Apenas reporta as divergências, sem gravar.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        dry_run = options['dry_run']
+
+        checked = 0
+        repaired = 0
+        last_id = 0
+        while True:
+            # Keyset por id: cada lote é uma única query com COUNT agregado (sem N+1)
+            batch = list(
+                ClassModel.objects.filter(id__gt=last_id)
+                .order_by('id')
+                .annotate(real_count=Count('class_students', filter=Q(class_students__removed_at__isnull=True)))
+                .only('id', 'students_count')[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].id
+            checked += len(batch)
+
+            stale_ids = [c.id for c in batch if c.students_count != c.real_count]
+            if stale_ids and not dry_run:
+                # Recalcula dentro do próprio UPDATE para não sobrescrever incrementos concorrentes
+                # feitos entre a leitura do lote e a escrita
+                active_count = (
+                    ClassStudent.objects.filter(class_instance=OuterRef('pk'), removed_at__isnull=True)
+                    .order_by().values('class_instance').annotate(c=Count('id')).values('c')
+                )
+                ClassModel.objects.filter(id__in=stale_ids).update(
+                    students_count=Coalesce(Subquery(active_count, output_field=IntegerField()), 0)
+                )
+            repaired += len(stale_ids)
+
+        verb = 'divergentes' if dry_run else 'corrigidas'
+        self.stdout.write(self.style.SUCCESS(f'{checked} turmas verificadas, {repaired} {verb}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from core import upload_offload
+
+
+class Command(BaseCommand):
+    help = "Retoma as transferências de arquivos de submissões presas em 'uploading' (ex: restart do servidor)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Submissões lidas por lote.')
+
+    def handle(self, *args, **options):
+        resumed, failed = upload_offload.resume_stalled(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{resumed} transferências retomadas, {failed} marcadas como falha (arquivo ausente no staging).'
+        ))
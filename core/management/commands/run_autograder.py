@@ -0,0 +1,21 @@
+from core.autograde import AutoGrader
+from core.workers import DrainCommand
+
+
+class Command(DrainCommand):
+    help = 'Corrige automaticamente as submissões novas das atividades com AutoGradingRule (Feedback.automatic).'
+    default_batch_size = 200
+    batch_help = 'Submissões por lote.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--workers', type=int, default=None, help='Processos de correção (padrão: núcleos da máquina).')
+
+    def open_worker(self, options):
+        return AutoGrader(workers=options['workers'])
+
+    def drain(self, grader, batch_size, options):
+        return grader.drain(batch_size)
+
+    def summary(self, totals):
+        return f'{totals[0]} submissões analisadas, {totals[1]} feedbacks automáticos.'
@@ -0,0 +1,30 @@
+from core import reminders
+from core.workers import DrainCommand
+
+
+class Command(DrainCommand):
+    help = 'Agenda e dispara os lembretes de prazo das atividades (Activity.notify_before_days).'
+    default_batch_size = 50
+    default_interval = 30.0
+    batch_help = 'Lembretes vencidos disparados por ciclo.'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--sync-every', type=int, default=20, help='Ciclos entre sincronizações completas.')
+        parser.add_argument('--chunk-size', type=int, default=reminders.FANOUT_CHUNK_SIZE, help='Alunos por bloco de notificações.')
+
+    def open_worker(self, options):
+        self.cycle = 0
+        return super().open_worker(options)
+
+    def drain(self, worker, batch_size, options):
+        if self.cycle % options['sync_every'] == 0:
+            # Rede de segurança: atividades alteradas sem passar pelo signal (update(), loaddata)
+            created = reminders.sync_reminders()
+            if created:
+                self.stdout.write(f'{created} lembretes agendados.')
+        self.cycle += 1
+        return reminders.fire_due_reminders(limit=batch_size, chunk_size=options['chunk_size'])
+
+    def summary(self, totals):
+        return f'{totals[0]} lembretes disparados, {totals[1]} notificações.'
@@ -0,0 +1,100 @@
+# media.py
+"""
+Miniaturas e versões de exibição das submissões de imagem e PDF (BlobDerivative).
+
+O comando process_submission_media chama MediaPipeline.drain() em lotes: os StoredBlobs já
+armazenados e ainda sem media_processed_at são lidos do backend no processo principal e o Pillow
+(core/imaging.py, sem Django) roda num ProcessPoolExecutor de SUBMISSION_MEDIA_WORKERS processos,
+algumas imagens por vez para limitar a memória. Os derivados vão para o armazenamento em
+derivative_key(sha256, tipo) e ficam ligados ao blob: mesmo conteúdo, mesma miniatura, gerada uma
+vez só. A API só devolve as URLs do que já existe; nada é processado numa requisição.
+"""
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from . import imaging
+from .models import BlobDerivative, StoredBlob, Submission
+from .storage import blob_key, derivative_key, get_storage
+from .workers import ProcessPool
+
+logger = logging.getLogger(__name__)
+
+MAX_SOURCE_BYTES = getattr(settings, 'SUBMISSION_MEDIA_MAX_BYTES', 40 * 1024 * 1024)
+
+
+class MediaPipeline(ProcessPool):
+    """Gerador de derivados com SUBMISSION_MEDIA_WORKERS processos; use como context manager."""
+
+    def default_workers(self):
+        return getattr(settings, 'SUBMISSION_MEDIA_WORKERS', 2)
+
+    def pending(self, batch_size):
+        mime_type = Submission.objects.filter(blob_id=OuterRef('pk')).values('mime_type')[:1]
+        return list(
+            StoredBlob.objects.filter(stored=True, media_processed_at__isnull=True)
+            .annotate(mime_type=Subquery(mime_type))
+            .order_by('created_at').values_list('sha256', 'size', 'mime_type')[:batch_size]
+        )
+
+    def _render_window(self, rows):
+        """Lê e processa algumas imagens por vez (no máximo 2 por processo em memória)."""
+        storage = get_storage()
+        jobs = []
+        for sha256, _, mime_type in rows:
+            try:
+                with storage.open(blob_key(sha256)) as f:
+                    jobs.append((sha256, f.read(), mime_type))
+            except FileNotFoundError:
+                logger.warning(f"Blob {sha256} ausente no armazenamento; sem miniatura.")
+        results = self.executor.map(_safe_render, [content for _, content, _ in jobs], [mime for _, _, mime in jobs])
+        return {sha256: derivatives for (sha256, _, _), derivatives in zip(jobs, results)}
+
+    def drain(self, batch_size=50):
+        """Processa um lote. Retorna (blobs vistos, derivados gravados)."""
+        rows = self.pending(batch_size)
+        if not rows:
+            return 0, 0
+
+        media = [row for row in rows if imaging.supports(row[2]) and row[1] <= MAX_SOURCE_BYTES]
+        rendered = {}
+        window = self.workers * 2
+        for start in range(0, len(media), window):
+            rendered.update(self._render_window(media[start:start + window]))
+
+        storage = get_storage()
+        derivatives = []
+        for sha256, outputs in rendered.items():
+            for kind, (data, mime_type, width, height) in outputs.items():
+                key = derivative_key(sha256, kind)
+                storage.save(key, [data])
+                derivatives.append(BlobDerivative(
+                    blob_id=sha256, kind=kind, key=key, mime_type=mime_type, width=width, height=height, size=len(data),
+                ))
+
+        with transaction.atomic():
+            # Blob liberado (última submissão apagada) durante o processamento: derivados vão junto
+            alive = set(StoredBlob.objects.select_for_update().filter(
+                sha256__in=[row[0] for row in rows]
+            ).values_list('sha256', flat=True))
+            orphans = [d.key for d in derivatives if d.blob_id not in alive]
+            derivatives = [d for d in derivatives if d.blob_id in alive]
+            BlobDerivative.objects.bulk_create(derivatives, ignore_conflicts=True)
+            StoredBlob.objects.filter(sha256__in=alive, media_processed_at__isnull=True).update(media_processed_at=timezone.now())
+        for key in orphans:
+            storage.delete(key)
+
+        logger.info(f"Mídia das submissões: {len(rows)} arquivos, {len(derivatives)} derivados.")
+        return len(rows), len(derivatives)
+
+
+def _safe_render(content, mime_type):
+    """imaging.render sem derrubar o lote: arquivo corrompido fica sem miniatura."""
+    try:
+        return imaging.render(content, mime_type)
+    except Exception as e:
+        logger.warning(f"Falha ao gerar miniatura ({mime_type}): {e}")
+        return {}
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:37
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_students_count(apps, schema_editor):
+    ClassModel = apps.get_model('core', 'ClassModel')
+    ClassStudent = apps.get_model('core', 'ClassStudent')
+    active_count = (
+        ClassStudent.objects.filter(class_instance=OuterRef('pk'), removed_at__isnull=True)
+        .order_by().values('class_instance').annotate(c=Count('id')).values('c')
+    )
+    ClassModel.objects.update(students_count=Coalesce(Subquery(active_count, output_field=IntegerField()), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_remove_user_password_hash_user_groups_user_is_active_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='classmodel',
+            name='students_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_students_count, migrations.RunPython.noop),
+    ]
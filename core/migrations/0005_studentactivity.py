@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_student_activity(apps, schema_editor):
+    ActivityClass = apps.get_model('core', 'ActivityClass')
+    StudentActivity = apps.get_model('core', 'StudentActivity')
+    rows = ActivityClass.objects.filter(
+        class_instance__class_students__removed_at__isnull=True
+    ).values_list('class_instance__class_students__student_id', 'activity_id', 'class_instance_id').iterator(chunk_size=2000)
+    batch = []
+    for student_id, activity_id, class_id in rows:
+        batch.append(StudentActivity(student_id=student_id, activity_id=activity_id, class_instance_id=class_id))
+        if len(batch) >= 2000:
+            StudentActivity.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    StudentActivity.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_webhookevent_payment_appmax_transaction_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_index', to='core.activity')),
+                ('class_instance', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='student_activity_index', to='core.classmodel')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='activity_index', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['class_instance', 'student'], name='core_studen_class_i_48682b_idx'), models.Index(fields=['activity'], name='core_studen_activit_5d8e6c_idx')],
+                'unique_together': {('student', 'activity', 'class_instance')},
+            },
+        ),
+        migrations.RunPython(backfill_student_activity, migrations.RunPython.noop),
+    ]
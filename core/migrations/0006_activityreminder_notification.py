@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-17 03:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_studentactivity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fire_at', models.DateTimeField()),
+                ('due_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('scheduled', 'Agendado'), ('firing', 'Disparando'), ('fired', 'Disparado'), ('cancelled', 'Cancelado')], default='scheduled', max_length=10)),
+                ('last_student_id', models.BigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('fired_at', models.DateTimeField(blank=True, null=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='core.activity')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('due_reminder', 'Lembrete de prazo')], max_length=20)),
+                ('message', models.CharField(max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('activity', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='core.activity')),
+                ('reminder', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='core.activityreminder')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='activityreminder',
+            index=models.Index(fields=['status', 'fire_at'], name='core_activi_status_13cc5b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='activityreminder',
+            constraint=models.UniqueConstraint(fields=('activity', 'fire_at'), name='unique_activity_reminder'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['user', 'created_at'], name='core_notifi_user_id_7862c3_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('reminder', 'user'), name='unique_reminder_notification'),
+        ),
+    ]
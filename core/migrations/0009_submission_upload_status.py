@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='submission',
+            name='status',
+            field=models.CharField(choices=[('uploading', 'Enviando Arquivo'), ('upload_failed', 'Falha no Envio'), ('pending', 'Pendente'), ('late', 'Atrasada'), ('invalid_format', 'Formato Inválido')], max_length=15),
+        ),
+    ]
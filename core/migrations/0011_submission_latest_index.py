@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:05
+
+from django.db import migrations, models
+from django.db.models import Exists, Max, OuterRef
+
+BACKFILL_CHUNK_SIZE = 5000
+
+
+def backfill_is_latest(apps, schema_editor):
+    """Marca is_latest=False nas submissões com uma mais nova do mesmo aluno, em faixas de id."""
+    Submission = apps.get_model('core', 'Submission')
+    max_id = Submission.objects.aggregate(m=Max('id'))['m'] or 0
+    newer = Submission.objects.filter(
+        activity_id=OuterRef('activity_id'), student_id=OuterRef('student_id'), id__gt=OuterRef('id')
+    )
+    for start in range(0, max_id + 1, BACKFILL_CHUNK_SIZE):
+        # Migration não atômica: cada faixa é um UPDATE curto, sem travar a tabela inteira
+        Submission.objects.filter(
+            id__gte=start, id__lt=start + BACKFILL_CHUNK_SIZE, is_latest=True
+        ).filter(Exists(newer)).update(is_latest=False)
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_stored_blob'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='submission',
+            name='core_submis_activit_35105e_idx',
+        ),
+        migrations.AddField(
+            model_name='submission',
+            name='is_latest',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(fields=['activity', 'student', 'submitted_at'], name='submission_act_student_idx'),
+        ),
+        # O índice acima já existe quando o backfill roda (subquery por activity/student)
+        migrations.RunPython(backfill_is_latest, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('is_latest', True)), fields=['activity', 'submitted_at'], name='submission_latest_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='submission',
+            index=models.Index(condition=models.Q(('is_latest', True)), fields=['activity', 'status', 'submitted_at'], name='submission_latest_status_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_submission_latest_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='submission',
+            name='autograded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='AutoGradingRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('answer_key', 'Gabarito'), ('rubric_keywords', 'Rubrica por palavras-chave')], max_length=30)),
+                ('config', models.JSONField(default=dict)),
+                ('weight', models.FloatField(default=1.0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='autograding_rules', to='core.activity')),
+            ],
+        ),
+    ]
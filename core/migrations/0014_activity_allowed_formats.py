@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_similarity_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activity',
+            name='allowed_formats',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AlterField(
+            model_name='submission',
+            name='mime_type',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
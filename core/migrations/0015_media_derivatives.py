@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-17 04:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_activity_allowed_formats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('thumbnail', 'Miniatura'), ('display', 'Versão de exibição')], max_length=10)),
+                ('key', models.CharField(max_length=255)),
+                ('mime_type', models.CharField(max_length=50)),
+                ('width', models.PositiveIntegerField()),
+                ('height', models.PositiveIntegerField()),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='storedblob',
+            name='media_processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='storedblob',
+            index=models.Index(condition=models.Q(('media_processed_at__isnull', True), ('stored', True)), fields=['created_at'], name='blob_media_pending_idx'),
+        ),
+        migrations.AddField(
+            model_name='blobderivative',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='derivatives', to='core.storedblob'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='blobderivative',
+            unique_together={('blob', 'kind')},
+        ),
+    ]
@@ -1,7 +1,13 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction, IntegrityError
+from django.db.models import Case, F, OuterRef, Q, Subquery, Value, When
 # Importar os managers e bases do Django Auth
 from django.contrib.auth.models import BaseUserManager, AbstractBaseUser, PermissionsMixin
 from django.contrib.auth.hashers import make_password # Para garantir que a senha é hashed
+from django.utils import timezone
+
+from .storage import blob_key, get_storage
 
 
 # Crie seu Manager Customizado que herda de BaseUserManager
@@ -140,6 +146,8 @@ class Payment(models.Model):
     confirmed_at = models.DateTimeField(null=True, blank=True)
     expires_at = models.DateTimeField(null=True, blank=True)
     reminder_count = models.IntegerField(default=0)
+    # ID da transação na Appmax, usado pelos webhooks para localizar o pagamento local
+    appmax_transaction_id = models.CharField(max_length=100, unique=True, null=True, blank=True)
 
     class Meta:
         indexes = [
@@ -230,6 +238,63 @@ class Subscription(models.Model):
         return f'Assinatura {self.appmax_subscription_id} de {self.user.full_name} ({self.status})'
 
 
+# 4.2 - Caixa de entrada de webhooks (Appmax)
+class WebhookEvent(models.Model):
+    """
+    Evento bruto recebido de um provedor de pagamento, guardado antes de qualquer processamento.
+    A view só grava e responde 200; o comando process_webhooks drena a fila em lotes.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pendente'),
+        ('processed', 'Processado'),
+        ('failed', 'Falhou'),
+    )
+
+    provider = models.CharField(max_length=30, default='appmax')
+    event_type = models.CharField(max_length=50)
+    # Tipo do evento + transação/assinatura + status: reentregas da Appmax geram a mesma chave
+    idempotency_key = models.CharField(max_length=255, unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']), # Drenagem da fila em ordem de chegada
+        ]
+
+    def __str__(self):
+        return f'Webhook {self.provider} {self.event_type} ({self.status})'
+
+    @staticmethod
+    def build_idempotency_key(event_type, transaction_id=None, subscription_id=None, status=None):
+        return ':'.join(str(part or '') for part in (event_type, transaction_id, subscription_id, status))[:255]
+
+    @classmethod
+    def record(cls, payload, provider='appmax'):
+        """
+        Grava o evento se a chave ainda não existe. Retorna (evento ou None, criado).
+        Reentregas custam uma busca no índice único; a corrida entre duas entregas simultâneas
+        é resolvida pela própria constraint.
+        """
+        key = cls.build_idempotency_key(
+            payload.get('event'), payload.get('transaction_id'), payload.get('subscription_id'), payload.get('status')
+        )
+        if cls.objects.filter(idempotency_key=key).exists():
+            return None, False
+        try:
+            with transaction.atomic():
+                event = cls.objects.create(
+                    provider=provider, event_type=payload.get('event') or '', idempotency_key=key, payload=payload
+                )
+        except IntegrityError:
+            return None, False
+        return event, True
+
+
 # 5 - Turmas
 class ClassModel(models.Model):
     STATUS_CHOICES = (
@@ -242,10 +307,19 @@ class ClassModel(models.Model):
     name = models.CharField(max_length=100)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Contador desnormalizado de alunos ativos (removed_at nulo), mantido pelos signals de ClassStudent
+    # Reconstruir com: python manage.py rebuild_students_count
+    students_count = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def bump_students_count(cls, class_id, delta):
+        """Aplica delta no contador com UPDATE atômico (F-expression), sem ler o valor atual."""
+        if delta:
+            cls.objects.filter(pk=class_id).update(students_count=F('students_count') + delta)
+
 
 # 6 - Convites para turmas
 class Invite(models.Model):
@@ -260,6 +334,20 @@ class Invite(models.Model):
     def __str__(self):
         return self.code
 
+    @classmethod
+    def claim_use(cls, invite_id, now=None):
+        """
+        Reserva um uso do convite com um único UPDATE condicional.
+        A guarda de max_uses/expires_at roda no próprio UPDATE, então consumidores concorrentes
+        nunca ultrapassam max_uses nem perdem incrementos. Retorna True se o uso foi reservado.
+        """
+        now = now or timezone.now()
+        return cls.objects.filter(
+            Q(max_uses__isnull=True) | Q(uses_count__lt=F('max_uses')),
+            Q(expires_at__isnull=True) | Q(expires_at__gt=now),
+            pk=invite_id,
+        ).update(uses_count=F('uses_count') + 1) == 1
+
 
 # 7 - Associação turma pra aluno
 class ClassStudent(models.Model):
@@ -279,6 +367,41 @@ class ClassStudent(models.Model):
     def __str__(self):
         return f'{self.student.full_name} na turma {self.class_instance.name}'
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o estado original para os signals saberem se a matrícula mudou de ativa para removida
+        if 'removed_at' in instance.__dict__:
+            instance._was_active = instance.removed_at is None
+        return instance
+
+    @property
+    def is_active(self):
+        return self.removed_at is None
+
+    @classmethod
+    def enroll(cls, class_id, student):
+        """
+        Matricula o aluno de forma idempotente: cria a matrícula ou reativa uma removida.
+        Retorna (matricula, criada_ou_reativada); False indica que o aluno já era membro ativo.
+        Tenta o INSERT primeiro (savepoint) para não depender de uma leitura sujeita a corrida.
+        """
+        try:
+            with transaction.atomic():
+                return cls.objects.create(class_instance_id=class_id, student=student), True
+        except IntegrityError:
+            pass # Já existe linha para (turma, aluno), ativa ou removida
+
+        # UPDATE condicional: só uma requisição concorrente consegue reativar
+        reactivated = cls.objects.filter(
+            class_instance_id=class_id, student=student, removed_at__isnull=False
+        ).update(removed_at=None, removal_reason=None)
+        if reactivated:
+            # .update() não dispara o post_save
+            ClassModel.bump_students_count(class_id, 1)
+            StudentActivity.add_enrollment(class_id, student.pk)
+        return cls.objects.get(class_instance_id=class_id, student=student), bool(reactivated)
+
 
 # 8 - Atividades
 class Activity(models.Model):
@@ -295,11 +418,43 @@ class Activity(models.Model):
     due_date = models.DateTimeField(null=True, blank=True)
     notify_before_days = models.IntegerField(null=True, blank=True)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
+    # Formatos de arquivo aceitos (core/file_formats.py: 'pdf', 'docx', grupos como 'video'); vazio = qualquer um
+    allowed_formats = models.JSONField(default=list, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Mudança de max_score muda a normalização: os signals reconstroem as estatísticas
+        if 'max_score' in instance.__dict__:
+            instance._loaded_max_score = instance.max_score
+        return instance
+
+
+# 8.1 - Regras de correção automática (core/graders.py)
+class AutoGradingRule(models.Model):
+    """
+    Regra de correção automática de uma atividade. kind escolhe o corretor em core/graders.py e
+    config é o parâmetro dele (gabarito, critérios da rubrica). Com várias regras, a nota é a média
+    ponderada por weight das que se aplicam à submissão.
+    """
+    KIND_CHOICES = (
+        ('answer_key', 'Gabarito'),
+        ('rubric_keywords', 'Rubrica por palavras-chave'),
+    )
+
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='autograding_rules')
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    config = models.JSONField(default=dict)
+    weight = models.FloatField(default=1.0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.get_kind_display()} da atividade {self.activity_id}'
+
 
 # 9 - Associação atividade pra turma
 class ActivityClass(models.Model):
@@ -317,9 +472,167 @@ class ActivityClass(models.Model):
         return f'Atividade {self.activity.title} na turma {self.class_instance.name}'
 
 
+# 9.1 - Índice materializado aluno -> atividade (feed de atividades do aluno)
+class StudentActivity(models.Model):
+    """
+    Uma linha por (aluno ativo, atividade, turma pela qual a atividade chegou até ele).
+
+    Mantido pelos signals de ActivityClass e ClassStudent (core/signals.py), substitui o JOIN de
+    quatro tabelas + DISTINCT da lista de atividades do aluno por um range scan em (student, activity).
+    Guardar a turma torna inserções/remoções idempotentes: tirar a atividade de uma turma não apaga
+    o acesso que o aluno tem por outra. Reparo: rebuild_student_activity_index / check_student_activity_index.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activity_index')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='student_index')
+    class_instance = models.ForeignKey(ClassModel, on_delete=models.CASCADE, related_name='student_activity_index')
+
+    class Meta:
+        unique_together = (('student', 'activity', 'class_instance'),) # Índice (student, activity, ...) atende a lista
+        indexes = [
+            models.Index(fields=['class_instance', 'student']),
+            models.Index(fields=['activity']),
+        ]
+
+    def __str__(self):
+        return f'Atividade {self.activity_id} visível para aluno {self.student_id} (turma {self.class_instance_id})'
+
+    @classmethod
+    def activity_ids_for(cls, student_id):
+        """Subquery com os ids das atividades do aluno (para usar em id__in, sem DISTINCT)."""
+        return cls.objects.filter(student_id=student_id).values('activity_id')
+
+    @classmethod
+    def expected_rows(cls, class_ids):
+        """Linhas que deveriam existir para estas turmas: alunos ativos x atividades atribuídas."""
+        return ActivityClass.objects.filter(
+            class_instance_id__in=class_ids,
+            class_instance__class_students__removed_at__isnull=True,
+        ).values_list('class_instance__class_students__student_id', 'activity_id', 'class_instance_id')
+
+    @classmethod
+    def insert_rows(cls, rows):
+        cls.objects.bulk_create(
+            [cls(student_id=s, activity_id=a, class_instance_id=c) for s, a, c in rows],
+            batch_size=1000, ignore_conflicts=True,
+        )
+
+    @classmethod
+    def add_assignment(cls, activity_id, class_id):
+        """Atividade atribuída a uma turma: entra no feed de todos os alunos ativos dela."""
+        student_ids = ClassStudent.objects.filter(
+            class_instance_id=class_id, removed_at__isnull=True
+        ).values_list('student_id', flat=True)
+        cls.insert_rows((student_id, activity_id, class_id) for student_id in student_ids)
+
+    @classmethod
+    def remove_assignment(cls, activity_id, class_id):
+        cls.objects.filter(activity_id=activity_id, class_instance_id=class_id).delete()
+
+    @classmethod
+    def add_enrollment(cls, class_id, student_id):
+        """Aluno matriculado (ou reativado): recebe todas as atividades da turma."""
+        activity_ids = ActivityClass.objects.filter(class_instance_id=class_id).values_list('activity_id', flat=True)
+        cls.insert_rows((student_id, activity_id, class_id) for activity_id in activity_ids)
+
+    @classmethod
+    def remove_enrollment(cls, class_id, student_id):
+        cls.objects.filter(class_instance_id=class_id, student_id=student_id).delete()
+
+
+# 9.2 - Arquivos armazenados por conteúdo (SHA-256), compartilhados entre submissões
+class StoredBlob(models.Model):
+    """
+    Um arquivo único no backend de armazenamento, identificado pelo SHA-256 do conteúdo.
+    ref_count conta as Submissions que apontam para ele: conteúdo idêntico é enviado e guardado uma
+    vez só, e o objeto remoto só é apagado quando a última submissão deixa de usá-lo.
+    """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    ref_count = models.PositiveIntegerField(default=0)
+    stored = models.BooleanField(default=False) # Conteúdo já está no backend
+    # Miniaturas/versão de exibição já geradas (ou nada a gerar); core/media.py, comando process_submission_media
+    media_processed_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], condition=Q(stored=True, media_processed_at__isnull=True), name='blob_media_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.sha256[:12]} ({self.ref_count} refs)'
+
+    @property
+    def key(self):
+        return blob_key(self.sha256)
+
+    @classmethod
+    def acquire(cls, sha256, size):
+        """Soma uma referência (criando o blob se preciso). Retorna o blob; blob.stored diz se falta enviar."""
+        while True:
+            with transaction.atomic():
+                cls.objects.bulk_create([cls(sha256=sha256, size=size)], ignore_conflicts=True)
+                # 0 linhas: um release() apagou o blob entre o insert e o update; tenta de novo
+                if cls.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1):
+                    return cls.objects.get(sha256=sha256)
+
+    @classmethod
+    def release(cls, sha256):
+        """Tira uma referência; na última, apaga o blob e o objeto remoto (depois do commit)."""
+        cls.objects.filter(sha256=sha256, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+        derivative_keys = list(BlobDerivative.objects.filter(blob_id=sha256, blob__ref_count=0).values_list('key', flat=True))
+        if cls.objects.filter(sha256=sha256, ref_count=0).delete()[0]:
+            keys = [blob_key(sha256), *derivative_keys]
+
+            def delete_objects():
+                storage = get_storage()
+                for key in keys:
+                    storage.delete(key)
+            transaction.on_commit(delete_objects)
+
+    @classmethod
+    def mark_stored(cls, sha256):
+        """False se o blob foi liberado durante o envio (o chamador apaga o objeto órfão)."""
+        return bool(cls.objects.filter(sha256=sha256).update(stored=True))
+
+
+# 9.3 - Miniaturas e versões de exibição dos arquivos (cache por conteúdo; core/media.py)
+class BlobDerivative(models.Model):
+    """Arquivo derivado de um StoredBlob: submissões com o mesmo conteúdo compartilham as miniaturas."""
+    KIND_CHOICES = (
+        ('thumbnail', 'Miniatura'),
+        ('display', 'Versão de exibição'),
+    )
+
+    blob = models.ForeignKey(StoredBlob, on_delete=models.CASCADE, related_name='derivatives')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    key = models.CharField(max_length=255) # Chave no backend de armazenamento
+    mime_type = models.CharField(max_length=50)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('blob', 'kind'),)
+
+    def __str__(self):
+        return f'{self.get_kind_display()} de {self.blob_id[:12]}'
+
+    @classmethod
+    def annotate_keys(cls, submissions):
+        """thumbnail_key/display_key em cada Submission (subquery pela chave única), sem prefetch."""
+        return submissions.annotate(**{
+            f'{kind}_key': Subquery(cls.objects.filter(blob_id=OuterRef('blob_id'), kind=kind).values('key')[:1])
+            for kind, _ in cls.KIND_CHOICES
+        })
+
+
 # 10 - Submissões de atividades
 class Submission(models.Model):
     STATUS_CHOICES = (
+        ('uploading', 'Enviando Arquivo'),
+        ('upload_failed', 'Falha no Envio'),
         ('pending', 'Pendente'),
         ('late', 'Atrasada'),
         ('invalid_format', 'Formato Inválido'),
@@ -328,20 +641,188 @@ class Submission(models.Model):
     activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='submissions')
     student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submissions')
     file_path = models.CharField(max_length=255, blank=True, null=True)
-    mime_type = models.CharField(max_length=50, blank=True, null=True)
+    # Conteúdo do arquivo (file_path == blob.key); nulo em submissões antigas ou sem arquivo
+    blob = models.ForeignKey(StoredBlob, on_delete=models.PROTECT, null=True, blank=True, related_name='submissions')
+    mime_type = models.CharField(max_length=100, blank=True, null=True) # MIME detectado pelo conteúdo (OOXML passa de 70)
     submitted_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(max_length=15, choices=STATUS_CHOICES)
+    # Última submissão do aluno na atividade (maior id); mantido pelos signals em core/signals.py.
+    # Tentativas recusadas ('invalid_format', sem arquivo) nunca são a última: não substituem a entrega válida
+    is_latest = models.BooleanField(default=True)
+    # Correção automática já aplicada (core/autograde.py); volta a nulo quando o arquivo é trocado
+    autograded_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
-            models.Index(fields=['activity']),
+            # Cobre também as buscas só por activity (prefixo)
+            models.Index(fields=['activity', 'student', 'submitted_at'], name='submission_act_student_idx'),
             models.Index(fields=['student']),
             models.Index(fields=['status']),
+            # Lista de revisão e fila de correção: só as últimas submissões, um index scan por atividade
+            models.Index(fields=['activity', 'submitted_at'], condition=Q(is_latest=True), name='submission_latest_idx'),
+            models.Index(fields=['activity', 'status', 'submitted_at'], condition=Q(is_latest=True), name='submission_latest_status_idx'),
         ]
 
     def __str__(self):
         return f'Submissão de {self.student.full_name} para {self.activity.title}'
 
+    @classmethod
+    def demote_older(cls, activity_id, student_id, latest_id):
+        """Nova submissão: as anteriores do aluno deixam de ser a última (id__lt é seguro a inserts concorrentes)."""
+        cls.objects.filter(
+            activity_id=activity_id, student_id=student_id, is_latest=True, id__lt=latest_id
+        ).update(is_latest=False)
+
+    @classmethod
+    def promote_latest(cls, activity_id, student_id):
+        """A última submissão foi apagada: a anterior volta a ser a última."""
+        latest_id = (
+            cls.objects.filter(activity_id=activity_id, student_id=student_id).exclude(status='invalid_format')
+            .order_by('-id').values_list('id', flat=True).first()
+        )
+        if latest_id is not None:
+            cls.objects.filter(id=latest_id, is_latest=False).update(is_latest=True)
+
+
+# 10.1 - Uploads em partes (retomáveis) das submissões
+class UploadSession(models.Model):
+    """
+    Upload retomável: init -> PUT das partes a partir de received_bytes -> complete.
+    As partes vão direto para o backend de armazenamento (core/storage.py); received_bytes só avança
+    com UPDATE condicional no offset esperado, então uma parte repetida ou fora de ordem é recusada
+    e o cliente retoma do último byte confirmado em vez de reenviar o arquivo inteiro.
+    """
+    STATUS_CHOICES = (
+        ('open', 'Aberto'),
+        ('completed', 'Concluído'),
+        ('aborted', 'Cancelado'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100, blank=True)
+    total_size = models.BigIntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    submission = models.OneToOneField(Submission, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    # Reserva de escrita: só uma requisição por vez grava no arquivo parcial (expira se o worker morrer)
+    writer_token = models.UUIDField(null=True, blank=True)
+    writer_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    WRITE_LEASE = timezone.timedelta(minutes=10)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['student', 'status']),
+            models.Index(fields=['status', 'updated_at']), # Limpeza de uploads abandonados (comando cleanup_uploads)
+        ]
+
+    def __str__(self):
+        return f'Upload {self.id} ({self.received_bytes}/{self.total_size})'
+
+    def claim_write(self, offset):
+        """
+        Reserva a gravação da parte em offset com um UPDATE condicional. Retorna o token ou None se o
+        offset mudou ou outra requisição está gravando: duas partes nunca escrevem juntas no arquivo.
+        """
+        token = uuid.uuid4()
+        now = timezone.now()
+        claimed = UploadSession.objects.filter(
+            Q(writer_token__isnull=True) | Q(writer_until__lt=now),
+            id=self.id, status='open', received_bytes=offset,
+        ).update(writer_token=token, writer_until=now + self.WRITE_LEASE)
+        return token if claimed else None
+
+    def release_write(self, token):
+        UploadSession.objects.filter(id=self.id, writer_token=token).update(writer_token=None, writer_until=None)
+
+    def advance(self, offset, written, token=None):
+        """Confirma a parte gravada em offset (e solta a reserva). False se outra requisição já avançou o upload."""
+        queryset = UploadSession.objects.filter(id=self.id, status='open', received_bytes=offset)
+        if token is not None:
+            queryset = queryset.filter(writer_token=token)
+        updated = queryset.update(
+            received_bytes=offset + written, updated_at=timezone.now(), writer_token=None, writer_until=None
+        )
+        if updated:
+            self.received_bytes = offset + written
+        return bool(updated)
+
+    @classmethod
+    def expire_abandoned(cls, before, batch_size=500):
+        """Cancela uploads 'open' parados desde before. Retorna os ids cancelados (para apagar os .part)."""
+        ids = list(
+            cls.objects.filter(status='open', updated_at__lt=before)
+            .order_by('updated_at').values_list('id', flat=True)[:batch_size]
+        )
+        # Condicional: um upload que recebeu parte entre a busca e o UPDATE continua aberto
+        cls.objects.filter(id__in=ids, status='open', updated_at__lt=before).update(status='aborted')
+        return list(cls.objects.filter(id__in=ids, status='aborted').values_list('id', flat=True))
+
+
+# 10.2 - Índice de similaridade (MinHash/LSH) para detectar cópias (core/similarity.py)
+class SubmissionSignature(models.Model):
+    """
+    Assinatura MinHash do texto da submissão (NUM_PERM uint32 em bytes). shingle_count=0 marca
+    submissão já analisada sem texto aproveitável (PDF, vídeo, vazia), que sai da fila do indexador.
+    """
+    submission = models.OneToOneField(Submission, on_delete=models.CASCADE, primary_key=True, related_name='signature')
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='submission_signatures')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='submission_signatures')
+    signature = models.BinaryField(null=True)
+    shingle_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['activity', 'student'])]
+
+    def __str__(self):
+        return f'Assinatura da submissão {self.submission_id}'
+
+    @classmethod
+    def drop(cls, submission_ids):
+        """Tira as submissões do índice (assinatura, buckets e pares): reindexadas pelo index_similarity."""
+        submission_ids = list(submission_ids)
+        if not submission_ids:
+            return
+        SubmissionLSHBucket.objects.filter(submission_id__in=submission_ids).delete()
+        SimilarityPair.objects.filter(Q(submission_a_id__in=submission_ids) | Q(submission_b_id__in=submission_ids)).delete()
+        cls.objects.filter(submission_id__in=submission_ids).delete()
+
+
+class SubmissionLSHBucket(models.Model):
+    """Uma linha por (submissão, banda): submissões com o mesmo bucket_hash numa banda são candidatas."""
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='lsh_buckets')
+    submission = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='lsh_buckets')
+    band = models.PositiveSmallIntegerField()
+    bucket_hash = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['activity', 'band', 'bucket_hash'])]
+
+    def __str__(self):
+        return f'Banda {self.band} da submissão {self.submission_id}'
+
+
+class SimilarityPair(models.Model):
+    """Par de submissões (de alunos diferentes) com similaridade estimada acima do limite."""
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='similarity_pairs')
+    submission_a = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+    submission_b = models.ForeignKey(Submission, on_delete=models.CASCADE, related_name='+')
+    similarity = models.FloatField() # Jaccard estimado pelas assinaturas
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = (('submission_a', 'submission_b'),) # submission_a_id < submission_b_id
+        indexes = [models.Index(fields=['activity', 'similarity'])]
+
+    def __str__(self):
+        return f'{self.submission_a_id} ~ {self.submission_b_id} ({self.similarity:.2f})'
+
 
 # 11 - Feedbacks
 class Feedback(models.Model):
@@ -359,4 +840,264 @@ class Feedback(models.Model):
         ]
 
     def __str__(self):
-        return f'Feedback para submissão {self.submission.id} por {self.professor.full_name}'
\ No newline at end of file
+        return f'Feedback para submissão {self.submission.id} por {self.professor.full_name}'
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Nota original: os signals tiram a antiga e somam a nova nas estatísticas da atividade
+        if 'score' in instance.__dict__:
+            instance._loaded_score = instance.score
+        return instance
+
+
+# 11.1 - Estatísticas incrementais das notas por atividade
+class ActivityScoreStats(models.Model):
+    """
+    Agregados corridos das notas (Feedback.score) de uma atividade, atualizados com F() a cada
+    escrita de Feedback (signals em core/signals.py). Conta uma nota por aluno, a mesma do boletim:
+    a do Feedback com nota mais recente da última submissão dele (is_latest); regrade e reenvio
+    substituem a nota em vez de somar outra. As notas são normalizadas por max_score (ou
+    SCORE_SCALE quando a atividade não define) antes de entrar no histograma.
+    version muda a cada escrita e serve de chave para o cache dos percentis exatos.
+    """
+    SCORE_SCALE = 10 # Escala padrão (0 a 10) quando max_score é nulo
+    BUCKETS = 10
+
+    activity = models.OneToOneField(Activity, on_delete=models.CASCADE, primary_key=True, related_name='score_stats')
+    count = models.PositiveIntegerField(default=0)
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    version = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'Estatísticas da atividade {self.activity_id} ({self.count} notas)'
+
+    @classmethod
+    def scale_for(cls, max_score):
+        return float(max_score) if max_score else float(cls.SCORE_SCALE)
+
+    @classmethod
+    def bucket_for(cls, score, scale):
+        normalized = float(score) / scale
+        return min(max(int(normalized * cls.BUCKETS), 0), cls.BUCKETS - 1)
+
+    @classmethod
+    def scores(cls, activity_id):
+        """Notas que contam na atividade (uma por aluno), na ordem dos Feedbacks."""
+        latest = {}
+        for submission_id, score in (
+            Feedback.objects.filter(submission__activity_id=activity_id, submission__is_latest=True, score__isnull=False)
+            .order_by('id').values_list('submission_id', 'score')
+        ):
+            latest[submission_id] = float(score)
+        return list(latest.values())
+
+    @classmethod
+    def _current_scores(cls, submission_ids):
+        """{submission_id: (activity_id, nota que conta ou None)} das submissões que são a última do aluno."""
+        current = {
+            sid: (activity_id, None) for sid, activity_id in
+            Submission.objects.filter(id__in=submission_ids, is_latest=True).values_list('id', 'activity_id')
+        }
+        for sid, score in (
+            Feedback.objects.filter(submission_id__in=list(current), score__isnull=False)
+            .order_by('id').values_list('submission_id', 'score')
+        ):
+            current[sid] = (current[sid][0], score)
+        return current
+
+    @classmethod
+    def apply_feedback(cls, submission_id, feedback_id, old_score=None, new_score=None):
+        """
+        Um Feedback mudou de nota (ou foi criado/apagado, com a outra ponta None). Só muda a estatística
+        se ele é, antes ou depois, o Feedback com nota mais recente da última submissão do aluno.
+        """
+        row = Submission.objects.filter(id=submission_id, is_latest=True).values_list('activity_id', flat=True).first()
+        if row is None:
+            return
+        other = (
+            Feedback.objects.filter(submission_id=submission_id, score__isnull=False).exclude(pk=feedback_id)
+            .order_by('-id').values_list('id', 'score').first()
+        )
+
+        def counted(score):
+            candidates = [c for c in (other, (feedback_id, score)) if c is not None and c[1] is not None]
+            return max(candidates)[1] if candidates else None
+
+        before, after = counted(old_score), counted(new_score)
+        if before != after:
+            cls.apply(row, before, after)
+
+    @classmethod
+    def apply_new_feedbacks(cls, items):
+        """
+        Feedbacks [(submission_id, nota)] prestes a ser criados em lote (bulk_create não dispara signals).
+        Chamar na transação do bulk_create, antes dele: a última nota de cada submissão substitui a que contava.
+        """
+        current = cls._current_scores({submission_id for submission_id, _ in items})
+        after = {sid: score for sid, (_, score) in current.items()}
+        for submission_id, score in items:
+            if submission_id in after and score is not None:
+                after[submission_id] = score
+        changes = {}
+        for sid, (activity_id, before) in current.items():
+            if before != after[sid]:
+                removed, added = changes.setdefault(activity_id, ([], []))
+                removed.append(before)
+                added.append(after[sid])
+        for activity_id, (removed, added) in changes.items():
+            cls.apply_batch(activity_id, removed=removed, added=added)
+
+    @classmethod
+    def apply_superseded(cls, activity_id, student_id, latest_id):
+        """Nova submissão do aluno: a nota da anterior deixa de contar (chamar antes de Submission.demote_older)."""
+        older = Submission.objects.filter(
+            activity_id=activity_id, student_id=student_id, is_latest=True, id__lt=latest_id
+        ).values_list('id', flat=True)
+        removed = [score for _, score in cls._current_scores(list(older)).values()]
+        cls.apply_batch(activity_id, removed=removed)
+
+    @classmethod
+    def apply(cls, activity_id, old_score=None, new_score=None):
+        """Tira a nota antiga e soma a nova (qualquer uma pode ser None)."""
+        cls.apply_batch(activity_id, removed=[old_score], added=[new_score])
+
+    @classmethod
+    def apply_batch(cls, activity_id, removed=(), added=()):
+        """Várias notas de uma vez (ex: correção em lote com bulk_create, que não dispara signals)."""
+        changes = [(float(score), -1) for score in removed if score is not None]
+        changes += [(float(score), 1) for score in added if score is not None]
+        if activity_id is None or not changes:
+            return
+        with transaction.atomic():
+            updated = cls.objects.filter(activity_id=activity_id).update(
+                count=F('count') + sum(sign for _, sign in changes),
+                score_sum=F('score_sum') + sum(sign * value for value, sign in changes),
+                score_sq_sum=F('score_sq_sum') + sum(sign * value * value for value, sign in changes),
+                version=F('version') + 1, updated_at=timezone.now(),
+            )
+            if not updated:
+                # Ainda sem agregados: monta tudo depois do commit desta escrita, que o rebuild já enxerga.
+                # (Pular a nota aqui a perderia se um rebuild concorrente já tivesse lido os Feedbacks.)
+                transaction.on_commit(lambda: cls.rebuild(activity_id))
+                return
+
+            scale = cls.scale_for(Activity.objects.filter(id=activity_id).values_list('max_score', flat=True).first())
+            buckets = {}
+            for value, sign in changes:
+                bucket = cls.bucket_for(value, scale)
+                buckets[bucket] = buckets.get(bucket, 0) + sign
+            buckets = {bucket: delta for bucket, delta in buckets.items() if delta}
+            if buckets:
+                # Um UPDATE só para todas as faixas tocadas
+                ActivityScoreBucket.objects.filter(activity_id=activity_id, bucket__in=buckets).update(
+                    count=F('count') + Case(*[When(bucket=b, then=Value(d)) for b, d in buckets.items()], default=Value(0))
+                )
+
+    @classmethod
+    def rebuild(cls, activity_id):
+        """Recalcula tudo a partir dos Feedbacks (primeiro uso ou mudança de max_score)."""
+        with transaction.atomic():
+            if not Activity.objects.filter(pk=activity_id).exists():
+                return # Atividade apagada (ex: cascata) antes deste rebuild rodar no on_commit
+            # Linha criada e travada antes de ler as notas: apply_batch concorrente espera este commit
+            # (no SQLite a transação IMMEDIATE já serializa contra os escritores)
+            cls.objects.get_or_create(activity_id=activity_id)
+            cls.objects.select_for_update().filter(activity_id=activity_id).exists()
+            max_score = Activity.objects.filter(id=activity_id).values_list('max_score', flat=True).first()
+            scale = cls.scale_for(max_score)
+            scores = cls.scores(activity_id)
+            histogram = [0] * cls.BUCKETS
+            for score in scores:
+                histogram[cls.bucket_for(score, scale)] += 1
+
+            cls.objects.filter(activity_id=activity_id).update(
+                count=len(scores), score_sum=sum(scores), score_sq_sum=sum(s * s for s in scores),
+                version=F('version') + 1, updated_at=timezone.now(),
+            )
+            ActivityScoreBucket.objects.filter(activity_id=activity_id).delete()
+            ActivityScoreBucket.objects.bulk_create([
+                ActivityScoreBucket(activity_id=activity_id, bucket=i, count=c) for i, c in enumerate(histogram)
+            ])
+
+
+class ActivityScoreBucket(models.Model):
+    """Histograma das notas normalizadas: ActivityScoreStats.BUCKETS faixas iguais em [0, 1]."""
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='score_buckets')
+    bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = (('activity', 'bucket'),)
+
+    def __str__(self):
+        return f'Faixa {self.bucket} da atividade {self.activity_id}: {self.count}'
+
+
+# 12 - Lembretes de prazo (Activity.notify_before_days)
+class ActivityReminder(models.Model):
+    """
+    Índice temporal persistido dos lembretes: uma linha por (atividade, instante de disparo).
+    O worker run_reminders consome em ordem de fire_at pelo índice (status, fire_at) e guarda em
+    last_student_id até onde já notificou, então um restart continua do ponto em que parou.
+    """
+    STATUS_CHOICES = (
+        ('scheduled', 'Agendado'),
+        ('firing', 'Disparando'),
+        ('fired', 'Disparado'),
+        ('cancelled', 'Cancelado'),
+    )
+
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='reminders')
+    fire_at = models.DateTimeField()
+    due_date = models.DateTimeField() # Prazo usado no cálculo, para a mensagem
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='scheduled')
+    last_student_id = models.BigIntegerField(default=0) # Cursor do fan-out (keyset em student_id)
+    created_at = models.DateTimeField(auto_now_add=True)
+    fired_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['activity', 'fire_at'], name='unique_activity_reminder'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'fire_at']),
+        ]
+
+    def __str__(self):
+        return f'Lembrete da atividade {self.activity_id} em {self.fire_at} ({self.status})'
+
+    @staticmethod
+    def fire_at_for(due_date, notify_before_days):
+        if due_date is None or notify_before_days is None or notify_before_days < 0:
+            return None
+        return due_date - timezone.timedelta(days=notify_before_days)
+
+
+# 13 - Notificações para o usuário
+class Notification(models.Model):
+    KIND_CHOICES = (
+        ('due_reminder', 'Lembrete de prazo'),
+    )
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, null=True, blank=True, related_name='notifications')
+    reminder = models.ForeignKey(ActivityReminder, on_delete=models.SET_NULL, null=True, blank=True, related_name='notifications')
+    message = models.CharField(max_length=255)
+    created_at = models.DateTimeField(auto_now_add=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Garante no BD que um lembrete nunca gera duas notificações para o mesmo aluno
+            models.UniqueConstraint(fields=['reminder', 'user'], name='unique_reminder_notification'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f'Notificação {self.kind} para {self.user_id}'
@@ -0,0 +1,147 @@
+# reminders.py
+"""
+Agendador de lembretes de prazo (Activity.due_date - notify_before_days).
+
+sync_reminders() calcula em lote os instantes de disparo e mantém a tabela ActivityReminder, que
+funciona como um heap persistido: o worker só lê as linhas vencidas pelo índice (status, fire_at).
+fire_due_reminders() faz o fan-out para os alunos em blocos de student_id (keyset sobre o índice
+StudentActivity), com bulk_create das notificações. O cursor last_student_id e a constraint única
+(reminder, user) em Notification tornam o disparo seguro a restarts: nada é notificado duas vezes.
+"""
+import logging
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Activity, ActivityReminder, Notification, StudentActivity
+
+logger = logging.getLogger(__name__)
+
+SYNC_CHUNK_SIZE = 1000
+FANOUT_CHUNK_SIZE = 2000
+
+
+def _reactivate(activity_id, fire_at, due_date):
+    """
+    Volta a agendar o lembrete cancelado do mesmo instante (atividade reaberta, prazo desfeito): a linha
+    cancelada ainda ocupa a chave única (activity, fire_at). Retorna quantas linhas reativou (0 ou 1).
+    """
+    return ActivityReminder.objects.filter(activity_id=activity_id, fire_at=fire_at, status='cancelled').update(
+        status='scheduled', due_date=due_date, last_student_id=0
+    )
+
+
+def schedule_for(activity_id, fire_at, due_date):
+    """Mantém um único lembrete agendado por atividade; cancela os de prazos anteriores."""
+    pending = ActivityReminder.objects.filter(activity_id=activity_id, status='scheduled')
+    if fire_at is None:
+        pending.update(status='cancelled')
+        return
+    pending.exclude(fire_at=fire_at).update(status='cancelled')
+    if not _reactivate(activity_id, fire_at, due_date):
+        ActivityReminder.objects.bulk_create(
+            [ActivityReminder(activity_id=activity_id, fire_at=fire_at, due_date=due_date)], ignore_conflicts=True
+        )
+
+
+def sync_reminders(now=None, chunk_size=SYNC_CHUNK_SIZE):
+    """Recalcula em lote os lembretes de todas as atividades abertas com prazo futuro. Retorna quantos agendou."""
+    now = now or timezone.now()
+    scheduled = 0
+    last_id = 0
+    while True:
+        rows = list(
+            Activity.objects.filter(
+                id__gt=last_id, status='open', due_date__gt=now, notify_before_days__isnull=False
+            ).order_by('id').values_list('id', 'due_date', 'notify_before_days')[:chunk_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        wanted = {}
+        for activity_id, due_date, days in rows:
+            fire_at = ActivityReminder.fire_at_for(due_date, days)
+            if fire_at is not None:
+                wanted[activity_id] = (fire_at, due_date)
+
+        # Leitura e escritas do bloco na mesma transação: as linhas vistas aqui são as que existem no INSERT
+        with transaction.atomic():
+            existing = {
+                (a, f): status for a, f, status in
+                ActivityReminder.objects.filter(activity_id__in=[r[0] for r in rows])
+                .values_list('activity_id', 'fire_at', 'status')
+            }
+            # Lembretes agendados cujo instante não bate mais com o prazo/antecedência atuais
+            stale = [(a, f) for (a, f), status in existing.items() if status == 'scheduled' and wanted.get(a, (None,))[0] != f]
+            for activity_id, fire_at in stale:
+                ActivityReminder.objects.filter(
+                    activity_id=activity_id, fire_at=fire_at, status='scheduled'
+                ).update(status='cancelled')
+
+            new = []
+            for activity_id, (fire_at, due_date) in wanted.items():
+                status = existing.get((activity_id, fire_at))
+                if status == 'cancelled':
+                    scheduled += _reactivate(activity_id, fire_at, due_date)
+                elif status is None:
+                    new.append(ActivityReminder(activity_id=activity_id, fire_at=fire_at, due_date=due_date))
+            ActivityReminder.objects.bulk_create(new)
+            scheduled += len(new)
+    return scheduled
+
+
+def fire_due_reminders(now=None, limit=50, chunk_size=FANOUT_CHUNK_SIZE):
+    """Dispara os lembretes vencidos (inclusive os interrompidos em 'firing'). Retorna (lembretes, notificações)."""
+    now = now or timezone.now()
+    due = list(
+        ActivityReminder.objects.filter(status__in=['scheduled', 'firing'], fire_at__lte=now)
+        .select_related('activity').order_by('fire_at', 'id')[:limit]
+    )
+    fired = notified = 0
+    for reminder in due:
+        # Claim condicional: se outro worker pegou antes, pula
+        if reminder.status == 'scheduled':
+            if not ActivityReminder.objects.filter(id=reminder.id, status='scheduled').update(status='firing'):
+                continue
+        notified += _fan_out(reminder, now, chunk_size)
+        fired += 1
+    return fired, notified
+
+
+def _fan_out(reminder, now, chunk_size):
+    activity = reminder.activity
+    if activity.status != 'open' or activity.due_date != reminder.due_date:
+        # Atividade fechada ou prazo alterado depois do agendamento
+        ActivityReminder.objects.filter(id=reminder.id).update(status='cancelled')
+        return 0
+
+    due_local = timezone.localtime(reminder.due_date)
+    message = f"Lembrete: a atividade '{activity.title}' vence em {due_local:%d/%m/%Y %H:%M}."[:255]
+
+    cursor = reminder.last_student_id
+    sent = 0
+    while True:
+        # Alunos ativos de todas as turmas da atividade, pelo índice materializado (sem carregar todos)
+        student_ids = list(
+            StudentActivity.objects.filter(activity_id=activity.id, student_id__gt=cursor)
+            .order_by('student_id').values_list('student_id', flat=True).distinct()[:chunk_size]
+        )
+        if not student_ids:
+            break
+        cursor = student_ids[-1]
+        with transaction.atomic():
+            Notification.objects.bulk_create(
+                [
+                    Notification(user_id=s, kind='due_reminder', activity_id=activity.id, reminder_id=reminder.id, message=message)
+                    for s in student_ids
+                ],
+                batch_size=1000, ignore_conflicts=True,
+            )
+            # Cursor gravado na mesma transação das notificações do bloco
+            ActivityReminder.objects.filter(id=reminder.id).update(last_student_id=cursor)
+        sent += len(student_ids)
+
+    ActivityReminder.objects.filter(id=reminder.id).update(status='fired', fired_at=now)
+    logger.info(f"Lembrete {reminder.id} da atividade {activity.id}: {sent} alunos notificados.")
+    return sent
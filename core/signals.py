@@ -0,0 +1,191 @@
+# signals.py
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .invite_cache import invite_cache
+from . import reminders
+from .models import (
+    Activity, ActivityClass, ActivityReminder, ActivityScoreStats, ClassModel, ClassStudent, Feedback, Invite,
+    StoredBlob, StudentActivity, Submission
+)
+
+
+# -----------------------------
+# CONTADOR DE ALUNOS ATIVOS (ClassModel.students_count)
+# -----------------------------
+
+@receiver(post_save, sender=ClassStudent)
+def class_student_saved(sender, instance, created, raw=False, **kwargs):
+    """Atualiza o contador quando uma matrícula é criada, removida (removed_at) ou reativada."""
+    if raw:
+        return # loaddata: contadores são reconstruídos pelo comando rebuild_students_count
+
+    is_active = instance.removed_at is None
+    if created:
+        was_active = False
+    else:
+        was_active = getattr(instance, '_was_active', None)
+        if was_active is None:
+            # Instância construída manualmente (não veio do BD): não sabemos o estado anterior
+            was_active = is_active
+
+    ClassModel.bump_students_count(instance.class_instance_id, int(is_active) - int(was_active))
+    instance._was_active = is_active
+
+    # Feed de atividades do aluno: só mexe no índice quando o estado muda
+    if is_active and not was_active:
+        StudentActivity.add_enrollment(instance.class_instance_id, instance.student_id)
+    elif was_active and not is_active:
+        StudentActivity.remove_enrollment(instance.class_instance_id, instance.student_id)
+
+
+@receiver(post_delete, sender=ClassStudent)
+def class_student_deleted(sender, instance, **kwargs):
+    """Decrementa o contador quando uma matrícula ativa é apagada (inclusive em cascata)."""
+    if instance.removed_at is None:
+        ClassModel.bump_students_count(instance.class_instance_id, -1)
+        StudentActivity.remove_enrollment(instance.class_instance_id, instance.student_id)
+
+
+# -----------------------------
+# ÍNDICE ALUNO -> ATIVIDADE (StudentActivity)
+# -----------------------------
+
+@receiver(post_save, sender=ActivityClass)
+def activity_class_saved(sender, instance, created, raw=False, **kwargs):
+    """Atividade atribuída a uma turma entra no feed dos alunos ativos."""
+    if raw or not created:
+        return # loaddata: índice reconstruído pelo comando rebuild_student_activity_index
+    StudentActivity.add_assignment(instance.activity_id, instance.class_instance_id)
+
+
+@receiver(post_delete, sender=ActivityClass)
+def activity_class_deleted(sender, instance, **kwargs):
+    StudentActivity.remove_assignment(instance.activity_id, instance.class_instance_id)
+
+
+# -----------------------------
+# CACHE DE CÓDIGOS DE CONVITE
+# -----------------------------
+
+@receiver(post_save, sender=Invite)
+@receiver(post_delete, sender=Invite)
+def invite_changed(sender, instance, **kwargs):
+    """Qualquer escrita no convite (inclusive criação, que pode ter caído no cache negativo) invalida o código."""
+    invite_cache.invalidate(instance.code)
+    # De novo após o commit: uma leitura concorrente pode ter recolocado o estado antigo no cache
+    transaction.on_commit(lambda: invite_cache.invalidate(instance.code))
+
+
+# -----------------------------
+# LEMBRETES DE PRAZO (ActivityReminder)
+# -----------------------------
+
+@receiver(post_save, sender=Activity)
+def activity_saved(sender, instance, raw=False, **kwargs):
+    """Reagenda o lembrete quando prazo, antecedência ou status mudam (o worker também sincroniza em lote)."""
+    if raw:
+        return
+    fire_at = None
+    if instance.status == 'open' and instance.due_date and instance.due_date > timezone.now():
+        fire_at = ActivityReminder.fire_at_for(instance.due_date, instance.notify_before_days)
+    reminders.schedule_for(instance.pk, fire_at, instance.due_date)
+
+
+# -----------------------------
+# ESTATÍSTICAS DAS NOTAS (ActivityScoreStats)
+# -----------------------------
+
+def _activity_of(submission_id):
+    return Submission.objects.filter(id=submission_id).values_list('activity_id', flat=True).first()
+
+
+@receiver(post_save, sender=Feedback)
+def feedback_saved(sender, instance, created, raw=False, **kwargs):
+    """Aplica a diferença entre a nota anterior e a nova nos agregados da atividade."""
+    if raw:
+        return
+    new_score = instance.score
+    if created:
+        old_score = None
+    elif hasattr(instance, '_loaded_score'):
+        old_score = instance._loaded_score
+    else:
+        # Instância construída manualmente: nota anterior desconhecida, recalcula do zero
+        instance._loaded_score = new_score
+        activity_id = _activity_of(instance.submission_id)
+        if ActivityScoreStats.objects.filter(activity_id=activity_id).exists():
+            ActivityScoreStats.rebuild(activity_id)
+        return
+
+    instance._loaded_score = new_score
+    if old_score != new_score:
+        ActivityScoreStats.apply_feedback(instance.submission_id, instance.pk, old_score, new_score)
+
+
+def _rebuild_tracked_stats(activity_id):
+    if ActivityScoreStats.objects.filter(activity_id=activity_id).exists():
+        ActivityScoreStats.rebuild(activity_id)
+
+
+def _schedule_stats_rebuild(origin, activity_id):
+    """Um rebuild por atividade e por deleção, depois do commit (não faz nada se a atividade foi apagada)."""
+    scheduled = origin.__dict__.setdefault('_stats_rebuilds', set()) if origin is not None else set()
+    if activity_id is not None and activity_id not in scheduled:
+        scheduled.add(activity_id)
+        transaction.on_commit(lambda: _rebuild_tracked_stats(activity_id))
+
+
+@receiver(post_delete, sender=Feedback)
+def feedback_deleted(sender, instance, origin=None, **kwargs):
+    if instance.score is None:
+        return
+    if origin is None or getattr(origin, 'model', type(origin)) is Feedback:
+        ActivityScoreStats.apply_feedback(instance.submission_id, instance.pk, old_score=instance.score)
+        return
+    # Cascata (submissão, atividade, usuário): nada de F() por linha
+    _schedule_stats_rebuild(origin, _activity_of(instance.submission_id))
+
+
+@receiver(post_save, sender=Activity)
+def activity_max_score_changed(sender, instance, created, raw=False, **kwargs):
+    """max_score muda a normalização do histograma: reconstrói se já havia agregados."""
+    loaded = getattr(instance, '_loaded_max_score', instance.max_score)
+    instance._loaded_max_score = instance.max_score
+    if raw or created or loaded == instance.max_score:
+        return
+    if ActivityScoreStats.objects.filter(activity_id=instance.pk).exists():
+        ActivityScoreStats.rebuild(instance.pk)
+
+
+# -----------------------------
+# ARQUIVOS POR CONTEÚDO (StoredBlob.ref_count)
+# -----------------------------
+
+@receiver(post_delete, sender=Submission)
+def submission_deleted(sender, instance, **kwargs):
+    """Solta a referência ao blob; o objeto remoto só é apagado quando ninguém mais o usa."""
+    if instance.blob_id:
+        StoredBlob.release(instance.blob_id)
+
+
+# -----------------------------
+# ÚLTIMA SUBMISSÃO POR ALUNO (Submission.is_latest)
+# -----------------------------
+
+@receiver(post_save, sender=Submission)
+def submission_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.is_latest:
+        # A nota da submissão anterior sai das estatísticas, como sai do boletim
+        ActivityScoreStats.apply_superseded(instance.activity_id, instance.student_id, instance.id)
+        Submission.demote_older(instance.activity_id, instance.student_id, instance.id)
+
+
+@receiver(post_delete, sender=Submission)
+def submission_latest_deleted(sender, instance, origin=None, **kwargs):
+    if instance.is_latest:
+        Submission.promote_latest(instance.activity_id, instance.student_id)
+        # A nota da submissão promovida volta a contar
+        _schedule_stats_rebuild(origin, instance.activity_id)
@@ -0,0 +1,163 @@
+# similarity.py
+"""
+Detecção de cópias entre submissões de uma atividade (MinHash + LSH).
+
+Cada submissão de texto vira um conjunto de shingles (SHINGLE_SIZE palavras normalizadas, com hash
+polinomial calculado em NumPy sobre o vetor de palavras) e uma assinatura MinHash de NUM_PERM
+valores, calculada de forma vetorizada (NUM_PERM funções hash x shingles por bloco). A assinatura
+é dividida em BANDS bandas de ROWS valores; o hash de cada banda vai para SubmissionLSHBucket.
+
+O indexador (comando index_similarity) processa só as submissões novas: busca as que caem no mesmo
+bucket em alguma banda (índice (activity, band, bucket_hash)), estima o Jaccard pelas assinaturas e
+grava os pares acima de SIMILARITY_THRESHOLD em SimilarityPair. Custo por submissão proporcional
+aos candidatos, não ao tamanho da turma: a atividade nunca é reprocessada inteira.
+"""
+import logging
+import zlib
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+
+from .graders import normalize_words
+from .models import SimilarityPair, Submission, SubmissionLSHBucket, SubmissionSignature
+from .storage import read_text
+
+logger = logging.getLogger(__name__)
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS # Limiar do LSH ~ (1/BANDS) ** (1/ROWS) = 0.42; o corte fino é SIMILARITY_THRESHOLD
+SHINGLE_SIZE = 5
+HASH_BLOCK = 2048 # Shingles por bloco no cálculo do MinHash (NUM_PERM x HASH_BLOCK uint64 = 2 MB)
+SIMILARITY_THRESHOLD = getattr(settings, 'SIMILARITY_THRESHOLD', 0.5)
+MAX_CONTENT_BYTES = getattr(settings, 'SIMILARITY_MAX_CONTENT_BYTES', 2 * 1024 * 1024)
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+# Funções hash multiply-shift fixas (sementes constantes: assinaturas comparáveis entre execuções)
+_rng = np.random.default_rng(20240917)
+_A = _rng.integers(1, 2 ** 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=NUM_PERM, dtype=np.uint64)
+
+
+def shingle_hashes(text):
+    """Hashes uint64 únicos dos shingles de SHINGLE_SIZE palavras do texto."""
+    words = normalize_words(text).split()
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(w.encode()) for w in words), dtype=np.uint64, count=len(words))
+    size = min(SHINGLE_SIZE, len(words))
+    count = len(words) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        # Hash polinomial da janela, todas as janelas de uma vez (overflow de uint64 é o módulo 2^64)
+        hashes = hashes * _MIX + word_hashes[offset:offset + count]
+    return np.unique(hashes)
+
+
+def minhash(shingles):
+    """Assinatura MinHash (NUM_PERM uint32) de um vetor de hashes de shingles."""
+    signature = np.full(NUM_PERM, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(shingles), HASH_BLOCK):
+        block = shingles[start:start + HASH_BLOCK]
+        values = (_A[:, None] * block[None, :] + _B[:, None]) >> np.uint64(32)
+        np.minimum(signature, values.min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def band_hashes(signature):
+    """Hash int64 (cabe no BigIntegerField) de cada uma das BANDS bandas."""
+    rows = signature.reshape(BANDS, ROWS).astype(np.uint64)
+    hashes = np.zeros(BANDS, dtype=np.uint64)
+    for column in range(ROWS):
+        hashes = hashes * _MIX + rows[:, column]
+    return hashes.view(np.int64)
+
+
+def estimate_similarity(signature, others):
+    """Jaccard estimado entre uma assinatura e uma matriz de assinaturas (uma por linha)."""
+    return (others == signature[None, :]).mean(axis=1)
+
+
+def _drop_superseded(activity_id, student_id, submission_id):
+    """Submissão nova substitui as anteriores do aluno no índice (assinatura, buckets e pares)."""
+    SubmissionSignature.drop(
+        SubmissionSignature.objects.filter(activity_id=activity_id, student_id=student_id)
+        .exclude(submission_id=submission_id).values_list('submission_id', flat=True)
+    )
+
+
+def index_submission(submission_id, activity_id, student_id, text, file_path=None):
+    """
+    Indexa uma submissão e grava os pares parecidos. Retorna quantos pares novos encontrou.
+    Com file_path, só grava se a submissão ainda aponta para o arquivo lido (troca no meio do caminho).
+    """
+    shingles = shingle_hashes(text) if text else np.empty(0, dtype=np.uint64)
+    signature = minhash(shingles) if len(shingles) else None
+    bands = band_hashes(signature) if signature is not None else None
+
+    with transaction.atomic():
+        if file_path is not None and not Submission.objects.filter(id=submission_id, file_path=file_path).exists():
+            return 0 # Arquivo trocado depois da leitura: o próximo lote indexa o novo
+        _drop_superseded(activity_id, student_id, submission_id)
+        created = SubmissionSignature.objects.bulk_create([SubmissionSignature(
+            submission_id=submission_id, activity_id=activity_id, student_id=student_id,
+            signature=signature.tobytes() if signature is not None else None, shingle_count=len(shingles),
+        )], ignore_conflicts=True)
+        if signature is None or not created:
+            return 0
+
+        SubmissionLSHBucket.objects.bulk_create([
+            SubmissionLSHBucket(activity_id=activity_id, submission_id=submission_id, band=band, bucket_hash=int(h))
+            for band, h in enumerate(bands)
+        ])
+        # Candidatos: mesmo bucket em pelo menos uma banda (uma busca no índice por banda)
+        collisions = Q()
+        for band, h in enumerate(bands):
+            collisions |= Q(band=band, bucket_hash=int(h))
+        candidate_ids = set(
+            SubmissionLSHBucket.objects.filter(collisions, activity_id=activity_id)
+            .exclude(submission_id=submission_id).values_list('submission_id', flat=True)
+        )
+        if not candidate_ids:
+            return 0
+
+        candidates = list(
+            SubmissionSignature.objects.filter(submission_id__in=candidate_ids, signature__isnull=False)
+            .exclude(student_id=student_id).values_list('submission_id', 'signature')
+        )
+        if not candidates:
+            return 0
+        matrix = np.frombuffer(b''.join(bytes(sig) for _, sig in candidates), dtype=np.uint32).reshape(-1, NUM_PERM)
+        scores = estimate_similarity(signature, matrix)
+        pairs = [
+            SimilarityPair(
+                activity_id=activity_id, similarity=float(score),
+                submission_a_id=min(other_id, submission_id), submission_b_id=max(other_id, submission_id),
+            )
+            for (other_id, _), score in zip(candidates, scores) if score >= SIMILARITY_THRESHOLD
+        ]
+        SimilarityPair.objects.bulk_create(pairs, ignore_conflicts=True)
+        return len(pairs)
+
+
+def pending(batch_size):
+    """Últimas submissões disponíveis (não 'uploading') ainda sem assinatura."""
+    return list(
+        Submission.objects.filter(is_latest=True, status__in=('pending', 'late'))
+        .filter(~Exists(SubmissionSignature.objects.filter(submission_id=OuterRef('pk'))))
+        .order_by('id').values_list('id', 'activity_id', 'student_id', 'file_path', 'mime_type')[:batch_size]
+    )
+
+
+def drain(batch_size=200):
+    """Indexa um lote de submissões novas. Retorna (indexadas, pares encontrados)."""
+    rows = pending(batch_size)
+    found = 0
+    for submission_id, activity_id, student_id, file_path, mime_type in rows:
+        text = read_text(file_path, mime_type, MAX_CONTENT_BYTES)
+        found += index_submission(submission_id, activity_id, student_id, text, file_path=file_path)
+    if found:
+        logger.info(f"Índice de similaridade: {len(rows)} submissões, {found} pares suspeitos.")
+    return len(rows), found
@@ -0,0 +1,193 @@
+# storage.py
+"""
+Armazenamento plugável dos arquivos de submissão.
+
+O backend é escolhido em settings.SUBMISSION_STORAGE ({'BACKEND': caminho.da.Classe, 'OPTIONS': {...}}).
+Uploads em partes (UploadSession) gravam cada parte direto no backend, a partir do offset, em blocos
+de COPY_BLOCK_SIZE: o arquivo nunca fica inteiro em memória. Arquivos de submissão ficam em
+blob_key(sha256) (StoredBlob): conteúdo idêntico ocupa um único objeto. LocalFileStorage serve para testes e
+instalações on-prem; um backend em nuvem (Cloudinary/S3) implementa a mesma interface.
+"""
+import hashlib
+import os
+from functools import lru_cache
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+def blob_key(sha256):
+    """Chave de um arquivo armazenado por conteúdo (StoredBlob)."""
+    return f'blobs/{sha256[:2]}/{sha256}'
+
+
+def derivative_key(sha256, kind):
+    """Chave de um derivado (miniatura, versão de exibição) do blob."""
+    return f'derivatives/{sha256[:2]}/{sha256}/{kind}.jpg'
+
+
+def hash_file(fileobj):
+    """SHA-256 e tamanho de um arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    size = 0
+    for block in iter(lambda: fileobj.read(COPY_BLOCK_SIZE), b''):
+        digest.update(block)
+        size += len(block)
+    return digest.hexdigest(), size
+
+
+TEXT_MIME_TYPES = ('application/json', 'application/xml')
+
+
+def is_text(mime_type):
+    return not mime_type or mime_type.startswith('text/') or mime_type in TEXT_MIME_TYPES
+
+
+def read_text(file_path, mime_type, max_bytes):
+    """Texto de uma submissão, ou None se não é texto, passa de max_bytes ou não está no armazenamento."""
+    if not file_path or file_path.startswith(('http://', 'https://')) or not is_text(mime_type):
+        return None
+    try:
+        with get_storage().open(file_path) as f:
+            data = f.read(max_bytes + 1)
+    except FileNotFoundError:
+        return None
+    if len(data) > max_bytes:
+        return None
+    return data.decode('utf-8', errors='replace')
+
+
+class UploadTooLarge(Exception):
+    """A parte recebida passaria do tamanho declarado no início do upload."""
+
+
+class SubmissionStorage:
+    """Interface dos backends. Chaves (key) são caminhos relativos, ex: 'activity_1/user_2/abc.pdf'."""
+
+    def write_chunk(self, upload_id, offset, stream, limit):
+        """Grava o stream a partir de offset no arquivo temporário do upload. Retorna bytes gravados."""
+        raise NotImplementedError
+
+    def uploaded_size(self, upload_id):
+        raise NotImplementedError
+
+    def finalize(self, upload_id, key):
+        """Move o arquivo temporário completo para a chave definitiva."""
+        raise NotImplementedError
+
+    def discard(self, upload_id):
+        raise NotImplementedError
+
+    def digest(self, upload_id):
+        """(sha256, tamanho) do arquivo temporário completo do upload."""
+        raise NotImplementedError
+
+    def save(self, key, chunks):
+        """Grava um arquivo inteiro a partir de um iterável de blocos (ex: UploadedFile.chunks())."""
+        raise NotImplementedError
+
+    def open(self, key):
+        """Abre o arquivo armazenado para leitura binária."""
+        raise NotImplementedError
+
+    def delete(self, key):
+        raise NotImplementedError
+
+    def url(self, key):
+        raise NotImplementedError
+
+
+class LocalFileStorage(SubmissionStorage):
+    """Backend em disco: uploads parciais em <root>/.uploads/, arquivos finais em <root>/<key>."""
+
+    def __init__(self, root, base_url='/media/submissions/'):
+        self.root = os.path.abspath(str(root))
+        self.base_url = base_url
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f'Chave inválida: {key}')
+        return path
+
+    def _partial(self, upload_id):
+        return self._path(os.path.join('.uploads', f'{upload_id}.part'))
+
+    def write_chunk(self, upload_id, offset, stream, limit):
+        path = self._partial(upload_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        written = 0
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.seek(offset)
+            f.truncate() # Descarta o que sobrou de uma parte interrompida depois do offset confirmado
+            while True:
+                block = stream.read(COPY_BLOCK_SIZE)
+                if not block:
+                    break
+                written += len(block)
+                if written > limit:
+                    f.truncate(offset)
+                    raise UploadTooLarge()
+                f.write(block)
+        return written
+
+    def uploaded_size(self, upload_id):
+        try:
+            return os.path.getsize(self._partial(upload_id))
+        except FileNotFoundError:
+            return 0
+
+    def finalize(self, upload_id, key):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(self._partial(upload_id), target)
+        return key
+
+    def discard(self, upload_id):
+        try:
+            os.remove(self._partial(upload_id))
+        except FileNotFoundError:
+            pass
+
+    def digest(self, upload_id):
+        with open(self._partial(upload_id), 'rb') as f:
+            return hash_file(f)
+
+    def save(self, key, chunks):
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            for block in chunks:
+                f.write(block)
+        return key
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return urljoin(self.base_url, key)
+
+
+@lru_cache(maxsize=None)
+def get_storage():
+    config = getattr(settings, 'SUBMISSION_STORAGE', {})
+    backend = import_string(config.get('BACKEND', 'core.storage.LocalFileStorage'))
+    options = config.get('OPTIONS', {'root': os.path.join(settings.BASE_DIR, 'media', 'submissions')})
+    return backend(**options)
+
+
+@receiver(setting_changed)
+def _reset_storage(setting, **kwargs):
+    if setting == 'SUBMISSION_STORAGE':
+        get_storage.cache_clear()
@@ -0,0 +1,153 @@
+# testing.py
+"""
+Fixtures compartilhadas por core/tests.py e api/tests.py: usuários, turma com atividade atribuída,
+storage de submissões em diretório temporário e backends de storage instrumentados.
+"""
+import hashlib
+import shutil
+import tempfile
+import threading
+import zipfile
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from django.db import connection
+from django.test import override_settings
+
+from .models import User, ClassModel, ClassStudent, Activity, ActivityClass, Submission, StoredBlob
+from .storage import LocalFileStorage, get_storage
+
+
+ESSAY = (
+    "A fotossíntese é o processo pelo qual as plantas convertem a energia da luz em energia química. "
+    "Nos cloroplastos, a clorofila absorve a luz e a água é quebrada, liberando oxigênio. "
+    "O gás carbônico é fixado no ciclo de Calvin e transformado em glicose, que alimenta a planta. "
+    "Sem esse processo não haveria oxigênio suficiente na atmosfera para a vida animal."
+)
+
+
+def make_user(email, cpf, **extra):
+    """Cria um usuário verificado para os testes."""
+    return User.objects.create_user(
+        email=email, password=None, full_name=email.split('@')[0], cpf=cpf,
+        verified_email=True, **extra
+    )
+
+
+def make_teacher(email='prof@exemplo.com', cpf='00000000001'):
+    return make_user(email, cpf, is_teacher=True)
+
+
+def make_students(count):
+    """Alunos aluno0..alunoN-1 (full_name = prefixo do e-mail)."""
+    return [make_user(f'aluno{i}@exemplo.com', f'1{i:010d}') for i in range(count)]
+
+
+def make_class(teacher, students=(), name='A'):
+    """Turma ativa do professor com os alunos matriculados."""
+    class_obj = ClassModel.objects.create(professor=teacher, name=name, status='active')
+    for student in students:
+        ClassStudent.objects.create(class_instance=class_obj, student=student)
+    return class_obj
+
+
+def make_activity(teacher, *classes, **fields):
+    """Atividade aberta do professor, atribuída às turmas informadas."""
+    activity = Activity.objects.create(professor=teacher, **{'title': 'Lista', 'status': 'open', **fields})
+    for class_obj in classes:
+        ActivityClass.objects.create(activity=activity, class_instance=class_obj)
+    return activity
+
+
+def use_temp_storage(test, backend='core.storage.LocalFileStorage', **overrides):
+    """
+    Aponta o storage de submissões para <raiz>/files e o staging para <raiz>/staging, num diretório
+    temporário removido no fim do teste. Devolve a raiz.
+    """
+    root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, root, ignore_errors=True)
+    settings = override_settings(
+        SUBMISSION_STORAGE={'BACKEND': backend, 'OPTIONS': {'root': f'{root}/files'}},
+        SUBMISSION_STAGING_DIR=f'{root}/staging', **overrides,
+    )
+    settings.enable()
+    test.addCleanup(settings.disable)
+    return root
+
+
+def storage_backend(root, backend):
+    """override_settings que troca só o backend, mantendo os arquivos de use_temp_storage()."""
+    return override_settings(SUBMISSION_STORAGE={'BACKEND': backend, 'OPTIONS': {'root': f'{root}/files'}})
+
+
+def submit_file(activity, student, content, mime_type, stored=False):
+    """Submissão pendente com o conteúdo já no storage, pelo blob endereçado por hash."""
+    blob = StoredBlob.acquire(hashlib.sha256(content).hexdigest(), len(content))
+    get_storage().save(blob.key, [content])
+    if stored:
+        StoredBlob.mark_stored(blob.sha256)
+    return Submission.objects.create(
+        activity=activity, student=student, file_path=blob.key, blob=blob, mime_type=mime_type, status='pending'
+    )
+
+
+def submit_text(activity, student, content, mime_type='text/plain'):
+    """Submissão pendente de texto com chave própria (sem blob), como as anteriores à deduplicação."""
+    key = f'activity_{activity.id}/user_{student.id}_{Submission.objects.count()}.txt'
+    get_storage().save(key, [content.encode()])
+    return Submission.objects.create(
+        activity=activity, student=student, file_path=key, mime_type=mime_type, status='pending'
+    )
+
+
+def make_zip(first_entry, *names):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(first_entry, 'x' * 2000)
+        for name in names:
+            zf.writestr(name, 'y' * 2000)
+    return buffer.getvalue()
+
+
+def make_image(size, fmt, **options):
+    pixels = np.random.default_rng(0).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+class RecordingStorage(LocalFileStorage):
+    """Anota em quantas transações aninhadas cada operação de arquivo rodou."""
+    calls = []
+
+    def digest(self, upload_id):
+        RecordingStorage.calls.append(('digest', len(connection.atomic_blocks)))
+        return super().digest(upload_id)
+
+    def discard(self, upload_id):
+        RecordingStorage.calls.append(('discard', len(connection.atomic_blocks)))
+        return super().discard(upload_id)
+
+
+class GatedStorage(LocalFileStorage):
+    """Segura a transferência até o teste liberar."""
+    gate = threading.Event()
+    saves = 0
+
+    def save(self, key, chunks):
+        self.gate.wait(5)
+        GatedStorage.saves += 1
+        return super().save(key, chunks)
+
+
+class FlakyStorage(LocalFileStorage):
+    """Falha nas primeiras `failures` gravações."""
+    failures = 0
+
+    def save(self, key, chunks):
+        if FlakyStorage.failures:
+            FlakyStorage.failures -= 1
+            raise OSError('backend indisponível')
+        return super().save(key, chunks)
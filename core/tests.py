@@ -1,3 +1,395 @@
-from django.test import TestCase
+import hashlib
+import os
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from PIL import Image
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from core import file_formats, similarity, upload_offload
+from core.autograde import AutoGrader
+from core.invite_codes import allocate_invite_codes
+from core.media import MediaPipeline
+from core.models import (
+    ClassModel, ClassStudent, Invite, Activity, Submission, Feedback, ActivityReminder, Notification,
+    ActivityScoreStats, StoredBlob, AutoGradingRule, SimilarityPair, SubmissionSignature, BlobDerivative
+)
+from core.reminders import fire_due_reminders, sync_reminders
+from core.storage import get_storage
+from core.testing import (
+    ESSAY, FlakyStorage, make_activity, make_class, make_image, make_students, make_teacher, make_zip,
+    storage_backend, submit_file, submit_text, use_temp_storage
+)
+from core.workers import DrainCommand
+
+
+class DrainCommandTestCase(TestCase):
+    def test_full_batches_continue_and_totals_are_summed(self):
+        batches = [(2, 5), (2, 1), (1, 0), (0, 0)]
+
+        class Scripted(DrainCommand):
+            default_batch_size = 2
+
+            def drain(self, worker, batch_size, options):
+                return batches.pop(0)
+
+            def summary(self, totals):
+                return f'{totals[0]} itens, {totals[1]} resultados.'
+
+        out = StringIO()
+        call_command(Scripted(), stdout=out)
+        self.assertIn('5 itens, 6 resultados.', out.getvalue())
+        self.assertEqual(batches, [(0, 0)]) # Parou no primeiro lote parcial (sem --follow)
+
+    def test_worker_commands_run_on_empty_queues(self):
+        for name, expected in (
+            ('run_autograder', '0 submissões analisadas'),
+            ('process_submission_media', '0 arquivos processados'),
+            ('index_similarity', '0 submissões indexadas'),
+            ('process_webhooks', '0 eventos processados'),
+            ('run_reminders', '0 lembretes disparados'),
+        ):
+            out = StringIO()
+            call_command(name, stdout=out)
+            self.assertIn(expected, out.getvalue())
+
+
+class ClassStudentsCountTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.class_obj = make_class(self.teacher, name='Turma A')
+        self.students = make_students(3)
+
+    def _count(self):
+        self.class_obj.refresh_from_db(fields=['students_count'])
+        return self.class_obj.students_count
+
+    def test_counter_follows_enroll_remove_and_delete(self):
+        enrollments = [ClassStudent.objects.create(class_instance=self.class_obj, student=s) for s in self.students]
+        self.assertEqual(self._count(), 3)
+
+        # Remoção lógica (removed_at) decrementa, salvar de novo não decrementa duas vezes
+        enrollment = ClassStudent.objects.get(pk=enrollments[0].pk)
+        enrollment.removed_at = timezone.now()
+        enrollment.save()
+        enrollment.save()
+        self.assertEqual(self._count(), 2)
+
+        # Reativação incrementa
+        enrollment.removed_at = None
+        enrollment.save()
+        self.assertEqual(self._count(), 3)
+
+        enrollments[1].delete()
+        self.assertEqual(self._count(), 2)
+
+    def test_rebuild_command_repairs_drift(self):
+        for s in self.students:
+            ClassStudent.objects.create(class_instance=self.class_obj, student=s)
+        ClassModel.objects.filter(pk=self.class_obj.pk).update(students_count=42)
+
+        out = StringIO()
+        call_command('rebuild_students_count', '--dry-run', stdout=out)
+        self.assertIn('1 divergentes', out.getvalue())
+        self.assertEqual(self._count(), 42)
+
+        call_command('rebuild_students_count', stdout=StringIO())
+        self.assertEqual(self._count(), 3)
+
+
+class InviteCodeAllocationTestCase(TestCase):
+    def test_allocator_skips_existing_codes(self):
+        Invite.objects.create(class_invite=make_class(make_teacher()), code='dup0000001')
+        candidates = iter(['dup0000001', 'dup0000001', 'new0000001', 'new0000002', 'new0000003'])
+        codes = allocate_invite_codes(3, generate=lambda: next(candidates))
+        self.assertEqual(sorted(codes), ['new0000001', 'new0000002', 'new0000003'])
+
+
+class DueDateReminderTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.students = make_students(3)
+        class_a = make_class(self.teacher, self.students, name='A')
+        class_b = make_class(self.teacher, self.students[:1], name='B') # Duas turmas, um lembrete
+        self.activity = make_activity(
+            self.teacher, class_a, class_b,
+            due_date=timezone.now() + timezone.timedelta(days=2), notify_before_days=3,
+        )
+
+    def test_fires_once_per_student_and_resumes_after_restart(self):
+        reminder = ActivityReminder.objects.get(activity=self.activity, status='scheduled')
+
+        # Simula um worker que caiu no meio do fan-out: primeiro bloco gravado, status 'firing'
+        first = self.students[0]
+        Notification.objects.create(user=first, kind='due_reminder', activity=self.activity, reminder=reminder, message='x')
+        ActivityReminder.objects.filter(id=reminder.id).update(status='firing', last_student_id=first.id)
+
+        self.assertEqual(fire_due_reminders(chunk_size=1), (1, 2))
+        self.assertEqual(fire_due_reminders(), (0, 0))
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user_id', flat=True)), sorted(s.id for s in self.students)
+        )
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.status, 'fired')
+
+    def test_due_date_change_reschedules(self):
+        old = ActivityReminder.objects.get(activity=self.activity)
+        self.activity.due_date = timezone.now() + timezone.timedelta(days=10)
+        self.activity.save()
+        old.refresh_from_db()
+        self.assertEqual(old.status, 'cancelled')
+        self.assertEqual(fire_due_reminders(), (0, 0)) # Novo disparo só daqui a 7 dias
+
+        # Sincronização em lote cobre alterações feitas sem signal
+        Activity.objects.filter(id=self.activity.id).update(notify_before_days=20)
+        self.assertEqual(sync_reminders(), 1)
+        self.assertEqual(fire_due_reminders(), (1, 3))
+
+    def test_close_reopen_and_due_date_round_trip_reschedule(self):
+        reminder = ActivityReminder.objects.get(activity=self.activity)
+        self.activity.status = 'closed'
+        self.activity.save()
+        reminder.refresh_from_db()
+        self.assertEqual(reminder.status, 'cancelled')
+
+        self.activity.status = 'open'
+        self.activity.save()
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.status, reminder.last_student_id), ('scheduled', 0))
+
+        original_due = self.activity.due_date
+        self.activity.due_date = original_due + timezone.timedelta(days=5)
+        self.activity.save()
+        self.activity.due_date = original_due
+        self.activity.save()
+        self.assertEqual(ActivityReminder.objects.get(activity=self.activity, fire_at=reminder.fire_at).status, 'scheduled')
+        self.assertEqual(fire_due_reminders(), (1, 3))
+
+    def test_sync_reactivates_cancelled_reminder_and_counts_only_real_changes(self):
+        ActivityReminder.objects.filter(activity=self.activity).update(status='cancelled') # Fechada e reaberta sem signal
+        self.assertEqual(sync_reminders(), 1)
+        self.assertEqual(ActivityReminder.objects.get(activity=self.activity).status, 'scheduled')
+        self.assertEqual(sync_reminders(), 0)
+
+
+class ActivityScoreStatsTestCase(TestCase):
+    def setUp(self):
+        self.teacher = make_teacher()
+        self.activity = make_activity(self.teacher, title='Prova', max_score=20)
+        self.students = make_students(4)
+        self.submissions = [
+            Submission.objects.create(activity=self.activity, student=s, status='pending') for s in self.students
+        ]
+
+    def _grade(self, i, score):
+        return Feedback.objects.create(submission=self.submissions[i], professor=self.teacher, score=score)
+
+    def _totals(self):
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        return stats.count, stats.score_sum
+
+    def test_write_before_first_rebuild_builds_aggregates_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self._grade(0, 10) # Ainda sem ActivityScoreStats: a nota não pode se perder
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._totals(), (1, 10.0))
+
+    def test_deleting_activity_with_graded_feedback(self):
+        self._grade(0, 10)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.activity.delete() # Sem agregados ainda: o rebuild agendado não pode recriá-los
+        self.assertFalse(ActivityScoreStats.objects.exists())
+
+        other = make_activity(self.teacher, title='Outra')
+        submission = Submission.objects.create(activity=other, student=self.students[0], status='pending')
+        Feedback.objects.create(submission=submission, professor=self.teacher, score=5)
+        ActivityScoreStats.rebuild(other.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        self.assertFalse(ActivityScoreStats.objects.exists())
+
+    def test_deleting_teacher_with_graded_feedback(self):
+        self._grade(0, 10)
+        ActivityScoreStats.rebuild(self.activity.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.teacher.delete()
+        self.assertFalse(Activity.objects.exists())
+        self.assertFalse(ActivityScoreStats.objects.exists())
+
+    def test_deleting_submission_rebuilds_after_commit(self):
+        self._grade(0, 10)
+        self._grade(1, 4)
+        ActivityScoreStats.rebuild(self.activity.id)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.submissions[0].delete()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self._totals(), (1, 4.0))
+
+    def test_counts_one_score_per_student_from_latest_submission(self):
+        ActivityScoreStats.rebuild(self.activity.id)
+        self._grade(0, 10)
+        self._grade(0, 14) # Regrade da mesma submissão: substitui
+        self._grade(1, 6)
+        self._grade(2, 8)
+        resubmitted = Submission.objects.create(activity=self.activity, student=self.students[2], status='pending')
+        self.assertEqual(self._totals(), (2, 20.0)) # Reenvio ainda sem nota não conta a antiga
+
+        Feedback.objects.create(submission=resubmitted, professor=self.teacher, score=12)
+        self._grade(3, 4)
+        self.assertEqual(self._totals(), (4, 14 + 6 + 12 + 4.0))
+        self.assertEqual(sorted(ActivityScoreStats.scores(self.activity.id)), [4.0, 6.0, 12.0, 14.0])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resubmitted.delete() # A submissão anterior (nota 8) volta a ser a última
+        self.assertEqual(self._totals(), (4, 14 + 6 + 8 + 4.0))
+
+
+class UploadOffloadTestCase(TransactionTestCase):
+    def setUp(self):
+        self.root = use_temp_storage(self, SUBMISSION_UPLOAD_WORKERS=2)
+        self.teacher = make_teacher()
+        self.student = make_students(1)[0]
+        self.activity = make_activity(self.teacher, make_class(self.teacher, [self.student]), title='Trabalho')
+
+    def test_resume_stalled_after_restart(self):
+        staged = StoredBlob.acquire(*upload_offload.stage([b'abc']))
+        submission = Submission.objects.create(
+            activity=self.activity, student=self.student, file_path=staged.key, blob=staged, status='uploading'
+        )
+        missing = StoredBlob.acquire('0' * 64, 3) # Staging perdido
+        lost = Submission.objects.create(
+            activity=self.activity, student=self.student, file_path=missing.key, blob=missing, status='uploading'
+        )
+        out = StringIO()
+        call_command('resume_uploads', stdout=out)
+        self.assertIn('1 transferências retomadas, 1 marcadas como falha', out.getvalue())
+        submission.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertEqual((submission.status, lost.status), ('pending', 'upload_failed'))
+
+    def test_failed_transfer_keeps_staging_for_same_content_in_queue(self):
+        blob = StoredBlob.acquire(*upload_offload.stage([b'mesmo arquivo']))
+        StoredBlob.acquire(blob.sha256, blob.size)
+        first, second = [
+            Submission.objects.create(activity=self.activity, student=self.student, file_path=blob.key, blob=blob, status='uploading')
+            for _ in range(2)
+        ]
+        with storage_backend(self.root, 'core.testing.FlakyStorage'):
+            FlakyStorage.failures = 1
+            self.assertFalse(upload_offload.transfer(first.id, blob.sha256))
+            self.assertTrue(os.path.exists(upload_offload.staging_path(blob.sha256))) # A segunda ainda vai ler
+            self.assertTrue(upload_offload.transfer(second.id, blob.sha256))
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'pending')
+        self.assertFalse(os.path.exists(upload_offload.staging_path(blob.sha256)))
+
+
+class FileFormatsTestCase(TestCase):
+    def test_sniff_detects_office_containers_and_signatures(self):
+        self.assertEqual(file_formats.sniff(make_zip('[Content_Types].xml', '_rels/.rels', 'word/document.xml')), 'docx')
+        self.assertEqual(file_formats.sniff(make_zip('[Content_Types].xml', 'ppt/presentation.xml')), 'pptx')
+        self.assertEqual(file_formats.sniff(make_zip('fotos/a.txt')), 'zip')
+        self.assertEqual(file_formats.sniff(b'%PDF-1.7\n...'), 'pdf')
+        self.assertEqual(file_formats.sniff(b'\x00\x00\x00\x20ftypisom'), 'mp4')
+        self.assertEqual(file_formats.sniff('Redação sobre fotossíntese'.encode()), 'text')
+        self.assertEqual(file_formats.sniff(b'MZ\x90\x00\x03\x00\x00\x00'), 'unknown')
+        self.assertTrue(file_formats.is_allowed('mov', ['video']))
+
+
+class AutoGraderTestCase(TestCase):
+    def setUp(self):
+        use_temp_storage(self)
+        self.activity = make_activity(make_teacher(), title='Quiz', max_score=10)
+        self.students = make_students(3)
+
+    def test_drain_grades_text_submissions_in_process_pool(self):
+        AutoGradingRule.objects.create(activity=self.activity, kind='answer_key', config={'answers': {'1': 'B', '2': 'Mitocôndria'}})
+        full = submit_text(self.activity, self.students[0], '{"answers": {"1": "b", "2": "mitocondria"}}', 'application/json')
+        half = submit_text(self.activity, self.students[1], '1) b\n2) núcleo')
+        pdf = submit_text(self.activity, self.students[2], '%PDF-1.4', 'application/pdf') # Não é texto: fica para o professor
+        ActivityScoreStats.rebuild(self.activity.id)
+
+        with AutoGrader(workers=2) as grader:
+            self.assertEqual(grader.drain(batch_size=50), (3, 2))
+            self.assertEqual(grader.drain(batch_size=50), (0, 0)) # Nada repetido
+
+        scores = dict(Feedback.objects.filter(automatic=True).values_list('submission_id', 'score'))
+        self.assertEqual(scores, {full.id: Decimal('10.00'), half.id: Decimal('5.00')})
+        self.assertIn('Revisar: 2', Feedback.objects.get(submission=half).comment)
+        self.assertIsNotNone(Submission.objects.get(pk=pdf.pk).autograded_at)
+        stats = ActivityScoreStats.objects.get(activity=self.activity)
+        self.assertEqual((stats.count, stats.score_sum), (2, 15.0))
+
+
+class SimilarityIndexTestCase(TestCase):
+    def setUp(self):
+        use_temp_storage(self)
+        self.activity = make_activity(make_teacher(), title='Redação')
+        self.students = make_students(4)
+
+    def test_near_copies_are_paired_and_distinct_text_is_not(self):
+        original = submit_text(self.activity, self.students[0], ESSAY)
+        copy = submit_text(self.activity, self.students[1], ESSAY.replace('planta.', 'planta inteira.').upper())
+        submit_text(self.activity, self.students[2], "Revolução Francesa: queda da Bastilha, fim do absolutismo e a Declaração dos Direitos do Homem. " * 3)
+        submit_text(self.activity, self.students[3], '%PDF-1.4', 'application/pdf')
+
+        self.assertEqual(similarity.drain(batch_size=50), (4, 1))
+        self.assertEqual(similarity.drain(batch_size=50), (0, 0)) # Só processa submissões novas
+        pair = SimilarityPair.objects.get()
+        self.assertEqual((pair.submission_a_id, pair.submission_b_id), (original.id, copy.id))
+        self.assertGreater(pair.similarity, 0.7)
+
+    def test_resubmission_replaces_old_signature_and_pairs(self):
+        submit_text(self.activity, self.students[0], ESSAY)
+        submit_text(self.activity, self.students[1], ESSAY)
+        similarity.drain()
+        self.assertEqual(SimilarityPair.objects.count(), 1)
+
+        rewritten = submit_text(self.activity, self.students[1], "Texto totalmente novo sobre respiração celular e mitocôndrias, escrito do zero.")
+        self.assertEqual(similarity.drain(), (1, 0))
+        self.assertFalse(SimilarityPair.objects.exists())
+        self.assertEqual(
+            set(SubmissionSignature.objects.filter(student=self.students[1]).values_list('submission_id', flat=True)),
+            {rewritten.id},
+        )
+
+
+class MediaPipelineTestCase(TestCase):
+    def setUp(self):
+        use_temp_storage(self)
+        self.activity = make_activity(make_teacher(), title='Fotos do experimento')
+        self.students = make_students(3)
+
+    def test_pipeline_builds_derivatives_once_per_content(self):
+        photo = make_image((3000, 2000), 'JPEG', quality=95) # Foto "de celular", vários MB
+        submit_file(self.activity, self.students[0], photo, 'image/jpeg', stored=True)
+        submit_file(self.activity, self.students[1], photo, 'image/jpeg', stored=True) # Mesmo conteúdo: mesmo blob
+        small = submit_file(self.activity, self.students[2], make_image((200, 100), 'PNG'), 'image/png', stored=True)
+
+        with MediaPipeline(workers=2) as pipeline:
+            self.assertEqual(pipeline.drain(), (2, 3))
+            self.assertEqual(pipeline.drain(), (0, 0))
+
+        derivatives = {(d.blob_id, d.kind): d for d in BlobDerivative.objects.all()}
+        photo_sha = hashlib.sha256(photo).hexdigest()
+        display = derivatives[(photo_sha, 'display')]
+        self.assertEqual((display.width, display.height), (2048, 1365))
+        self.assertLess(display.size, len(photo))
+        self.assertLessEqual(max(derivatives[(photo_sha, 'thumbnail')].width, derivatives[(photo_sha, 'thumbnail')].height), 320)
+        self.assertNotIn((small.blob_id, 'display'), derivatives) # Original leve: só miniatura
+        with get_storage().open(derivatives[(small.blob_id, 'thumbnail')].key) as f:
+            self.assertEqual(Image.open(f).format, 'JPEG')
+
+    def test_released_blob_deletes_derivatives(self):
+        submission = submit_file(self.activity, self.students[0], make_image((400, 300), 'PNG'), 'image/png', stored=True)
+        with MediaPipeline(workers=1) as pipeline:
+            pipeline.drain()
+        key = BlobDerivative.objects.get(blob_id=submission.blob_id).key
+        with self.captureOnCommitCallbacks(execute=True):
+            submission.delete()
+        self.assertFalse(BlobDerivative.objects.exists())
+        with self.assertRaises(FileNotFoundError):
+            get_storage().open(key)
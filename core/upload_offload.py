@@ -0,0 +1,200 @@
+# upload_offload.py
+"""
+Transferência assíncrona dos arquivos de submissão para o backend de armazenamento.
+
+create/update da SubmissionViewSet só copiam o arquivo recebido para a área de staging local
+(SUBMISSION_STAGING_DIR; o UploadedFile some ao fim da requisição), calculando o SHA-256 na cópia.
+Se o conteúdo já está armazenado (StoredBlob), a Submission só ganha uma referência e nada é
+enviado; senão ela é gravada com status 'uploading' e a view responde. A transferência para o
+backend (nuvem) roda num ThreadPoolExecutor limitado (SUBMISSION_UPLOAD_WORKERS), disparada no
+on_commit; ao terminar a Submission vai para 'pending' ou 'upload_failed'. Com SUBMISSION_UPLOAD_QUEUE transferências em andamento, a próxima roda
+na própria requisição: backpressure em vez de acumular arquivos no staging sem limite.
+
+O arquivo em staging sobrevive a um restart do processo; o comando resume_uploads reenfileira as
+submissões que ficaram em 'uploading'.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, connection, transaction
+from django.dispatch import receiver
+
+from .models import StoredBlob, Submission
+from .storage import COPY_BLOCK_SIZE, blob_key, get_storage
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_executor = None
+_slots = None
+_futures = set()
+
+
+def _staging_root():
+    return os.path.abspath(str(getattr(settings, 'SUBMISSION_STAGING_DIR', os.path.join(settings.BASE_DIR, 'media', 'staging'))))
+
+
+def staging_path(sha256):
+    return os.path.join(_staging_root(), sha256)
+
+
+def stage(chunks):
+    """
+    Copia o arquivo recebido (iterável de blocos) para o staging local, calculando o SHA-256 no
+    caminho. Retorna (sha256, tamanho); o arquivo fica em staging_path(sha256).
+    """
+    root = _staging_root()
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(dir=root, suffix='.tmp', delete=False) as f:
+        try:
+            for block in chunks:
+                digest.update(block)
+                size += len(block)
+                f.write(block)
+        except BaseException:
+            f.close()
+            os.remove(f.name)
+            raise
+    sha256 = digest.hexdigest()
+    # Uploads simultâneos do mesmo conteúdo gravam o mesmo arquivo: a troca atômica basta
+    os.replace(f.name, staging_path(sha256))
+    return sha256, size
+
+
+def _pool():
+    global _executor, _slots
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'SUBMISSION_UPLOAD_WORKERS', 4), thread_name_prefix='submission-upload'
+            )
+            _slots = threading.BoundedSemaphore(getattr(settings, 'SUBMISSION_UPLOAD_QUEUE', 64))
+        return _executor, _slots
+
+
+def transfer(submission_id, sha256):
+    """Envia o blob do staging para o backend (se ainda não estiver lá) e fecha o status da Submission."""
+    storage = get_storage()
+    key = blob_key(sha256)
+    if not StoredBlob.objects.filter(sha256=sha256, stored=True).exists():
+        try:
+            with open(staging_path(sha256), 'rb') as f:
+                storage.save(key, iter(lambda: f.read(COPY_BLOCK_SIZE), b''))
+        except Exception as e:
+            # Staging já apagado por outra transferência do mesmo conteúdo, que terminou antes
+            if not (isinstance(e, FileNotFoundError) and StoredBlob.objects.filter(sha256=sha256, stored=True).exists()):
+                logger.error(f"Falha ao transferir o arquivo da submissão {submission_id}: {e}", exc_info=True)
+                Submission.objects.filter(id=submission_id, status='uploading', blob_id=sha256).update(status='upload_failed')
+                # O staging é por conteúdo: outra submissão com o mesmo arquivo na fila ainda vai lê-lo
+                if not Submission.objects.filter(blob_id=sha256, status='uploading').exists():
+                    discard_staged(sha256) # O aluno reenvia o arquivo
+                return False
+        else:
+            if not StoredBlob.mark_stored(sha256):
+                # Todas as submissões do blob foram apagadas ou trocaram de arquivo durante o envio
+                storage.delete(key)
+
+    Submission.objects.filter(id=submission_id, status='uploading', blob_id=sha256).update(status='pending')
+    discard_staged(sha256)
+    return True
+
+
+def _run(submission_id, sha256):
+    close_old_connections()
+    try:
+        return transfer(submission_id, sha256)
+    finally:
+        # Cada thread do pool abre a própria conexão; não deixa conexões penduradas
+        connection.close()
+
+
+def enqueue(submission_id, sha256):
+    """Agenda a transferência no pool. Com o pool desligado ou a fila cheia, transfere na hora."""
+    if not getattr(settings, 'SUBMISSION_UPLOAD_ASYNC', True):
+        return transfer(submission_id, sha256)
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        logger.warning(f"Fila de uploads cheia; transferindo a submissão {submission_id} na requisição.")
+        return transfer(submission_id, sha256)
+    future = executor.submit(_run, submission_id, sha256)
+    with _lock:
+        _futures.add(future)
+
+    def _done(f):
+        slots.release()
+        with _lock:
+            _futures.discard(f)
+    future.add_done_callback(_done)
+    return future
+
+
+def attach(submission, sha256, size):
+    """
+    Aponta a Submission (ainda não salva) para o blob do conteúdo em staging. Conteúdo já armazenado
+    não é enviado de novo: a submissão nasce 'pending'. Senão fica 'uploading' e a transferência é
+    agendada para depois do commit. Chamar dentro de transaction.atomic(), antes do save().
+    """
+    blob = StoredBlob.acquire(sha256, size)
+    submission.blob = blob
+    submission.file_path = blob.key
+    if blob.stored:
+        submission.status = 'pending'
+        transaction.on_commit(lambda: discard_staged(sha256))
+    else:
+        submission.status = 'uploading'
+        transaction.on_commit(lambda: enqueue(submission.id, sha256))
+    return blob
+
+
+def wait_for_transfers(timeout=None):
+    """Espera as transferências em andamento (testes e desligamento gracioso)."""
+    with _lock:
+        pending = set(_futures)
+    return wait(pending, timeout=timeout)
+
+
+def discard_staged(sha256):
+    try:
+        os.remove(staging_path(sha256))
+    except FileNotFoundError:
+        pass
+
+
+def resume_stalled(batch_size=500):
+    """Reenfileira as submissões presas em 'uploading' (restart no meio). Retorna (retomadas, falhas)."""
+    resumed = failed = 0
+    last_id = 0
+    while True:
+        rows = list(
+            Submission.objects.filter(status='uploading', id__gt=last_id)
+            .order_by('id').values_list('id', 'blob_id', 'blob__stored')[:batch_size]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        for submission_id, sha256, stored in rows:
+            if sha256 and (stored or os.path.exists(staging_path(sha256))):
+                transfer(submission_id, sha256)
+                resumed += 1
+            else:
+                Submission.objects.filter(id=submission_id, status='uploading').update(status='upload_failed')
+                failed += 1
+    return resumed, failed
+
+
+@receiver(setting_changed)
+def _reset_pool(setting, **kwargs):
+    global _executor, _slots
+    if setting in ('SUBMISSION_UPLOAD_WORKERS', 'SUBMISSION_UPLOAD_QUEUE'):
+        with _lock:
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            _executor = _slots = None
@@ -0,0 +1,85 @@
+# workers.py
+"""
+Peças comuns dos workers em lote (run_autograder, process_submission_media, index_similarity,
+process_webhooks, run_reminders).
+
+ProcessPool guarda o ProcessPoolExecutor de quem faz trabalho de CPU fora do Django (correção,
+Pillow): criado no primeiro uso e encerrado no fim do with. DrainCommand é o comando que chama um
+drain(batch_size) em laço com --batch-size/--follow/--interval: lote cheio segue sem esperar (pico
+de trabalho), lote parcial encerra ou, com --follow, dorme --interval segundos.
+"""
+import contextlib
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+class ProcessPool:
+    """Um pool de processos por worker, criado sob demanda; use como context manager para encerrar."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or self.default_workers()
+        self._executor = None
+
+    def default_workers(self):
+        return 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+
+class DrainCommand(BaseCommand):
+    """
+    Comando de worker em lote. Subclasses definem drain(worker, batch_size, options) -> tupla de contagens
+    e summary(totais). worker é o que open_worker() abre (ex: um ProcessPool), uma vez para todo o laço.
+    """
+    default_batch_size = 100
+    default_interval = 5.0
+    batch_help = 'Itens por lote.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=self.default_batch_size, help=self.batch_help)
+        parser.add_argument('--follow', action='store_true', help='Continua rodando como worker.')
+        parser.add_argument('--interval', type=float, default=self.default_interval, help='Segundos entre consultas com --follow.')
+
+    def open_worker(self, options):
+        return contextlib.nullcontext()
+
+    def drain(self, worker, batch_size, options):
+        raise NotImplementedError
+
+    def seen(self, counts):
+        """Itens lidos no lote (lote cheio = provavelmente há mais na fila)."""
+        return counts[0]
+
+    def summary(self, totals):
+        raise NotImplementedError
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        totals = None
+        with self.open_worker(options) as worker:
+            while True:
+                counts = self.drain(worker, batch_size, options)
+                totals = counts if totals is None else tuple(t + c for t, c in zip(totals, counts))
+                if self.seen(counts) >= batch_size:
+                    continue # Lote cheio: segue sem esperar
+                if not options['follow']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(self.summary(totals)))
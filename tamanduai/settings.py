@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -81,6 +82,28 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transações de escrita pegam o lock do arquivo já no BEGIN e esperam (timeout) em vez de
+            # falhar com "database is locked" quando muitas requisições escrevem ao mesmo tempo
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # Banco de teste em arquivo: o banco em memória compartilhado não respeita o timeout entre threads
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
+    }
+}
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local-memory por padrão (por processo); trocar por Redis/Memcached em produção com vários workers
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tamanduai-default',
     }
 }
 
@@ -121,6 +144,37 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Arquivos enviados (submissões)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Backend de armazenamento das submissões (core/storage.py); trocar por um backend em nuvem em produção
+SUBMISSION_STORAGE = {
+    'BACKEND': 'core.storage.LocalFileStorage',
+    'OPTIONS': {'root': MEDIA_ROOT / 'submissions', 'base_url': MEDIA_URL + 'submissions/'},
+}
+SUBMISSION_MAX_UPLOAD_SIZE = 200 * 1024 * 1024 # Uploads em partes (vídeos de até 200 MB)
+SUBMISSION_UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024 # Tamanho de parte sugerido ao cliente
+# Transferência em segundo plano dos uploads multipart (core/upload_offload.py)
+SUBMISSION_STAGING_DIR = MEDIA_ROOT / 'staging'
+SUBMISSION_UPLOAD_ASYNC = True
+SUBMISSION_UPLOAD_WORKERS = 4 # Threads de transferência por processo
+SUBMISSION_UPLOAD_QUEUE = 64 # Transferências em andamento antes de cair para envio na requisição
+SUBMISSION_UPLOAD_EXPIRY_HOURS = 24 # Uploads retomáveis parados há mais que isso são cancelados (cleanup_uploads)
+
+# Correção automática (core/autograde.py, comando run_autograder)
+AUTOGRADE_WORKERS = None # Processos de correção; None = um por núcleo
+AUTOGRADE_MAX_CONTENT_BYTES = 1024 * 1024 # Submissões de texto maiores ficam para o professor
+SIMILARITY_THRESHOLD = 0.5 # Jaccard estimado a partir do qual um par vira SimilarityPair
+SIMILARITY_MAX_CONTENT_BYTES = 2 * 1024 * 1024
+
+# Miniaturas e versões de exibição (core/media.py, comando process_submission_media)
+SUBMISSION_MEDIA_WORKERS = 2 # Processos do Pillow por worker
+SUBMISSION_MEDIA_MAX_BYTES = 40 * 1024 * 1024 # Arquivos maiores ficam sem miniatura
+
+# Webhooks da Appmax: HMAC-SHA256 do corpo no header X-Appmax-Signature. Vazio = rota recusa tudo
+APPMAX_WEBHOOK_SECRET = os.environ.get('APPMAX_WEBHOOK_SECRET', '')
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 